@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+"""
+Microbenchmark of the latency of scoring a single expression profile with
+`tspex.score`, compared with building a TissueSpecificity object from a
+one-row DataFrame.
+
+Usage: python benchmarks/score_latency.py [--tissues N] [--calls N]
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+import pandas as pd
+import tspex
+from tspex.core.score_functions import METHODS
+
+
+def _latency(function, calls):
+    # Best of five runs, in microseconds per call
+    return min(timeit.repeat(function, number=calls, repeat=5)) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--tissues', type=int, default=50)
+    parser.add_argument('--calls', type=int, default=2000)
+    args = parser.parse_args()
+    profile = np.random.RandomState(0).gamma(0.5, 10, size=args.tissues)
+    print('method\tscore_us\tscore_unvalidated_us\tTissueSpecificity_us')
+    for method in METHODS:
+        out = np.empty_like(tspex.score(profile, method))
+        latencies = [
+            _latency(lambda: tspex.score(profile, method), args.calls),
+            _latency(
+                lambda: tspex.score(profile, method, validate=False, out=out),
+                args.calls,
+            ),
+            _latency(
+                lambda: tspex.TissueSpecificity(
+                    pd.DataFrame(profile[np.newaxis]), method
+                ).tissue_specificity,
+                max(args.calls // 20, 1),
+            ),
+        ]
+        print(method + '\t' + '\t'.join('{:.1f}'.format(value) for value in latencies))
+
+
+if __name__ == '__main__':
+    main()
@@ -31,7 +31,14 @@ setup(
     description='A Python package for calculating tissue-specificity metrics for gene expression.',
     long_description=open('README.md').read(),
     long_description_content_type='text/markdown',
-    install_requires=['matplotlib >= 2.2', 'numpy', 'pandas >= 0.23', 'xlrd >= 1.1.0'],
+    install_requires=[
+        'matplotlib >= 2.2',
+        'numpy',
+        'openpyxl >= 2.6',
+        'pandas >= 0.23',
+        'xlrd >= 1.1.0',
+    ],
+    extras_require={'dask': ['dask[dataframe]']},
     python_requires='>=3',
     entry_points={
         'console_scripts': ['tspex=tspex.cli:main'],
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+import numpy as np
+import pytest
+
+from tspex.core.auxiliary_functions import (
+    js_distance,
+    pairwise_js_distance,
+    top_tissue_fractions,
+)
+from tspex.core.progress_class import CancellationToken, ComputationCancelled
+
+random_state = np.random.RandomState(0)
+genes_a = random_state.gamma(0.5, 10, size=(60, 8))
+genes_a[random_state.rand(60, 8) < 0.3] = 0
+genes_a[3] = 0
+genes_b = random_state.gamma(0.5, 10, size=(25, 8))
+
+
+@pytest.mark.filterwarnings('ignore::RuntimeWarning')
+def test_pairwise_js_distance():
+    expected = np.array([[js_distance(p, q) for q in genes_b] for p in genes_a])
+    for block_size in [7, 1000]:
+        computed = pairwise_js_distance(genes_a, genes_b, block_size=block_size)
+        assert np.allclose(computed, expected, equal_nan=True)
+    assert np.allclose(
+        pairwise_js_distance(genes_a, genes_b, block_size=7, processes=2),
+        expected,
+        equal_nan=True,
+    )
+    pytest.raises(ValueError, pairwise_js_distance, genes_a, genes_b[:, :5])
+
+
+@pytest.mark.filterwarnings('ignore::RuntimeWarning')
+@pytest.mark.parametrize('processes', [None, 2])
+def test_pairwise_js_distance_cancellation(processes):
+    reports = []
+    pairwise_js_distance(genes_a, genes_b, block_size=7, progress=reports.append)
+    assert [report.processed for report in reports] == [7 * i for i in range(1, 9)] + [60]
+    token = CancellationToken()
+    token.cancel()
+    with pytest.raises(ComputationCancelled):
+        pairwise_js_distance(
+            genes_a, genes_b, block_size=7, processes=processes, cancel_token=token
+        )
+
+
+def test_pairwise_js_distance_neighbours():
+    distances = pairwise_js_distance(genes_a)
+    np.fill_diagonal(distances, np.nan)
+    knn_distances, knn_indices = pairwise_js_distance(genes_a, k=4, block_size=9)
+    assert knn_distances.shape == knn_indices.shape == (60, 4)
+    expected = np.sort(np.where(np.isnan(distances), np.inf, distances), axis=1)[:, :4]
+    expected[np.isinf(expected)] = np.nan
+    assert np.allclose(knn_distances, expected, equal_nan=True)
+    observed = ~np.isnan(knn_distances)
+    assert np.allclose(
+        np.take_along_axis(distances, knn_indices, axis=1)[observed],
+        knn_distances[observed],
+    )
+    assert not np.any(knn_indices == np.arange(60)[:, np.newaxis])
+    # Gene 3 has no expression, so it has no neighbours
+    assert np.all(knn_indices[3] == -1)
+    assert np.all(knn_indices[~observed] == -1)
+
+
+def test_top_tissue_fractions():
+    random_state = np.random.RandomState(0)
+    matrix = random_state.gamma(0.5, 10, size=(100, 8))
+    matrix[0] = 0
+    fractions, top = top_tissue_fractions(matrix, 3)
+    sorted_matrix = -np.sort(-matrix, axis=1)[:, :3]
+    assert np.array_equal(np.take_along_axis(matrix, top, axis=1)[1:], sorted_matrix[1:])
+    assert np.allclose(
+        fractions[1:],
+        np.cumsum(sorted_matrix, axis=1)[1:] / matrix[1:].sum(axis=1)[:, None],
+    )
+    assert np.all(fractions[0] == 0)
+    matrix[1, 0] = np.nan
+    fractions, top = top_tissue_fractions(matrix, 8, ignore_missing=True)
+    assert top[1, -1] == 0
+    assert fractions[1, -1] == 1
+    assert np.isnan(top_tissue_fractions(matrix, 8)[0][1]).all()
+    with pytest.raises(ValueError):
+        top_tissue_fractions(matrix, 9)
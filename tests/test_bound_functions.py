@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+import numpy as np
+import pytest
+
+from tspex.core import bound_functions, matrix_functions
+
+
+def make_matrix(n_tissues):
+    random_state = np.random.RandomState(n_tissues)
+    matrix = random_state.gamma(0.5, 10, size=(500, n_tissues))
+    matrix[random_state.rand(500, n_tissues) < 0.4] = 0
+    # All-zero, constant and single-tissue profiles
+    matrix[0] = 0
+    matrix[1] = 1
+    matrix[2] = 0
+    matrix[2, 0] = 5
+    return matrix
+
+
+@pytest.mark.parametrize(
+    'method', ['gini', 'shannon_specificity', 'roku_specificity', 'js_specificity']
+)
+@pytest.mark.parametrize('n_tissues', [1, 2, 6, 31])
+@pytest.mark.parametrize('transform', [True, False])
+def test_bound_functions_are_upper_bounds(method, n_tissues, transform):
+    matrix = make_matrix(n_tissues)
+    values = getattr(matrix_functions, method)(matrix, transform=transform)
+    if values.ndim == 2:
+        values = values.max(axis=1)
+    bound = getattr(bound_functions, method)(matrix, transform=transform)
+    assert np.all(values <= bound + 1e-12)
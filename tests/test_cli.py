@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+import os
+
+import pandas as pd
+import pytest
+
+from tspex.cli import _read_manifest, _subcommand, tspex_batch, tspex_cli
+from tspex.core.index_functions import write_index
+from tspex.core.progress_class import CancellationToken, ComputationCancelled
+
+data_file = os.path.join(os.path.dirname(__file__), 'test_data.tsv')
+
+
+@pytest.mark.parametrize(
+    'method, disable_transformation',
+    [('tau', False), ('zscore', True), ('roku_specificity', True)],
+)
+def test_cli_histogram(method, disable_transformation, tmp_path):
+    histogram_file = str(tmp_path / 'histogram.tsv')
+    tspex_cli(
+        data_file,
+        str(tmp_path / 'output.tsv'),
+        method,
+        False,
+        disable_transformation,
+        0,
+        histogram_file=histogram_file,
+    )
+    histogram = pd.read_csv(histogram_file, sep='\t')
+    assert histogram['count'].sum() == 10
+    # Values outside of the [0,1] range are binned instead of lost as overflow
+    assert histogram['count'].iloc[[0, -1]].sum() == 0
+
+
+def test_cli_cancellation(tmp_path):
+    token = CancellationToken()
+    token.cancel()
+    output_file = str(tmp_path / 'output.tsv')
+    histogram_file = str(tmp_path / 'histogram.tsv')
+    with pytest.raises(ComputationCancelled):
+        tspex_cli(
+            data_file,
+            output_file,
+            'tau',
+            False,
+            False,
+            0,
+            histogram_file=histogram_file,
+            block_size=3,
+            cancel_token=token,
+        )
+    # The outputs are written for the blocks computed before the cancellation
+    assert pd.read_csv(histogram_file, sep='\t')['count'].sum() == 0
+    with open(output_file) as fin:
+        assert fin.read() == ''
+
+
+def test_read_manifest(tmp_path):
+    manifest_file = tmp_path / 'manifest.tsv'
+    manifest_file.write_text(
+        'input_file\toutput_file\tmethod\toptions\n'
+        '# Comment\n'
+        '\n'
+        'a.tsv\ta_tau.tsv\ttau\n'
+        'b.tsv\tb_gini.tsv\tgini\t--log -t 5\n'
+    )
+    assert _read_manifest(str(manifest_file)) == [
+        ('a.tsv', 'a_tau.tsv', 'tau', ''),
+        ('b.tsv', 'b_gini.tsv', 'gini', '--log -t 5'),
+    ]
+    manifest_file.write_text('a.tsv\ta_tau.tsv\n')
+    with pytest.raises(ValueError):
+        _read_manifest(str(manifest_file))
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_batch_failed_job(processes, tmp_path):
+    manifest_file = tmp_path / 'manifest.tsv'
+    manifest_file.write_text(
+        '{0}\t{1}/tau.tsv\ttau\n'
+        '{1}/missing.tsv\t{1}/missing_tau.tsv\ttau\n'
+        '{0}\t{1}/gini.tsv\tgini\t--unknown_option\n'
+        '{0}\t{1}/counts.tsv\tcounts\t--thresholds 1 5\n'.format(data_file, tmp_path)
+    )
+    report_file = str(tmp_path / 'report.tsv')
+    assert tspex_batch(str(manifest_file), report_file, processes) == 2
+    report = pd.read_csv(report_file, sep='\t', keep_default_na=False)
+    assert list(report['status']) == ['ok', 'failed', 'failed', 'ok']
+    assert report['error'][1].startswith('FileNotFoundError')
+    assert report['error'][2] == 'Invalid options: --unknown_option'
+    assert len(pd.read_csv(str(tmp_path / 'tau.tsv'), sep='\t')) == 10
+    counts = pd.read_csv(str(tmp_path / 'counts.tsv'), sep='\t', index_col=0)
+    assert counts.shape == (10, 2)
+
+
+def test_subcommand(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert _subcommand(['tspex', 'index', 'matrix.tsv']) == 'index'
+    assert _subcommand(['tspex', 'matrix.tsv', 'output.tsv', 'tau']) is None
+    # An input matrix named after a subcommand is scored
+    (tmp_path / 'batch').write_text('gene\tA\n')
+    assert _subcommand(['tspex', 'batch', 'output.tsv', 'tau']) is None
+
+
+def test_cli_stdin_text_column(tmp_path, monkeypatch):
+    # A text column is removed from every block, as when the file is read at once
+    expression_matrix = pd.read_csv(data_file, sep='\t', index_col=0)
+    expression_matrix.insert(0, 'description', 'gene description')
+    input_file = str(tmp_path / 'input.tsv')
+    expression_matrix.to_csv(input_file, sep='\t')
+    outputs = []
+    for path in [input_file, '-']:
+        output_file = str(tmp_path / 'output.tsv')
+        with open(input_file) as fin:
+            monkeypatch.setattr('sys.stdin', fin)
+            with pytest.warns(UserWarning, match='non-numerical columns'):
+                tspex_cli(path, output_file, 'tau', False, False, 0, block_size=3)
+        outputs.append(pd.read_csv(output_file, sep='\t', index_col=0))
+    assert outputs[0].notna().all().all()
+    pd.testing.assert_frame_equal(outputs[0], outputs[1])
+
+
+def test_cli_sheet_index(tmp_path):
+    # The sidecar index of the first worksheet is not used for the others
+    pytest.importorskip('openpyxl')
+    expression_matrix = pd.read_csv(data_file, sep='\t', index_col=0)
+    excel_file = str(tmp_path / 'input.xlsx')
+    with pd.ExcelWriter(excel_file) as writer:
+        expression_matrix.to_excel(writer, sheet_name='s0')
+        expression_matrix.pow(2).to_excel(writer, sheet_name='s1')
+    outputs = {}
+    for index in [False, True]:
+        if index:
+            write_index(excel_file, expression_matrix.astype(float))
+        output_file = str(tmp_path / 'output.tsv')
+        tspex_cli(excel_file, output_file, 'tau', False, False, 0, sheet='s1')
+        outputs[index] = pd.read_csv(output_file, sep='\t', index_col=0)
+    pd.testing.assert_frame_equal(outputs[False], outputs[True])
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import tspex
+from tspex import TissueSpecificity
+
+test_data = pd.read_csv(
+    'tests/test_data.tsv', index_col=0, header=0, sep=None, thousands=',', engine='python'
+)
+random_state = np.random.RandomState(0)
+other_data = pd.DataFrame(
+    test_data.values * random_state.gamma(2, 0.5, size=test_data.shape),
+    index=test_data.index,
+    columns=test_data.columns,
+)
+
+
+@pytest.mark.parametrize('method', ['tau', 'spm'])
+def test_compare(method):
+    # Genes and tissues are aligned by name
+    shuffled = other_data.iloc[::-1, ::-1]
+    with pytest.warns(UserWarning):
+        comparison = tspex.compare(test_data, shuffled.iloc[1:], method, log=True)
+    assert list(comparison.index) == list(test_data.index[:-1])
+    for column, data in [('score_a', test_data), ('score_b', other_data)]:
+        reference = TissueSpecificity(data, method, log=True).tissue_specificity
+        if reference.ndim == 2:
+            reference = reference.max(axis=1)
+        assert np.allclose(comparison[column], reference.iloc[:-1], equal_nan=True)
+    delta = comparison['score_b'] - comparison['score_a']
+    assert np.allclose(comparison['delta'], delta, equal_nan=True)
+    assert comparison['rank'].idxmin() == delta.abs().idxmax()
+
+
+def test_compare_permutations():
+    comparison = tspex.compare(
+        test_data, other_data, 'tau', permutations=200, random_state=0, block_size=3
+    )
+    assert comparison['p_value'].between(1 / 201, 1).all()
+    assert comparison['p_value'].equals(
+        tspex.compare(test_data, other_data, 'tau', permutations=200, random_state=0)[
+            'p_value'
+        ]
+    )
+    identical = tspex.compare(test_data, test_data, 'tau', permutations=20)
+    assert (identical['delta'] == 0).all()
+    assert (identical['p_value'] == 1).all()
+
+
+def test_compare_validation():
+    with pytest.raises(ValueError):
+        tspex.compare(test_data, other_data, 'unknown')
+    with pytest.raises(ValueError):
+        tspex.compare(test_data, other_data.add_prefix('x'), 'tau')
+    with pytest.raises(ValueError):
+        tspex.compare(test_data, other_data.set_axis(['x'] * 6, axis=1), 'tau')
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+import numpy as np
+import pandas as pd
+
+from tspex import TissueSpecificity
+from tspex.core.histogram_class import StreamingHistogram
+
+test_data = pd.read_csv(
+    'tests/test_data.tsv', index_col=0, header=0, sep=None, thousands=',', engine='python'
+)
+random_values = np.random.RandomState(42).rand(5000).round(4)
+
+
+def test_histogram_blockwise_counts():
+    histogram = StreamingHistogram(bins=20)
+    for block in np.array_split(random_values, 7):
+        histogram.update(block)
+    assert histogram.n == 5000
+    assert np.all(
+        histogram.counts == np.histogram(random_values, bins=20, range=(0, 1))[0]
+    )
+
+
+def test_histogram_merge():
+    histogram_a = StreamingHistogram()
+    histogram_b = StreamingHistogram()
+    histogram_a.update(random_values[:2000])
+    histogram_b.update(random_values[2000:])
+    histogram_a.merge(histogram_b)
+    histogram = StreamingHistogram()
+    histogram.update(random_values)
+    assert np.all(histogram_a.counts == histogram.counts)
+    assert histogram_a.quantile(0.5) == histogram.quantile(0.5)
+
+
+def test_histogram_quantiles():
+    histogram = StreamingHistogram()
+    histogram.update(random_values)
+    quantiles = [0, 0.05, 0.5, 0.95, 1]
+    assert np.allclose(
+        histogram.quantile(quantiles), np.quantile(random_values, quantiles), atol=2e-4
+    )
+    assert np.isnan(StreamingHistogram().quantile(0.5))
+
+
+def test_histogram_out_of_range():
+    histogram = StreamingHistogram(bins=10)
+    histogram.update([-0.5, 0.5, 1.5, np.nan])
+    assert histogram.n == 3
+    assert histogram.counts.sum() == 1
+    assert (histogram.underflow, histogram.overflow) == (1, 1)
+    assert histogram.quantile(0) == -0.5
+    assert histogram.quantile(1) == 1.5
+    frame = histogram.to_frame()
+    assert len(frame) == 12
+    assert frame['count'].sum() == histogram.n
+    assert frame['count'].iloc[[0, -1]].tolist() == [1, 1]
+
+
+def test_specificity_class_histogram():
+    # General scoring metric
+    histogram = TissueSpecificity(test_data, method='gini').histogram(block_size=3)
+    assert np.all(
+        histogram.counts
+        == np.histogram(
+            TissueSpecificity(test_data, method='gini').tissue_specificity,
+            bins=30,
+            range=(0, 1),
+        )[0]
+    )
+    # Individualized scoring metric with values outside of the [0,1] range
+    histogram = TissueSpecificity(test_data, method='zscore', transform=False).histogram()
+    assert histogram.n == 10
+    assert histogram.edges[-1] > 1
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tspex import TissueSpecificity
+from tspex.core.index_functions import (
+    INDEX_METHODS,
+    build_index,
+    index_keys,
+    index_path,
+    index_specificity,
+    read_index,
+    write_index,
+)
+
+data_file = os.path.join(os.path.dirname(__file__), 'test_data.tsv')
+
+
+@pytest.fixture
+def indexed_file(tmp_path):
+    input_file = str(tmp_path / 'test_data.tsv')
+    shutil.copy(data_file, input_file)
+    write_index(input_file, pd.read_csv(input_file, sep='\t', index_col=0))
+    return input_file
+
+
+@pytest.mark.parametrize('method', INDEX_METHODS)
+@pytest.mark.parametrize('log', [False, True])
+@pytest.mark.parametrize('transform', [False, True])
+def test_index_specificity(method, log, transform):
+    expression_data = pd.read_csv(data_file, sep='\t', index_col=0)
+    index = build_index(expression_data, block_size=3)
+    # Only the arrays that are loaded for the metric are used
+    index = {name: index[name] for name in index_keys(method, log)}
+    expected = TissueSpecificity(
+        expression_data, method, log, transform=transform, threshold=1
+    ).tissue_specificity
+    result = index_specificity(index, method, log, transform, 1)
+    pd.testing.assert_series_equal(result, expected, check_names=False)
+
+
+@pytest.mark.parametrize('log', [False, True])
+@pytest.mark.parametrize('transform', [False, True])
+def test_index_specificity_ties(log, transform):
+    # Values of data with few decimal places are often rounding ties, which
+    # are only rounded alike if they are computed with the same operations
+    random_state = np.random.RandomState(0)
+    expression_data = pd.DataFrame(
+        np.vstack(
+            [
+                random_state.randint(0, 20, size=(5000, 20)),
+                np.round(random_state.uniform(0, 10, size=(5000, 20)), 2),
+            ]
+        )
+    )
+    index = build_index(expression_data)
+    for method in INDEX_METHODS:
+        expected = TissueSpecificity(
+            expression_data, method, log, transform=transform, threshold=1
+        ).tissue_specificity
+        result = index_specificity(index, method, log, transform, 1)
+        np.testing.assert_array_equal(result.values, expected.values)
+
+
+def test_read_index(indexed_file):
+    assert os.path.exists(index_path(indexed_file))
+    assert read_index(indexed_file) is not None
+    keys = index_keys('tau', log=True)
+    assert sorted(read_index(indexed_file, keys=keys)) == sorted(keys)
+    assert 'sorted_profile' not in keys
+    assert 'sorted_profile' in index_keys('gini')
+    # An index that lacks some of the arrays is not used
+    assert read_index(indexed_file, keys=['genes', 'raw_max']) is None
+    with open(indexed_file, 'a') as fin:
+        fin.write('\n')
+    assert read_index(indexed_file) is None
+    assert read_index(indexed_file + '.missing') is None
+
+
+def test_from_file(indexed_file):
+    tso = TissueSpecificity.from_file(indexed_file, 'gini', log=True)
+    assert tso._expression_data is None
+    expected = TissueSpecificity(
+        pd.read_csv(data_file, sep='\t', index_col=0), 'gini', log=True
+    )
+    pd.testing.assert_series_equal(
+        tso.tissue_specificity, expected.tissue_specificity, check_names=False
+    )
+    pd.testing.assert_frame_equal(tso.expression_data, expected.expression_data)
+    tso = TissueSpecificity.from_file(indexed_file, 'zscore')
+    assert tso._expression_data is not None
+
+
+def test_from_file_sheet(tmp_path):
+    # The index is built from the first worksheet and is not used for the others
+    pytest.importorskip('openpyxl')
+    expression_data = pd.read_csv(data_file, sep='\t', index_col=0)
+    excel_file = str(tmp_path / 'test_data.xlsx')
+    with pd.ExcelWriter(excel_file) as writer:
+        expression_data.to_excel(writer, sheet_name='s0')
+        expression_data.iloc[:, ::-1].pow(2).to_excel(writer, sheet_name='s1')
+    write_index(excel_file, expression_data)
+    for sheet in ['s1', 1]:
+        expected = TissueSpecificity(
+            expression_data.iloc[:, ::-1].pow(2).astype(float), 'tau'
+        ).tissue_specificity
+        tso = TissueSpecificity.from_file(excel_file, 'tau', sheet=sheet)
+        assert tso._expression_data is not None
+        pd.testing.assert_series_equal(
+            tso.tissue_specificity, expected, check_names=False
+        )
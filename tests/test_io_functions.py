@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+import importlib.util
+import io
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tspex.core.index_functions import read_index, write_index
+from tspex.core.io_functions import (
+    iter_excel_blocks,
+    iter_expression_blocks,
+    read_expression_matrix,
+    read_gmt,
+)
+
+data_file = os.path.join(os.path.dirname(__file__), 'test_data.tsv')
+
+
+def test_iter_expression_blocks():
+    expression_matrix = read_expression_matrix(data_file)
+    with open(data_file) as fin:
+        tsv_data = fin.read()
+    for data in [tsv_data, tsv_data.replace('\t', ',')]:
+        blocks = list(iter_expression_blocks(io.StringIO(data), block_size=3))
+        assert [len(block) for block in blocks] == [3, 3, 3, 1]
+        pd.testing.assert_frame_equal(pd.concat(blocks), expression_matrix)
+
+
+def test_iter_expression_blocks_text_values():
+    # A text cell in one block does not change the columns of that block
+    data = 'gene\tA\tB\ng1\t1\t2\ng2\t3\tunknown\ng3\t5\t6\n'
+    with pytest.warns(UserWarning, match='1 non-numerical values'):
+        blocks = list(iter_expression_blocks(io.StringIO(data), block_size=1))
+    assert all(list(block.columns) == ['A', 'B'] for block in blocks)
+    assert all(block.dtypes.map(pd.api.types.is_numeric_dtype).all() for block in blocks)
+    assert np.isnan(blocks[1].loc['g2', 'B'])
+
+
+def test_iter_excel_blocks(tmp_path):
+    pytest.importorskip('openpyxl')
+    expression_matrix = read_expression_matrix(data_file)
+    excel_file = str(tmp_path / 'test_data.xlsx')
+    with pd.ExcelWriter(excel_file) as writer:
+        expression_matrix.iloc[:2].to_excel(writer, sheet_name='Other')
+        text_matrix = expression_matrix.astype(object)
+        text_matrix.iloc[0, 0] = '{:,}'.format(expression_matrix.iloc[0, 0] * 1000)
+        text_matrix.to_excel(writer, sheet_name='Expression')
+    blocks = list(iter_excel_blocks(excel_file, block_size=4, sheet='Expression'))
+    assert [len(block) for block in blocks] == [4, 4, 2]
+    expected = expression_matrix.copy()
+    expected.iloc[0, 0] *= 1000
+    pd.testing.assert_frame_equal(pd.concat(blocks), expected)
+    pd.testing.assert_frame_equal(read_expression_matrix(excel_file, sheet=1), expected)
+    assert len(read_expression_matrix(excel_file)) == 2
+    pytest.raises(ValueError, list, iter_excel_blocks(excel_file, sheet='Missing'))
+
+
+def test_iter_excel_blocks_blank_rows(tmp_path):
+    openpyxl = pytest.importorskip('openpyxl')
+    excel_file = str(tmp_path / 'blank_rows.xlsx')
+    workbook = openpyxl.Workbook()
+    for row in [['gene', 'A', 'B'], ['a', 1, 2], [None, None, None], ['b', 3, 4]]:
+        workbook.active.append(row)
+    workbook.save(excel_file)
+    blocks = list(iter_excel_blocks(excel_file, block_size=1))
+    assert [block.index[0] for block in blocks] == ['a', 'b']
+
+
+def test_iter_excel_blocks_text_values(tmp_path):
+    # A text cell in a later block does not change the columns of that block
+    openpyxl = pytest.importorskip('openpyxl')
+    excel_file = str(tmp_path / 'text_values.xlsx')
+    workbook = openpyxl.Workbook()
+    rows = [
+        ['gene', 'A', 'B', 'C'],
+        ['g1', 1, 2, 3],
+        ['g2', 4, 5, 6],
+        ['g3', 7, 'n/a', 9],
+    ]
+    for row in rows:
+        workbook.active.append(row)
+    workbook.save(excel_file)
+    with pytest.warns(UserWarning, match='1 non-numerical values'):
+        blocks = list(iter_excel_blocks(excel_file, block_size=2))
+    assert all(list(block.columns) == ['A', 'B', 'C'] for block in blocks)
+    assert all(block.dtypes.map(pd.api.types.is_numeric_dtype).all() for block in blocks)
+    assert np.isnan(blocks[1].loc['g3', 'B'])
+    assert blocks[1].loc['g3', 'C'] == 9
+
+
+def test_read_expression_matrix_genes(tmp_path):
+    expression_matrix = read_expression_matrix(data_file)
+    genes = ['Gene_07', 'Gene_02']
+    expected = expression_matrix.loc[['Gene_02', 'Gene_07']]
+    input_file = str(tmp_path / 'test_data.tsv')
+    shutil.copy(data_file, input_file)
+    pd.testing.assert_frame_equal(
+        read_expression_matrix(input_file, genes=genes), expected
+    )
+    # Rows read at the offsets stored in the sidecar index
+    write_index(input_file, expression_matrix)
+    assert 'line_offsets' in read_index(input_file)
+    pd.testing.assert_frame_equal(
+        read_expression_matrix(input_file, genes=genes), expected
+    )
+    with pytest.warns(UserWarning):
+        read_expression_matrix(input_file, genes=genes + ['Missing_gene'])
+    if importlib.util.find_spec('pyarrow') is not None:
+        parquet_file = str(tmp_path / 'test_data.parquet')
+        expression_matrix.to_parquet(parquet_file)
+        pd.testing.assert_frame_equal(
+            read_expression_matrix(parquet_file, genes=genes), expected
+        )
+
+
+def test_read_gmt(tmp_path):
+    gmt_file = str(tmp_path / 'gene_sets.gmt')
+    with open(gmt_file, 'w') as fout:
+        fout.write('SET_A\tFirst set\tGene_01\tGene_02\n')
+        fout.write('\n')
+        fout.write('SET_B\t\tGene_02\tGene_05\t\n')
+    assert read_gmt(gmt_file) == {
+        'SET_A': ['Gene_01', 'Gene_02'],
+        'SET_B': ['Gene_02', 'Gene_05'],
+    }
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+import numpy as np
+import pytest
+
+from tspex.core import masked_functions, matrix_functions
+
+methods = [
+    'counts',
+    'tau',
+    'gini',
+    'simpson',
+    'shannon_specificity',
+    'roku_specificity',
+    'tsi',
+    'zscore',
+    'spm',
+    'spm_dpm',
+    'js_specificity',
+    'js_specificity_dpm',
+]
+
+
+def make_matrix(n_tissues):
+    random_state = np.random.RandomState(n_tissues)
+    matrix = random_state.gamma(0.5, 10, size=(200, n_tissues))
+    matrix[random_state.rand(200, n_tissues) < 0.3] = 0
+    matrix[random_state.rand(200, n_tissues) < 0.3] = np.nan
+    # All-zero, all-missing and single-tissue profiles
+    matrix[0] = 0
+    matrix[0, -1] = np.nan
+    matrix[1] = np.nan
+    matrix[2] = np.nan
+    matrix[2, 0] = 5
+    return matrix
+
+
+@pytest.mark.parametrize('method', methods)
+@pytest.mark.parametrize('n_tissues', [1, 2, 6, 31])
+@pytest.mark.parametrize('transform', [True, False])
+def test_masked_functions_match_observed_tissues(method, n_tissues, transform):
+    matrix = make_matrix(n_tissues)
+    computed = getattr(masked_functions, method)(
+        matrix, transform=transform, threshold=1.5
+    )
+    expected = np.full(computed.shape, np.nan)
+    for i, vector in enumerate(matrix):
+        observed = ~np.isnan(vector)
+        if not observed.any():
+            continue
+        value = getattr(matrix_functions, method)(
+            vector[np.newaxis, observed], transform=transform, threshold=1.5
+        )[0]
+        if computed.ndim == 2:
+            expected[i, observed] = value
+        else:
+            expected[i] = value
+    assert np.allclose(computed, expected, atol=1e-10, equal_nan=True)
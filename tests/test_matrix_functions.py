@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+import numpy as np
+import pytest
+
+from tspex.core import matrix_functions, specificity_functions
+
+methods = [
+    'counts',
+    'tau',
+    'gini',
+    'simpson',
+    'shannon_specificity',
+    'roku_specificity',
+    'tsi',
+    'zscore',
+    'spm',
+    'spm_dpm',
+    'js_specificity',
+    'js_specificity_dpm',
+]
+
+
+def make_matrix(n_tissues):
+    random_state = np.random.RandomState(n_tissues)
+    matrix = random_state.gamma(0.5, 10, size=(200, n_tissues))
+    matrix[random_state.rand(200, n_tissues) < 0.4] = 0
+    # All-zero, constant and single-tissue profiles
+    matrix[0] = 0
+    matrix[1] = 3
+    matrix[2] = 0
+    matrix[2, 0] = 5
+    return matrix
+
+
+@pytest.mark.filterwarnings('ignore::RuntimeWarning')
+@pytest.mark.parametrize('method', methods)
+@pytest.mark.parametrize('n_tissues', [1, 2, 6, 31])
+@pytest.mark.parametrize('transform', [True, False])
+def test_matrix_functions_match_vector_functions(method, n_tissues, transform):
+    matrix = make_matrix(n_tissues)
+    expected = []
+    for vector in matrix:
+        value = getattr(specificity_functions, method)(
+            vector, transform=transform, threshold=1.5
+        )
+        # Vector functions return a single zero for all-zero profiles
+        if np.ndim(value) and len(value) != n_tissues:
+            value = np.repeat(value, n_tissues)
+        expected.append(value)
+    computed = getattr(matrix_functions, method)(
+        matrix, transform=transform, threshold=1.5
+    )
+    assert computed.shape == np.array(expected).shape
+    assert np.allclose(computed, expected, atol=1e-10)
+
+
+@pytest.mark.parametrize('n_tissues', [1, 2, 6, 31])
+def test_counts_thresholds(n_tissues):
+    matrix = make_matrix(n_tissues)
+    thresholds = [5, 0, 1.5, 20, 3]
+    expected = np.column_stack(
+        [matrix_functions.counts(matrix, threshold=threshold) for threshold in thresholds]
+    )
+    assert np.array_equal(matrix_functions.counts(matrix, threshold=thresholds), expected)
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+import time
+
+import pytest
+
+from tspex.core.progress_class import (
+    CancellationToken,
+    ComputationCancelled,
+    ProgressTracker,
+)
+from tspex.pipeline import BlockPipeline
+
+
+def slow_square(block):
+    # Later blocks finish first, so that they must be reordered by the writer
+    time.sleep(0.002 * (10 - block % 10))
+    return block**2
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+@pytest.mark.parametrize('queue_size', [1, 3])
+def test_block_pipeline_order(workers, queue_size):
+    written = []
+    stats = BlockPipeline(
+        range(50), slow_square, written.append, workers=workers, queue_size=queue_size
+    ).run()
+    assert written == [block**2 for block in range(50)]
+    assert stats['blocks'] == 50
+    assert 1 <= stats['input_queue_max_depth'] <= queue_size
+    assert 1 <= stats['output_queue_max_depth'] <= queue_size
+    assert all(stats[key] >= 0 for key in ['read_stall', 'compute_stall', 'write_stall'])
+
+
+def test_block_pipeline_errors():
+    def read_blocks():
+        yield 1
+        raise ValueError('Invalid block.')
+
+    with pytest.raises(ValueError, match='Invalid block.'):
+        BlockPipeline(read_blocks(), slow_square, list().append).run()
+
+    def compute(block):
+        if block == 20:
+            raise KeyError(block)
+        return block
+
+    written = []
+    with pytest.raises(KeyError):
+        BlockPipeline(range(1000), compute, written.append, workers=2).run()
+    assert len(written) <= 20
+    with pytest.raises(ValueError):
+        BlockPipeline(range(10), compute, written.append, workers=0)
+
+
+def test_block_pipeline_cancellation():
+    token = CancellationToken()
+    tracker = ProgressTracker(lambda progress: None)
+
+    def read_blocks():
+        for block in range(1000):
+            if block == 10:
+                token.cancel()
+            yield [block]
+
+    written = []
+    with pytest.raises(ComputationCancelled):
+        BlockPipeline(
+            read_blocks(),
+            lambda block: block,
+            written.append,
+            workers=2,
+            progress=tracker,
+            cancel_token=token,
+        ).run()
+    # Blocks read before the cancellation are written, in order
+    assert written == [[block] for block in range(len(written))]
+    assert len(written) == 10
+    assert tracker.processed == len(written)
+
+
+def test_block_pipeline_late_cancellation():
+    # A cancellation after the last block was read leaves a complete output
+    token = CancellationToken()
+
+    def read_blocks():
+        yield from range(5)
+        token.cancel()
+
+    written = []
+    BlockPipeline(
+        read_blocks(), lambda block: block, written.append, cancel_token=token
+    ).run()
+    assert written == list(range(5))
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+import pytest
+
+from tspex.core.progress_class import (
+    CancellationToken,
+    ComputationCancelled,
+    ProgressTracker,
+)
+
+
+def test_progress_tracker():
+    reports = []
+    tracker = ProgressTracker(reports.append)
+    tracker.update(10)
+    assert reports[-1].processed == 10
+    assert reports[-1].total is None and reports[-1].eta is None
+    tracker.total = 40
+    tracker.update(10)
+    assert reports[-1].processed == 20 and reports[-1].total == 40
+    assert reports[-1].throughput > 0
+    assert reports[-1].eta == pytest.approx(20 / reports[-1].throughput)
+
+
+def test_cancellation_token():
+    token = CancellationToken()
+    assert not token.cancelled
+    token.raise_if_cancelled()
+    token.cancel()
+    assert token.cancelled
+    with pytest.raises(ComputationCancelled) as cancelled:
+        token.raise_if_cancelled(partial=[1, 2])
+    assert cancelled.value.partial == [1, 2]
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import tspex
+from tspex import TissueSpecificity
+
+test_data = pd.read_csv(
+    'tests/test_data.tsv', index_col=0, header=0, sep=None, thousands=',', engine='python'
+)
+methods = [
+    'counts',
+    'tau',
+    'gini',
+    'simpson',
+    'shannon_specificity',
+    'roku_specificity',
+    'tsi',
+    'zscore',
+    'spm',
+    'spm_dpm',
+    'js_specificity',
+    'js_specificity_dpm',
+]
+
+
+@pytest.mark.parametrize('method', methods)
+@pytest.mark.parametrize('log', [True, False])
+def test_score_matches_specificity_class(method, log):
+    reference = TissueSpecificity(
+        test_data, method, log, transform=False, threshold=1
+    ).tissue_specificity.values
+    values = tspex.score(test_data.values, method, log, transform=False, threshold=1)
+    assert np.array_equal(values, reference, equal_nan=True)
+    single = tspex.score(test_data.values[1], method, log, transform=False, threshold=1)
+    assert np.array_equal(single, reference[1], equal_nan=True)
+    out = np.empty_like(reference)
+    result = tspex.score(
+        test_data.values, method, log, transform=False, threshold=1, out=out
+    )
+    assert result is out
+    assert np.array_equal(out, reference, equal_nan=True)
+
+
+def test_score_validation():
+    with pytest.raises(ValueError):
+        tspex.score(-test_data.values, 'tau')
+    with pytest.raises(ValueError):
+        tspex.score(test_data.values[np.newaxis, np.newaxis], 'tau')
+    with pytest.raises(ValueError):
+        tspex.score(test_data.values, 'unknown')
+    assert isinstance(tspex.score(test_data.values[0], 'tau'), float)
+
+
+@pytest.mark.parametrize('method', ['tau', 'spm'])
+def test_score_conditions(method):
+    cube = np.stack([test_data.values, 2 * test_data.values[::-1], test_data.values**2])
+    values = tspex.score(cube, method, log=True)
+    assert values.shape[:2] == cube.shape[:2]
+    for condition, matrix in enumerate(cube):
+        assert np.array_equal(
+            values[condition], tspex.score(matrix, method, log=True), equal_nan=True
+        )
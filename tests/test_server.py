@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+import asyncio
+import http.client
+import json
+import socket
+import threading
+
+import pandas as pd
+import pytest
+
+from tspex import TissueSpecificity
+from tspex.server import ScoringServer
+
+test_data = pd.read_csv(
+    'tests/test_data.tsv', index_col=0, header=0, sep=None, thousands=',', engine='python'
+)
+
+
+def run_server(scoring_server):
+    loop = asyncio.new_event_loop()
+    running_server = loop.run_until_complete(scoring_server.start(port=0))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield running_server.sockets[0].getsockname()[1]
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    running_server.close()
+    loop.run_until_complete(running_server.wait_closed())
+    loop.close()
+
+
+@pytest.fixture(scope='module')
+def server():
+    yield from run_server(ScoringServer({'test': test_data}, cache_size=15))
+
+
+def request(port, method, path, body=None):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    connection.request(method, path, body=body)
+    response = connection.getresponse()
+    payload = json.loads(response.read())
+    connection.close()
+    return response.status, payload
+
+
+def test_server_score(server):
+    reference = TissueSpecificity(test_data, method='gini', log=True).tissue_specificity
+    status, payload = request(
+        server, 'GET', '/score?method=gini&genes=Gene_01,Gene_08,X&log=1'
+    )
+    assert status == 200
+    assert payload['scores'] == {
+        'Gene_01': reference['Gene_01'],
+        'Gene_08': reference['Gene_08'],
+    }
+    assert payload['missing'] == ['X']
+    # Gene set sent in the request body
+    reference = TissueSpecificity(test_data, method='spm').tissue_specificity
+    status, payload = request(
+        server, 'POST', '/score', json.dumps({'method': 'spm', 'genes': ['Gene_03']})
+    )
+    assert payload['tissues'] == list(reference.columns)
+    assert payload['scores']['Gene_03'] == list(reference.loc['Gene_03'])
+
+
+def test_server_errors(server):
+    assert request(server, 'GET', '/score?method=unknown')[0] == 400
+    assert request(server, 'GET', '/score?method=tau&matrix=unknown')[0] == 400
+    assert request(server, 'GET', '/unknown')[0] == 404
+    # Malformed framing is answered instead of dropping the connection
+    with socket.create_connection(('127.0.0.1', server), timeout=10) as client:
+        client.sendall(b'POST /score HTTP/1.1\r\nContent-Length: abc\r\n\r\n')
+        response = client.makefile('rb').read()
+    assert response.startswith(b'HTTP/1.1 400 ')
+    assert b'Content-Length' in response.split(b'\r\n\r\n', 1)[1]
+
+
+class FailingServer(ScoringServer):
+    def score(self, *args, **kwargs):
+        raise RuntimeError('Unexpected failure.')
+
+
+def test_server_internal_errors():
+    for port in run_server(FailingServer({'test': test_data})):
+        status, payload = request(port, 'GET', '/score?method=tau')
+        assert status == 500
+        assert 'Unexpected failure.' in payload['error']
+        assert request(port, 'GET', '/stats')[1]['errors'] == 1
+
+
+def test_server_stats(server):
+    request(server, 'GET', '/score?method=tau&genes=Gene_02')
+    request(server, 'GET', '/score?method=tau&genes=Gene_02')
+    status, payload = request(server, 'GET', '/stats')
+    assert status == 200
+    assert payload['cache_hits'] >= 1
+    assert payload['cache_entries'] <= 15
+    assert payload['latency_ms']['max'] >= payload['latency_ms']['p50']
+
+
+def test_server_score_all_genes():
+    scoring_server = ScoringServer({'test': test_data})
+    reference = TissueSpecificity(
+        test_data, method='tau', transform=False
+    ).tissue_specificity
+    result = scoring_server.score('test', 'tau', transform='false')
+    assert list(result['scores'].values()) == list(reference)
@@ -22,7 +22,7 @@ import numpy as np
 import pandas as pd
 import pytest
 
-from tspex import TissueSpecificity
+from tspex import CancellationToken, ComputationCancelled, TissueSpecificity
 
 test_data = pd.read_csv(
     'tests/test_data.tsv', index_col=0, header=0, sep=None, thousands=',', engine='python'
@@ -219,3 +219,332 @@ def test_specificity_class_individualized_scoring():
             ]
         )
     )
+
+
+def test_specificity_class_storage():
+    reference = TissueSpecificity(test_data, method='spm').tissue_specificity
+    # Lossless storage types
+    for storage in ['float32', 'uint16', 'sparse']:
+        tissue_specificity = TissueSpecificity(test_data, method='spm', storage=storage)
+        assert tissue_specificity.tissue_specificity.equals(reference)
+    # Lossy storage type
+    tissue_specificity = TissueSpecificity(test_data, method='spm', storage='float16')
+    assert np.allclose(tissue_specificity.tissue_specificity, reference, atol=1e-3)
+    # General scoring metric
+    assert TissueSpecificity(
+        test_data, method='gini', storage='sparse'
+    ).tissue_specificity.equals(
+        TissueSpecificity(test_data, method='gini').tissue_specificity
+    )
+    # Values outside of the range supported by the "uint16" storage
+    pytest.raises(
+        ValueError,
+        TissueSpecificity,
+        test_data,
+        method='zscore',
+        transform=False,
+        storage='uint16',
+    )
+    pytest.raises(ValueError, TissueSpecificity, test_data, method='gini', storage='int8')
+
+
+def test_specificity_class_dask():
+    dd = pytest.importorskip('dask.dataframe')
+    da = pytest.importorskip('dask.array')
+    callbacks = pytest.importorskip('dask.callbacks')
+
+    class _ComputeCounter(callbacks.Callback):
+        computations = 0
+
+        def _start(self, dsk):
+            self.computations += 1
+
+    for method in ['gini', 'spm']:
+        reference = TissueSpecificity(test_data, method=method, log=True)
+        # dask DataFrame
+        tissue_specificity = TissueSpecificity(
+            dd.from_pandas(test_data, npartitions=3), method=method, log=True
+        )
+        assert tissue_specificity.tissue_specificity.compute().equals(
+            reference.tissue_specificity
+        )
+        # The values of each partition are computed once
+        with _ComputeCounter() as counter:
+            histogram = tissue_specificity.histogram()
+        assert counter.computations == 3
+        assert np.all(histogram.counts == reference.histogram().counts)
+        # dask Array
+        tissue_specificity = TissueSpecificity(
+            da.from_array(test_data.select_dtypes('number').values, chunks=(4, 2)),
+            method=method,
+            log=True,
+        )
+        assert np.array_equal(
+            tissue_specificity.tissue_specificity.compute(),
+            reference.tissue_specificity.values,
+        )
+    pytest.raises(
+        ValueError,
+        TissueSpecificity,
+        dd.from_pandas(duplicated_test_data, npartitions=2),
+        method='gini',
+    )
+    pytest.raises(
+        ValueError,
+        TissueSpecificity,
+        da.from_array(negative_test_data.values, chunks=4),
+        method='gini',
+    )
+    pytest.raises(
+        ValueError,
+        TissueSpecificity,
+        dd.from_pandas(test_data, npartitions=2),
+        method='gini',
+        storage='uint16',
+    )
+
+
+def test_specificity_class_missing_values():
+    missing_test_data = test_data.select_dtypes('number').copy()
+    missing_test_data.iloc[2, 1] = np.nan
+    missing_test_data.iloc[5, [0, 4]] = np.nan
+    for method in ['gini', 'zscore']:
+        tissue_specificity = TissueSpecificity(
+            missing_test_data, method=method, missing='ignore'
+        ).tissue_specificity
+        reference = TissueSpecificity(test_data, method=method).tissue_specificity
+        # Genes without missing values are not affected
+        complete_genes = missing_test_data.notna().all(axis=1)
+        assert tissue_specificity[complete_genes].equals(reference[complete_genes])
+        # Genes with missing values are computed over the observed tissues
+        observed = missing_test_data.iloc[5].dropna().to_frame().T
+        observed_reference = TissueSpecificity(observed, method=method).tissue_specificity
+        assert np.array_equal(
+            np.asarray(tissue_specificity.loc[observed.index]).ravel(),
+            (
+                np.asarray(observed_reference).ravel()
+                if method == 'gini'
+                else np.insert(np.asarray(observed_reference).ravel(), [0, 3], np.nan)
+            ),
+            equal_nan=True,
+        )
+    assert np.isnan(
+        TissueSpecificity(missing_test_data, method='gini').tissue_specificity[2]
+    )
+    pytest.raises(
+        ValueError, TissueSpecificity, missing_test_data, method='gini', missing='drop'
+    )
+
+
+def test_specificity_class_thresholds():
+    thresholds = [0, 1.5, 3]
+    tissue_specificity = TissueSpecificity(
+        test_data, method='counts', threshold=thresholds
+    ).tissue_specificity
+    assert list(tissue_specificity.columns) == thresholds
+    for threshold in thresholds:
+        assert np.array_equal(
+            tissue_specificity[threshold],
+            TissueSpecificity(
+                test_data, method='counts', threshold=threshold
+            ).tissue_specificity,
+        )
+
+
+def test_specificity_class_save_load(tmp_path):
+    for kwargs in [
+        {'method': 'spm', 'log': True},
+        {'method': 'gini', 'storage': 'sparse'},
+        {'method': 'counts', 'threshold': [0, 1.5, 3]},
+    ]:
+        tissue_specificity = TissueSpecificity(test_data, **kwargs)
+        tissue_specificity.save(str(tmp_path / kwargs['method']))
+        for mmap in [True, False]:
+            loaded = TissueSpecificity.load(str(tmp_path / kwargs['method']), mmap=mmap)
+            assert loaded.tissue_specificity.equals(tissue_specificity.tissue_specificity)
+            assert loaded.expression_data.equals(tissue_specificity.expression_data)
+            assert loaded._method == tissue_specificity._method
+            assert loaded._log == tissue_specificity._log
+
+
+def test_specificity_class_genes():
+    genes = ['Gene_07', 'Gene_02']
+    tissue_specificity = TissueSpecificity(test_data, method='spm', genes=genes)
+    reference = TissueSpecificity(test_data, method='spm').tissue_specificity
+    assert tissue_specificity.tissue_specificity.equals(
+        reference.loc[['Gene_02', 'Gene_07']]
+    )
+    assert list(tissue_specificity.expression_data.index) == ['Gene_02', 'Gene_07']
+
+
+def test_specificity_class_native_inputs():
+    pl = pytest.importorskip('polars')
+    pa = pytest.importorskip('pyarrow')
+    reference = TissueSpecificity(test_data, method='spm').tissue_specificity
+    data = test_data.rename_axis('gene').reset_index()
+    for native_data in [pl.from_pandas(data), pa.Table.from_pandas(data)]:
+        tissue_specificity = TissueSpecificity(native_data, method='spm')
+        assert tissue_specificity.tissue_specificity.equals(reference)
+        native = TissueSpecificity(native_data, method='spm', native_output=True)
+        assert isinstance(native.tissue_specificity, type(native_data))
+        assert native.tissue_specificity.shape == (len(reference), 1 + reference.shape[1])
+
+
+@pytest.mark.parametrize('method', ['tau', 'roku_specificity', 'js_specificity'])
+def test_specificity_class_filter_above(method):
+    tissue_specificity = TissueSpecificity(test_data, method=method)
+    reference = tissue_specificity.tissue_specificity
+    if reference.ndim == 2:
+        reference = reference[reference.max(axis=1) >= 0.5]
+    else:
+        reference = reference[reference >= 0.5]
+    assert tissue_specificity.filter_above(0.5).equals(reference)
+    deferred = TissueSpecificity(test_data, method=method, compute=False)
+    assert deferred.filter_above(0.5).equals(reference)
+    assert deferred._tissue_specificity_values is None
+
+
+def test_specificity_class_tissue_groups():
+    tissues = test_data.columns
+    tissue_groups = {
+        'organ': dict(zip(tissues, ['A', 'A', 'B', 'B', 'C', 'C'])),
+        'system': dict(zip(tissues, ['X', 'X', 'X', 'X', 'Y', 'Y'])),
+    }
+    tissue_specificity = TissueSpecificity(
+        test_data, method='spm', log=True, tissue_groups=tissue_groups
+    ).tissue_specificity
+    assert list(tissue_specificity.columns) == [
+        ('organ', 'A'),
+        ('organ', 'B'),
+        ('organ', 'C'),
+        ('system', 'X'),
+        ('system', 'Y'),
+    ]
+    for level, mapping in tissue_groups.items():
+        grouped_data = test_data.T.groupby(pd.Series(mapping)).sum().T
+        reference = TissueSpecificity(grouped_data, method='spm', log=True)
+        assert np.allclose(
+            tissue_specificity[level].values, reference.tissue_specificity.values
+        )
+    tau = TissueSpecificity(
+        test_data, method='tau', tissue_groups=pd.DataFrame(tissue_groups)
+    ).tissue_specificity
+    assert list(tau.columns) == ['organ', 'system']
+    with pytest.warns(UserWarning):
+        TissueSpecificity(test_data, method='tau', tissue_groups={tissues[0]: 'A'})
+
+
+@pytest.mark.parametrize('agg', ['sum', 'mean'])
+def test_specificity_class_from_gene_sets(agg):
+    gene_sets = {
+        'SET_A': ['Gene_01', 'Gene_02', 'Gene_03'],
+        'SET_B': ['Gene_03', 'Gene_04', 'Gene_00'],
+        'SET_C': ['Gene_00'],
+    }
+    with pytest.warns(UserWarning):
+        tissue_specificity = TissueSpecificity.from_gene_sets(
+            test_data, gene_sets, method='tsi', log=True, agg=agg
+        )
+    numeric_data = test_data.select_dtypes(include='number')
+    aggregated = pd.DataFrame(
+        {
+            'SET_A': getattr(numeric_data.loc[['Gene_01', 'Gene_02', 'Gene_03']], agg)(),
+            'SET_B': getattr(numeric_data.loc[['Gene_03', 'Gene_04']], agg)(),
+        }
+    ).T
+    reference = TissueSpecificity(aggregated, method='tsi', log=True)
+    assert np.allclose(
+        tissue_specificity.tissue_specificity.values, reference.tissue_specificity.values
+    )
+    assert list(tissue_specificity.tissue_specificity.index) == ['SET_A', 'SET_B']
+
+
+@pytest.mark.parametrize('method', ['tau', 'gini'])
+def test_specificity_class_window(method):
+    numeric_data = test_data.select_dtypes(include='number')
+    tissue_specificity = TissueSpecificity(
+        numeric_data, method=method, log=True, window=3, step=2
+    ).tissue_specificity
+    assert list(tissue_specificity.columns) == list(numeric_data.columns[[0, 2]])
+    for i, start in enumerate([0, 2]):
+        reference = TissueSpecificity(
+            numeric_data.iloc[:, start : start + 3], method=method, log=True
+        ).tissue_specificity
+        assert tissue_specificity.iloc[:, i].equals(
+            reference.rename(numeric_data.columns[start])
+        )
+    with pytest.raises(ValueError):
+        TissueSpecificity(numeric_data, method='spm', window=3)
+    with pytest.raises(ValueError):
+        TissueSpecificity(numeric_data, method='tau', window=10)
+
+
+def test_specificity_class_top_tissues():
+    numeric_data = test_data.select_dtypes(include='number')
+    fractions, tissues = TissueSpecificity(numeric_data, method='tau').top_tissues(2)
+    assert list(fractions.columns) == [1, 2]
+    gene = numeric_data.loc['Gene_02']
+    top = gene.sort_values(ascending=False)
+    assert list(tissues.loc['Gene_02']) == list(top.index[:2])
+    assert np.isclose(fractions.loc['Gene_02', 2], top.iloc[:2].sum() / gene.sum())
+
+
+def test_specificity_class_progress_cancellation(monkeypatch):
+    monkeypatch.setattr(TissueSpecificity, '_block_size', 3)
+    numeric_data = test_data.select_dtypes(include='number')
+    reference = TissueSpecificity(numeric_data, method='spm').tissue_specificity
+    reports = []
+    TissueSpecificity(numeric_data, method='spm', progress=reports.append)
+    assert [report.processed for report in reports][-1] == len(numeric_data)
+    assert all(report.total == len(numeric_data) for report in reports)
+    token = CancellationToken()
+
+    def cancel_after_first_block(progress):
+        token.cancel()
+
+    with pytest.raises(ComputationCancelled) as cancelled:
+        TissueSpecificity(
+            numeric_data,
+            method='spm',
+            progress=cancel_after_first_block,
+            cancel_token=token,
+        )
+    assert cancelled.value.partial.equals(reference.iloc[:3])
+
+
+@pytest.mark.parametrize('method', ['gini', 'tsi'])
+def test_specificity_class_conditions(method, tmp_path):
+    numeric_data = test_data.select_dtypes(include='number')
+    matrices = [numeric_data, numeric_data.iloc[::-1] * 3, numeric_data**2]
+    cube = np.stack([matrix.values for matrix in matrices])
+    tissue_specificity = TissueSpecificity(cube, method=method, log=True)
+    values = tissue_specificity.tissue_specificity
+    assert values.index.names == ['condition', 'gene']
+    assert len(values) == cube.shape[0] * cube.shape[1]
+    for condition, matrix in enumerate(matrices):
+        reference = TissueSpecificity(
+            pd.DataFrame(matrix.values), method=method, log=True
+        )
+        assert np.array_equal(
+            values.loc[condition].values,
+            reference.tissue_specificity.values,
+            equal_nan=True,
+        )
+    tissue_specificity.save(str(tmp_path / 'conditions'))
+    loaded = TissueSpecificity.load(str(tmp_path / 'conditions'))
+    assert loaded.tissue_specificity.index.names == ['condition', 'gene']
+    assert np.array_equal(loaded.tissue_specificity.values, values.values, equal_nan=True)
+
+
+def test_specificity_class_xarray_conditions():
+    xr = pytest.importorskip('xarray')
+    numeric_data = test_data.select_dtypes(include='number')
+    cube = xr.DataArray(
+        np.stack([numeric_data.values, numeric_data.values * 2]),
+        dims=['donor', 'gene', 'tissue'],
+        coords={'donor': ['D1', 'D2'], 'gene': numeric_data.index},
+    )
+    values = TissueSpecificity(cube, method='tau').tissue_specificity
+    reference = TissueSpecificity(numeric_data, method='tau').tissue_specificity
+    assert values.index.names == ['donor', 'gene']
+    assert values.loc['D2'].equals(reference)
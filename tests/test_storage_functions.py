@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+import numpy as np
+
+from tspex.core.storage_functions import decode_values, encode_values
+
+values = np.array([[0, 0.1234, 0], [0.9999, 0, np.nan], [0, 0, 6.5534], [1, 0.5, 0]])
+
+
+def test_encode_decode_values():
+    for storage in ['float64', 'float32', 'uint16', 'sparse']:
+        encoded = encode_values(values, storage)
+        assert np.array_equal(decode_values(encoded), values, equal_nan=True)
+        assert np.array_equal(decode_values(encoded, 1, 3), values[1:3], equal_nan=True)
+    assert np.allclose(
+        decode_values(encode_values(values, 'float16')), values, atol=5e-3, equal_nan=True
+    )
+
+
+def test_encode_values_size():
+    sparse_values = np.zeros((1000, 100))
+    sparse_values[::10, ::10] = 0.5
+    assert encode_values(sparse_values, 'uint16')['values'].nbytes == 200000
+    encoded = encode_values(sparse_values, 'sparse')
+    assert encoded['indices'].nbytes + encoded['values'].nbytes == 8000
+    assert np.array_equal(decode_values(encoded)[::10, ::10], sparse_values[::10, ::10])
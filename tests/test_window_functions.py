@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+import numpy as np
+import pytest
+
+from tspex.core import matrix_functions, window_functions
+
+
+def make_matrix():
+    random_state = np.random.RandomState(0)
+    matrix = random_state.gamma(0.5, 10, size=(300, 17))
+    matrix[random_state.rand(300, 17) < 0.3] = 0
+    # All-zero and partially zero profiles, a profile with large values before
+    # small ones and a missing value
+    matrix[0] = 0
+    matrix[1, :6] = 0
+    matrix[2, :8] *= 1e6
+    matrix[3, 5] = np.nan
+    return matrix
+
+
+@pytest.mark.parametrize('method', ['counts', 'tau', 'simpson', 'shannon_specificity'])
+@pytest.mark.parametrize('window', [1, 2, 5, 17])
+@pytest.mark.parametrize('step', [1, 3])
+@pytest.mark.parametrize('transform', [True, False])
+def test_window_functions_match_matrix_functions(method, window, step, transform):
+    matrix = make_matrix()
+    values = getattr(window_functions, method)(
+        matrix, window, step, transform=transform, threshold=5
+    )
+    reference = np.column_stack(
+        [
+            getattr(matrix_functions, method)(
+                matrix[:, start : start + window], transform=transform, threshold=5
+            )
+            for start in range(0, matrix.shape[1] - window + 1, step)
+        ]
+    )
+    assert np.allclose(values, reference, atol=1e-10, equal_nan=True)
+
+
+@pytest.mark.parametrize('method', ['tau', 'simpson'])
+@pytest.mark.parametrize('transform', [True, False])
+def test_window_functions_rounding_ties(method, transform):
+    # Values of data with few decimal places are often rounding ties, which
+    # are only rounded alike if they are computed with the same operations
+    random_state = np.random.RandomState(0)
+    matrix = np.round(random_state.uniform(0, 10, size=(5000, 12)), 2)
+    values = getattr(window_functions, method)(matrix, 5, transform=transform)
+    reference = np.column_stack(
+        [
+            getattr(matrix_functions, method)(
+                np.ascontiguousarray(matrix[:, start : start + 5]), transform=transform
+            )
+            for start in range(matrix.shape[1] - 4)
+        ]
+    )
+    np.testing.assert_array_equal(np.round(values, 4), np.round(reference, 4))
@@ -20,4 +20,11 @@
 
 """Top-level package for tspex."""
 
+from tspex.core.compare_functions import compare
+from tspex.core.progress_class import (
+    CancellationToken,
+    ComputationCancelled,
+    Progress,
+)
+from tspex.core.score_functions import score
 from tspex.core.specificity_class import TissueSpecificity
@@ -23,30 +23,616 @@ Command-line interface for tspex.
 """
 
 import argparse
+import csv
+import functools
+import os
+import shlex
+import signal
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
+import numpy as np
 import pandas as pd
 import tspex
+from tspex.core.histogram_class import StreamingHistogram
+from tspex.core.index_functions import (
+    INDEX_METHODS,
+    index_keys,
+    index_path,
+    index_specificity,
+    read_index,
+    write_index,
+)
+from tspex.core.io_functions import (
+    aggregate_gene_sets,
+    gene_mask,
+    iter_excel_blocks,
+    iter_expression_blocks,
+    prepare_expression_matrix,
+    read_expression_matrix,
+    read_gmt,
+    select_genes,
+)
+from tspex.core.progress_class import (
+    CancellationToken,
+    ComputationCancelled,
+    ProgressTracker,
+)
+from tspex.pipeline import BlockPipeline
+from tspex.server import ScoringServer
 
 
-def tspex_cli(input_file, output_file, method, log, disable_transformation, threshold):
-    """Compute gene tissue-specificity from a expression matrix file and save an output file."""
+def _open_output(output_file, mode='w'):
+    """Open an output file for writing, using the standard output if its path is "-"."""
+    if output_file == '-':
+        return sys.stdout.buffer if 'b' in mode else sys.stdout
+    if 'b' in mode:
+        return open(output_file, mode)
+    return open(output_file, mode, newline='')
+
+
+def _close_output(handle):
+    if handle in [sys.stdout, sys.stdout.buffer]:
+        handle.flush()
+    else:
+        handle.close()
+
+
+class _WideWriter:
+    """Write tissue-specificity values as a gene × tissue (or gene × value) TSV file."""
+
+    def __init__(self, output_file, min_score):
+        self._handle = _open_output(output_file)
+        self._header = True
+
+    def write(self, tissue_specificity):
+        tissue_specificity.to_csv(self._handle, sep='\t', header=self._header)
+        self._handle.flush()
+        self._header = False
+
+    def close(self):
+        _close_output(self._handle)
+
+
+class _LongWriter:
+    """Write tissue-specificity values above a minimum score as (gene, tissue, score) rows."""
+
+    def __init__(self, output_file, min_score):
+        self._handle = _open_output(output_file)
+        self._min_score = min_score
+        self._header = True
+
+    def write(self, tissue_specificity):
+        values = tissue_specificity.values
+        if isinstance(tissue_specificity, pd.DataFrame):
+            rows, columns = np.nonzero(values > self._min_score)
+            # Threshold sweeps of the "counts" metric have one column per threshold
+            column_name = tissue_specificity.columns.name or 'tissue'
+            long_format = pd.DataFrame(
+                {
+                    'gene': tissue_specificity.index[rows],
+                    column_name: tissue_specificity.columns[columns],
+                    'score': values[rows, columns],
+                }
+            )
+        else:
+            rows = np.flatnonzero(values > self._min_score)
+            long_format = pd.DataFrame(
+                {'gene': tissue_specificity.index[rows], 'score': values[rows]}
+            )
+        long_format.to_csv(self._handle, sep='\t', index=False, header=self._header)
+        self._handle.flush()
+        self._header = False
+
+    def close(self):
+        _close_output(self._handle)
+
+
+class _SparseWriter:
+    """
+    Collect tissue-specificity values above a minimum score and write them as a compressed CSR
+    matrix that can be read with scipy.sparse.load_npz.
+    """
+
+    def __init__(self, output_file, min_score):
+        self._output_file = output_file
+        self._min_score = min_score
+        self._genes = []
+        self._tissues = None
+        self._indptr = [np.zeros(1, dtype=np.int64)]
+        self._indices = []
+        self._data = []
+        self._nnz = 0
+
+    def write(self, tissue_specificity):
+        values = tissue_specificity.values
+        if values.ndim == 1:
+            values = values[:, np.newaxis]
+            tissues = [tissue_specificity.name or 'score']
+        else:
+            tissues = tissue_specificity.columns
+        if self._tissues is None:
+            self._tissues = np.array(tissues, dtype=str)
+        rows, columns = np.nonzero(values > self._min_score)
+        self._genes.append(np.array(tissue_specificity.index, dtype=str))
+        self._indptr.append(
+            self._nnz + np.cumsum(np.bincount(rows, minlength=len(values)))
+        )
+        self._indices.append(columns.astype(np.int32))
+        self._data.append(values[rows, columns].astype(np.float32))
+        self._nnz += len(rows)
+
+    def close(self):
+        genes = np.concatenate(self._genes) if self._genes else np.array([], dtype=str)
+        tissues = (
+            self._tissues if self._tissues is not None else np.array([], dtype=str)
+        )
+        handle = _open_output(self._output_file, 'wb')
+        try:
+            np.savez_compressed(
+                handle,
+                format=np.array(b'csr'),
+                shape=np.array([len(genes), len(tissues)]),
+                indptr=np.concatenate(self._indptr),
+                indices=np.concatenate(self._indices or [np.array([], dtype=np.int32)]),
+                data=np.concatenate(self._data or [np.array([], dtype=np.float32)]),
+                genes=genes,
+                tissues=tissues,
+            )
+        finally:
+            _close_output(handle)
+
+
+_OUTPUT_WRITERS = {'wide': _WideWriter, 'long': _LongWriter, 'npz': _SparseWriter}
+
+
+class _ProgressBar:
+    """Print the progress of a computation to the standard error, rewriting a single line."""
+
+    def __init__(self, width=30):
+        self._width = width
+        self._written = False
+
+    def __call__(self, progress):
+        if progress.total:
+            fraction = min(progress.processed / progress.total, 1)
+            filled = int(round(fraction * self._width))
+            line = '[{}{}] {:5.1f}% {}/{} genes, {:.0f} genes/s, ETA {}'.format(
+                '#' * filled,
+                ' ' * (self._width - filled),
+                100 * fraction,
+                progress.processed,
+                progress.total,
+                progress.throughput,
+                _format_seconds(progress.eta),
+            )
+        else:
+            line = '{} genes, {:.0f} genes/s, {} elapsed'.format(
+                progress.processed,
+                progress.throughput,
+                _format_seconds(progress.elapsed),
+            )
+        sys.stderr.write('\r' + line + '\033[K')
+        sys.stderr.flush()
+        self._written = True
+
+    def close(self):
+        if self._written:
+            sys.stderr.write('\n')
+            sys.stderr.flush()
+
+
+def _format_seconds(seconds):
+    if seconds is None:
+        return '--:--'
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return '{}:{:02d}:{:02d}'.format(hours, minutes, seconds)
+    return '{:02d}:{:02d}'.format(minutes, seconds)
+
+
+# Metrics whose values always lie in the [0,1] range, and the ones that only do
+# when they are transformed
+_UNIT_RANGE_METHODS = ['counts', 'tau', 'tsi', 'spm', 'js_specificity']
+_TRANSFORMED_UNIT_RANGE_METHODS = [
+    'gini',
+    'simpson',
+    'shannon_specificity',
+    'roku_specificity',
+    'zscore',
+]
+
+
+class _HistogramCollector:
+    """
+    Accumulate the histogram of the tissue-specificity values written by the CLI. If the values
+    are known to lie in the [0,1] range, they are binned block by block. Otherwise, the value of
+    each gene is kept until all of them are written, so that the bins cover the observed range,
+    as in TissueSpecificity.histogram.
+    """
+
+    def __init__(self, method, transform):
+        self._unit_range = method in _UNIT_RANGE_METHODS or (
+            transform and method in _TRANSFORMED_UNIT_RANGE_METHODS
+        )
+        self._histogram = StreamingHistogram() if self._unit_range else None
+        self._values = []
+
+    def update(self, tissue_specificity):
+        if isinstance(tissue_specificity, pd.DataFrame):
+            values = tissue_specificity.max(axis=1).values
+        else:
+            values = tissue_specificity.values
+        if self._unit_range:
+            self._histogram.update(values)
+        else:
+            self._values.append(np.asarray(values, dtype=float))
+
+    def histogram(self):
+        if self._unit_range:
+            return self._histogram
+        values = np.concatenate(self._values) if self._values else np.array([])
+        value_range = [0.0, 1.0]
+        if not np.all(np.isnan(values)):
+            value_range = [
+                min(value_range[0], np.nanmin(values)),
+                max(value_range[1], np.nanmax(values)),
+            ]
+        histogram = StreamingHistogram(value_range=value_range)
+        histogram.update(values)
+        return histogram
+
+
+def _read_gene_list(genes_file):
+    """Read a file with one gene name per line."""
+    with open(genes_file) as fin:
+        genes = [line.strip() for line in fin]
+    return list(dict.fromkeys(gene for gene in genes if gene))
+
+
+def _iter_expression_blocks(
+    input_file, block_size, sheet=None, genes=None, tracker=None
+):
+    """
+    Yield validated blocks of the expression matrix, restricted to a list of genes if one is given.
+    If the input file is "-" or an Excel (xlsx) file, the matrix is read one block at a time.
+    Otherwise, the total number of genes is set in the progress tracker, if one is given.
+    """
+    if input_file == '-':
+        expression_blocks = iter_expression_blocks(sys.stdin, block_size)
+    elif input_file.lower().endswith('.xlsx'):
+        expression_blocks = iter_excel_blocks(input_file, block_size, sheet)
+    else:
+        expression_matrix = prepare_expression_matrix(
+            read_expression_matrix(input_file, sheet, genes)
+        )
+        if tracker is not None:
+            tracker.total = len(expression_matrix)
+        for block_start in range(0, len(expression_matrix), block_size):
+            yield expression_matrix.iloc[block_start : block_start + block_size]
+        return
+    seen_genes = set()
+    for expression_block in expression_blocks:
+        if genes is not None:
+            expression_block = expression_block[
+                gene_mask(expression_block.index, genes)
+            ]
+        expression_block = prepare_expression_matrix(expression_block)
+        if not seen_genes.isdisjoint(expression_block.index):
+            raise ValueError(
+                'There are duplicated gene names in the input DataFrame index. Please, '
+                'correct this issue.'
+            )
+        seen_genes.update(expression_block.index)
+        yield expression_block
+    if genes is not None:
+        # Report the requested genes that were not found
+        select_genes(pd.DataFrame(index=list(seen_genes)), genes)
+
+
+def _iter_gene_set_blocks(
+    input_file,
+    block_size,
+    sheet,
+    genes,
+    gene_sets,
+    gene_set_aggregation,
+    missing,
+    tracker=None,
+):
+    """Yield blocks of the expression matrix aggregated over gene sets."""
+    expression_matrix = pd.concat(
+        list(_iter_expression_blocks(input_file, block_size, sheet, genes))
+    )
+    aggregated = aggregate_gene_sets(
+        expression_matrix, gene_sets, gene_set_aggregation, missing
+    )
+    if tracker is not None:
+        tracker.total = len(aggregated)
+    for block_start in range(0, len(aggregated), block_size):
+        yield aggregated.iloc[block_start : block_start + block_size]
+
+
+def _iter_index_specificity(
+    index, method, log, transform, threshold, block_size, genes, tracker=None
+):
+    """Yield blocks of tissue-specificity values computed from a sidecar index."""
+    tissue_specificity = index_specificity(
+        index, method, log, transform, threshold, genes
+    )
+    if genes is not None:
+        tissue_specificity = select_genes(tissue_specificity, genes)
+    if tracker is not None:
+        tracker.total = len(tissue_specificity)
+    for block_start in range(0, len(tissue_specificity), block_size):
+        yield tissue_specificity.iloc[block_start : block_start + block_size]
+
+
+def _identity(block):
+    return block
+
+
+def _compute_block(
+    expression_block, method, log, transform, threshold, missing, window, step
+):
+    return tspex.TissueSpecificity(
+        expression_block,
+        method,
+        log,
+        transform=transform,
+        threshold=threshold,
+        missing=missing,
+        window=window,
+        step=step,
+    ).tissue_specificity
+
+
+def tspex_cli(
+    input_file,
+    output_file,
+    method,
+    log,
+    disable_transformation,
+    threshold,
+    histogram_file=None,
+    output_format='wide',
+    min_score=0,
+    block_size=10000,
+    ignore_missing=False,
+    thresholds=None,
+    sheet=None,
+    genes_file=None,
+    gene_sets_file=None,
+    gene_set_aggregation='sum',
+    window=None,
+    step=1,
+    workers=1,
+    queue_size=2,
+    stats=False,
+    progress=False,
+    cancel_token=None,
+):
+    """
+    Compute gene tissue-specificity from a expression matrix file and save an output file. Genes
+    are processed in blocks by a pipeline in which a reader thread, compute workers and a writer
+    thread run concurrently, so that each block is written as soon as it is computed while the next
+    ones are read. If the input file has an up-to-date sidecar index and no worksheet is selected,
+    scalar metrics are computed from it without reading the expression matrix, as part of the
+    reading stage. If a GMT file is given, gene sets are scored instead of genes, from the
+    aggregated expression of their genes. If the input or output files are "-", the standard input
+    or output are used instead. Return the time, in seconds, spent reading, computing and writing,
+    along with the stall times and queue depths of the pipeline (see
+    `tspex.pipeline.BlockPipeline.run`), which are also printed to the standard error if stats is
+    True. If progress is True, a progress bar is printed to the standard error. If the cancellation
+    token is cancelled before every block is read, no more blocks are read, the blocks already read
+    are written and ComputationCancelled is raised after the output file and the histogram are
+    written, so that they hold the complete blocks computed so far.
+    """
     transform = not disable_transformation
-    if input_file.rsplit('.', 1)[1].lower() in ['xls', 'xlsx']:
-        expression_matrix = pd.read_excel(
-            input_file, index_col=0, header=0, thousands=','
+    threshold = thresholds if thresholds else threshold
+    missing = 'ignore' if ignore_missing else 'propagate'
+    genes = _read_gene_list(genes_file) if genes_file else None
+    writer = _OUTPUT_WRITERS[output_format](output_file, min_score)
+    histogram = _HistogramCollector(method, transform) if histogram_file else None
+    progress_bar = _ProgressBar() if progress else None
+    tracker = ProgressTracker(progress_bar) if progress else None
+    start = time.perf_counter()
+    if (
+        method in INDEX_METHODS
+        and missing != 'ignore'
+        and input_file != '-'
+        and not gene_sets_file
+        and window is None
+        and sheet is None
+    ):
+        index = read_index(input_file, keys=index_keys(method, log))
+    else:
+        index = None
+    if index is not None:
+        blocks = _iter_index_specificity(
+            index, method, log, transform, threshold, block_size, genes, tracker
         )
+        # Values are computed from the index by the reader
+        compute = _identity
     else:
-        expression_matrix = pd.read_csv(
-            input_file, index_col=0, header=0, sep=None, thousands=',', engine='python'
+        if gene_sets_file:
+            blocks = _iter_gene_set_blocks(
+                input_file,
+                block_size,
+                sheet,
+                genes,
+                read_gmt(gene_sets_file),
+                gene_set_aggregation,
+                missing,
+                tracker,
+            )
+        else:
+            blocks = _iter_expression_blocks(
+                input_file, block_size, sheet, genes, tracker
+            )
+        compute = functools.partial(
+            _compute_block,
+            method=method,
+            log=log,
+            transform=transform,
+            threshold=threshold,
+            missing=missing,
+            window=window,
+            step=step,
         )
-    tissue_specificity = tspex.TissueSpecificity(
-        expression_matrix, method, log, transform=transform, threshold=threshold
+
+    def write(tissue_specificity):
+        writer.write(tissue_specificity)
+        if histogram is not None:
+            histogram.update(tissue_specificity)
+
+    index_time = time.perf_counter() - start
+    pipeline = BlockPipeline(
+        blocks, compute, write, workers, queue_size, tracker, cancel_token
     )
-    tissue_specificity.tissue_specificity.to_csv(output_file, sep='\t')
+    cancelled = None
+    try:
+        timings = pipeline.run()
+    except ComputationCancelled as error:
+        # The output file and the histogram are still written for the
+        # complete blocks
+        cancelled = error
+        timings = None
+    finally:
+        if progress_bar is not None:
+            progress_bar.close()
+    start = time.perf_counter()
+    writer.close()
+    if histogram is not None:
+        histogram = histogram.histogram()
+        histogram.to_frame().to_csv(histogram_file, sep='\t', index=False)
+        histogram.summary().to_csv(sys.stderr, sep='\t', header=False)
+    if cancelled is not None:
+        raise cancelled
+    timings['read'] += index_time
+    timings['write'] += time.perf_counter() - start
+    if stats:
+        pd.Series(timings).to_csv(sys.stderr, sep='\t', header=False)
+    return timings
 
 
-def main():
+def _read_manifest(manifest_file):
+    """Parse a batch manifest into a list of (input, output, method, options) tuples."""
+    jobs = []
+    with open(manifest_file, newline='') as manifest:
+        for row in csv.reader(manifest, delimiter='\t'):
+            if not row or not row[0].strip() or row[0].startswith('#'):
+                continue
+            if row[0] == 'input_file':
+                continue
+            if len(row) < 3:
+                raise ValueError(
+                    'Manifest rows must have at least three columns (input file, output file '
+                    'and method): {}'.format('\t'.join(row))
+                )
+            options = row[3] if len(row) > 3 else ''
+            jobs.append((row[0], row[1], row[2], options))
+    return jobs
+
+
+def _run_batch_job(job):
+    """Run a single batch job, returning its status and timings instead of raising."""
+    input_file, output_file, method, options = job
+    start = time.perf_counter()
+    result = {'status': 'ok', 'read': 0.0, 'compute': 0.0, 'write': 0.0, 'error': ''}
+    try:
+        # The options follow the positional arguments, so that options with a
+        # variable number of values (e.g. --thresholds) do not consume them
+        arguments = _build_parser().parse_args(
+            [input_file, output_file, method] + shlex.split(options)
+        )
+        result.update(tspex_cli(**vars(arguments)))
+    except SystemExit:
+        result['status'] = 'failed'
+        result['error'] = 'Invalid options: {}'.format(options)
+    except Exception as error:
+        result['status'] = 'failed'
+        result['error'] = '{}: {}'.format(type(error).__name__, error)
+    result['total'] = time.perf_counter() - start
+    return result
+
+
+def _log_batch_job(job, result):
+    sys.stderr.write(
+        '{}\t{}\t{:.2f}s{}\n'.format(
+            job[0],
+            result['status'],
+            result['total'],
+            '\t' + result['error'] if result['error'] else '',
+        )
+    )
+
+
+def tspex_batch(manifest_file, report_file, processes):
+    """
+    Compute gene tissue-specificity for every job listed in a manifest file using a shared pool of
+    worker processes. Failed jobs are reported without aborting the batch. Return the number of
+    failed jobs.
+    """
+    jobs = _read_manifest(manifest_file)
+    results = [None] * len(jobs)
+    if processes == 1:
+        for i, job in enumerate(jobs):
+            results[i] = _run_batch_job(job)
+            _log_batch_job(job, results[i])
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = {
+                executor.submit(_run_batch_job, job): i for i, job in enumerate(jobs)
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as error:
+                    results[i] = {
+                        'status': 'failed',
+                        'read': 0.0,
+                        'compute': 0.0,
+                        'write': 0.0,
+                        'total': 0.0,
+                        'error': '{}: {}'.format(type(error).__name__, error),
+                    }
+                _log_batch_job(jobs[i], results[i])
+    report = pd.DataFrame(
+        [
+            {
+                'input_file': job[0],
+                'output_file': job[1],
+                'method': job[2],
+                'status': result['status'],
+                'read_seconds': round(result['read'], 4),
+                'compute_seconds': round(result['compute'], 4),
+                'write_seconds': round(result['write'], 4),
+                'total_seconds': round(result['total'], 4),
+                'error': result['error'],
+            }
+            for job, result in zip(jobs, results)
+        ],
+        columns=[
+            'input_file',
+            'output_file',
+            'method',
+            'status',
+            'read_seconds',
+            'compute_seconds',
+            'write_seconds',
+            'total_seconds',
+            'error',
+        ],
+    )
+    report.to_csv(report_file if report_file else sys.stdout, sep='\t', index=False)
+    return int((report['status'] != 'ok').sum())
+
+
+def _build_parser():
     method_choices = [
         'counts',
         'tau',
@@ -67,10 +653,19 @@ def main():
     )
     parser.add_argument('--version', action='version', version='%(prog)s 0.6.1')
     parser.add_argument(
-        'input_file', help='Expression matrix file in the TSV, CSV or Excel formats.'
+        'input_file',
+        help=(
+            'Expression matrix file in the TSV, CSV, Excel or Parquet formats. If "-", a TSV or '
+            'CSV matrix is read from the standard input, one block of genes at a time. Excel '
+            '(xlsx) files are also read one block of genes at a time.'
+        ),
     )
     parser.add_argument(
-        'output_file', help='Output TSV file containing tissue-specificity values.'
+        'output_file',
+        help=(
+            'Output TSV file containing tissue-specificity values. If "-", values are written to '
+            'the standard output as soon as each block of genes is computed.'
+        ),
     )
     parser.add_argument(
         'method',
@@ -98,14 +693,334 @@ def main():
         '-t',
         '--threshold',
         default=0,
-        type=int,
+        type=float,
         help=(
             'Threshold to be used with the "counts" metric. If another method is chosen, this '
             'parameter will be ignored.'
         ),
     )
+    parser.add_argument(
+        '--thresholds',
+        nargs='+',
+        type=float,
+        metavar='THRESHOLD',
+        help=(
+            'List of thresholds to be used with the "counts" metric, which is computed for each '
+            'one of them. The output contains one column per threshold. If this parameter is '
+            'used, the --threshold parameter will be ignored.'
+        ),
+    )
+    parser.add_argument(
+        '-f',
+        '--output_format',
+        default='wide',
+        choices=['wide', 'long', 'npz'],
+        help=(
+            'Format of the output file. "wide" writes a gene × tissue TSV file. "long" writes a '
+            'TSV file with one (gene, tissue, score) row per value above the minimum score. "npz" '
+            'writes values above the minimum score as a compressed sparse (CSR) matrix that can '
+            'be loaded with scipy.sparse.load_npz.'
+        ),
+    )
+    parser.add_argument(
+        '-m',
+        '--min_score',
+        default=0,
+        type=float,
+        help=(
+            'Only values greater than this score are written when the "long" or "npz" output '
+            'formats are used. If the "wide" format is chosen, this parameter will be ignored.'
+        ),
+    )
+    parser.add_argument(
+        '-b',
+        '--block_size',
+        default=10000,
+        type=int,
+        help='Number of genes that are computed and written at a time.',
+    )
+    parser.add_argument(
+        '-w',
+        '--workers',
+        default=1,
+        type=int,
+        help=(
+            'Number of threads computing blocks of genes while the next blocks are read and the '
+            'previous ones are written.'
+        ),
+    )
+    parser.add_argument(
+        '-q',
+        '--queue_size',
+        default=2,
+        type=int,
+        help=(
+            'Maximum number of blocks waiting to be computed and waiting to be written. Larger '
+            'queues absorb bursts of slow reads (e.g. from network filesystems) at the cost of '
+            'memory.'
+        ),
+    )
+    parser.add_argument(
+        '--stats',
+        action='store_true',
+        help=(
+            'Print the time spent reading, computing and writing, the time each stage spent '
+            'stalled waiting for the others and the depths of the queues to the standard error. '
+            'The stage that is rarely stalled is the bottleneck.'
+        ),
+    )
+    parser.add_argument(
+        '--progress',
+        action='store_true',
+        help=(
+            'Print a progress bar with the number of genes processed, the throughput and the '
+            'estimated time remaining to the standard error. Pressing Ctrl-C once stops reading '
+            'new blocks and keeps the complete blocks computed so far in the output file.'
+        ),
+    )
+    parser.add_argument(
+        '-s',
+        '--sheet',
+        help=(
+            'Name or zero-based index of the worksheet to be read from Excel input files. By '
+            'default, the first worksheet is read.'
+        ),
+    )
+    parser.add_argument(
+        '-g',
+        '--genes',
+        dest='genes_file',
+        metavar='GENES_FILE',
+        help=(
+            'File with one gene name per line. Only these genes are read from the input file '
+            'and scored. Reading is faster for Parquet files and for TSV or CSV files with a '
+            'sidecar index (see "tspex index").'
+        ),
+    )
+    parser.add_argument(
+        '--gene_sets',
+        dest='gene_sets_file',
+        metavar='GMT_FILE',
+        help=(
+            'Gene sets (e.g. pathways) in the GMT format. If this parameter is used, the '
+            'expression of the genes of each set is aggregated and gene sets are scored instead '
+            'of genes. Gene sets may overlap.'
+        ),
+    )
+    parser.add_argument(
+        '--gene_set_aggregation',
+        default='sum',
+        choices=['sum', 'mean'],
+        help='How the expression of the genes of each gene set is aggregated.',
+    )
+    parser.add_argument(
+        '--window',
+        type=int,
+        help=(
+            'Compute the metric within sliding windows of this number of consecutive columns '
+            '(e.g. the stages of a developmental time course). The output contains one column '
+            'per window, labeled after its first column. Only metrics that summarize each gene '
+            'in a single value are allowed.'
+        ),
+    )
+    parser.add_argument(
+        '--step',
+        default=1,
+        type=int,
+        help='Number of columns between the starts of consecutive windows.',
+    )
+    parser.add_argument(
+        '--ignore_missing',
+        action='store_true',
+        help=(
+            'Compute the tissue-specificity of each gene over the tissues in which it was '
+            'observed, ignoring missing (empty or NaN) expression values.'
+        ),
+    )
+    parser.add_argument(
+        '--histogram',
+        dest='histogram_file',
+        metavar='HISTOGRAM_FILE',
+        help=(
+            'Save a TSV file containing the histogram of the tissue-specificity values and print '
+            'a summary of their distribution (minimum, quantiles and maximum) to the standard '
+            'error. If the chosen metric is one of "tsi", "zscore", "spm" or "js_specificity", '
+            'the maximum value of each gene is used.'
+        ),
+    )
+    return parser
+
+
+def _build_batch_parser():
+    parser = argparse.ArgumentParser(
+        prog='tspex batch',
+        description=(
+            'Compute gene tissue-specificity for many expression matrices using a shared pool of '
+            'worker processes.'
+        ),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        'manifest_file',
+        help=(
+            'Tab-separated manifest file with one job per row. The columns are the input file, '
+            'the output file, the method and, optionally, the options of the job (e.g. "--log '
+            '--threshold 5"). Empty lines and lines starting with "#" are ignored.'
+        ),
+    )
+    parser.add_argument(
+        '-r',
+        '--report',
+        dest='report_file',
+        help=(
+            'Output TSV file containing the status and timings of each job. By default, the '
+            'report is written to the standard output.'
+        ),
+    )
+    parser.add_argument(
+        '-p',
+        '--processes',
+        type=int,
+        help='Number of worker processes. By default, one process per CPU is used.',
+    )
+    return parser
+
+
+def tspex_serve(matrix_files, host, port, cache_size):
+    """Load expression matrices once and score tissue-specificity on demand over HTTP."""
+    matrices = {}
+    for matrix_file in matrix_files:
+        if '=' in matrix_file:
+            name, matrix_file = matrix_file.split('=', 1)
+        else:
+            name = os.path.basename(matrix_file).split('.', 1)[0]
+        matrices[name] = read_expression_matrix(matrix_file)
+    server = ScoringServer(matrices, cache_size=cache_size)
+    sys.stderr.write(
+        'Serving {} on http://{}:{}\n'.format(', '.join(matrices), host, port)
+    )
+    server.serve_forever(host, port)
+
+
+def _build_serve_parser():
+    parser = argparse.ArgumentParser(
+        prog='tspex serve',
+        description=(
+            'Load expression matrices once and answer tissue-specificity queries from a local '
+            'HTTP server. Queries are sent to /score (e.g. /score?matrix=NAME&method=gini&'
+            'genes=GENE_1,GENE_2&log=true) and counters are available at /stats.'
+        ),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        'matrix_files',
+        nargs='+',
+        metavar='matrix_file',
+        help=(
+            'Expression matrix file in the TSV, CSV or Excel formats. Matrices are named after '
+            'their file names, unless given as NAME=FILE.'
+        ),
+    )
+    parser.add_argument(
+        '-H', '--host', default='127.0.0.1', help='Address to listen on.'
+    )
+    parser.add_argument(
+        '-p', '--port', default=8000, type=int, help='Port to listen on.'
+    )
+    parser.add_argument(
+        '-c',
+        '--cache_size',
+        default=100000,
+        type=int,
+        help='Maximum number of per-gene results kept in the cache.',
+    )
+    return parser
+
+
+def tspex_index(input_file, index_file):
+    """Build the per-gene statistics sidecar index of an expression matrix file."""
+    expression_matrix = prepare_expression_matrix(read_expression_matrix(input_file))
+    write_index(input_file, expression_matrix, index_file)
+
+
+def _build_index_parser():
+    parser = argparse.ArgumentParser(
+        prog='tspex index',
+        description=(
+            'Precompute per-gene statistics of an expression matrix and save them in a sidecar '
+            'index next to the file. Scalar metrics ("'
+            + '", "'.join(INDEX_METHODS)
+            + '") are then computed from the index, without reading the matrix again. The index '
+            'is ignored once the matrix file is modified.'
+        ),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        'input_file',
+        help='Expression matrix file in the TSV, CSV, Excel or Parquet formats.',
+    )
+    parser.add_argument(
+        '-o',
+        '--output',
+        dest='index_file',
+        help=(
+            'Path to the index file. By default, the index is saved next to the input file, '
+            'with the "{}" suffix. Indexes saved elsewhere are not used automatically.'.format(
+                index_path('')
+            )
+        ),
+    )
+    return parser
+
+
+def _subcommand(argv):
+    """
+    Return the subcommand named by the first argument, if any. An existing file with the name of a
+    subcommand is read as the input expression matrix instead.
+    """
+    if len(argv) > 1 and argv[1] in ['index', 'serve', 'batch']:
+        if not os.path.exists(argv[1]):
+            return argv[1]
+    return None
+
+
+def main():
+    subcommand = _subcommand(sys.argv)
+    if subcommand == 'index':
+        args = _build_index_parser().parse_args(sys.argv[2:])
+        tspex_index(**vars(args))
+        return
+    if subcommand == 'serve':
+        args = _build_serve_parser().parse_args(sys.argv[2:])
+        tspex_serve(**vars(args))
+        return
+    if subcommand == 'batch':
+        args = _build_batch_parser().parse_args(sys.argv[2:])
+        failed_jobs = tspex_batch(**vars(args))
+        sys.exit(1 if failed_jobs else 0)
+    parser = _build_parser()
     if len(sys.argv) < 2:
         parser.print_help()
         sys.exit(0)
     args = parser.parse_args()
-    tspex_cli(**vars(args))
+    cancel_token = CancellationToken()
+
+    def cancel(signum, frame):
+        # A second Ctrl-C interrupts the computation immediately
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        cancel_token.cancel()
+        sys.stderr.write('\nCancelling after the blocks that are being computed...\n')
+
+    signal.signal(signal.SIGINT, cancel)
+    try:
+        tspex_cli(cancel_token=cancel_token, **vars(args))
+    except ComputationCancelled:
+        sys.stderr.write(
+            'Cancelled. The output file contains the complete blocks computed so far.\n'
+        )
+        sys.exit(130)
+    except BrokenPipeError:
+        # The standard output was closed by the next command of the pipeline (e.g. head).
+        # Redirect it so that the interpreter does not fail again when flushing it at exit.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
@@ -24,6 +24,8 @@ Auxiliary functions.
 
 import numpy as np
 
+from tspex.core.progress_class import ComputationCancelled, ProgressTracker
+
 
 def dpm(vector):
     """
@@ -173,3 +175,261 @@ def js_distance(p, q):
     js = left - right
     jsd = np.sqrt(js)
     return jsd
+
+
+def _normalized_profiles(matrix):
+    matrix = np.asarray(matrix, dtype=float)
+    if matrix.ndim == 1:
+        matrix = matrix[np.newaxis, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = matrix / np.sum(matrix, axis=1)[:, np.newaxis]
+        h = -1 * np.sum(np.where(p > 0, p * np.log2(p), 0), axis=1)
+    # All-zero profiles cannot be normalized and have undefined distances
+    h[~np.any(matrix, axis=1)] = np.nan
+    return p, h
+
+
+def _js_distance_block(p_a, h_a, p_b, h_b):
+    # The entropy of the mixtures is accumulated one tissue at a time, so that
+    # memory usage is proportional to the number of pairs in the block. Zero
+    # probabilities are raised to the smallest positive float, whose logarithm
+    # is finite, so that they contribute 0 to the entropy.
+    half_p_a, half_p_b = p_a / 2, p_b / 2
+    mixture_entropy = np.zeros((len(p_a), len(p_b)))
+    m = np.empty_like(mixture_entropy)
+    m_log = np.empty_like(mixture_entropy)
+    for j in range(p_a.shape[1]):
+        np.add.outer(half_p_a[:, j], half_p_b[:, j], out=m)
+        np.log2(np.maximum(m, np.finfo(float).tiny, out=m_log), out=m_log)
+        m_log *= m
+        mixture_entropy -= m_log
+    js = mixture_entropy - (h_a[:, np.newaxis] + h_b[np.newaxis, :]) / 2
+    return np.sqrt(np.maximum(js, 0))
+
+
+def _js_distance_rows(p_a, h_a, p_b, h_b, block_size, k=None, offset=None):
+    """
+    Compute the distances between a block of profiles and all the profiles of
+    p_b, processing p_b in blocks. If k is given, only the k nearest
+    neighbours are kept. If offset is given, p_a is the block of p_b starting
+    at that row, and each profile is excluded from its own neighbours.
+    """
+
+    if k is None:
+        return np.concatenate(
+            [
+                _js_distance_block(
+                    p_a,
+                    h_a,
+                    p_b[start : start + block_size],
+                    h_b[start : start + block_size],
+                )
+                for start in range(0, len(p_b), block_size)
+            ],
+            axis=1,
+        )
+    rows = np.arange(len(p_a))[:, np.newaxis]
+    distances = np.full((len(p_a), 0), np.inf)
+    indices = np.zeros((len(p_a), 0), dtype=int)
+    for start in range(0, len(p_b), block_size):
+        block_distances = _js_distance_block(
+            p_a, h_a, p_b[start : start + block_size], h_b[start : start + block_size]
+        )
+        block_distances[np.isnan(block_distances)] = np.inf
+        block_indices = np.arange(start, start + block_distances.shape[1])
+        if offset is not None:
+            block_distances[block_indices == rows + offset] = np.inf
+        distances = np.concatenate([distances, block_distances], axis=1)
+        indices = np.concatenate(
+            [indices, np.broadcast_to(block_indices, block_distances.shape)], axis=1
+        )
+        if distances.shape[1] > k:
+            nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            distances = distances[rows, nearest]
+            indices = indices[rows, nearest]
+    order = np.argsort(distances, axis=1, kind='stable')
+    distances = distances[rows, order]
+    indices = indices[rows, order]
+    # Neighbours without a distance (e.g. of genes without expression) have no
+    # index, so that a gene is never listed among its own neighbours
+    missing = np.isinf(distances)
+    distances[missing] = np.nan
+    indices[missing] = -1
+    return distances, indices
+
+
+def pairwise_js_distance(
+    genes_a,
+    genes_b=None,
+    block_size=1000,
+    processes=None,
+    k=None,
+    progress=None,
+    cancel_token=None,
+):
+    """
+    Compute the Jensen-Shannon distance [1] between the expression profiles
+    of two sets of genes. Profiles are normalized and their entropies are
+    computed once, and distances are evaluated for blocks of genes at a time,
+    so that memory usage is bounded by the block size.
+
+    Parameters
+    ----------
+    genes_a : numpy.array
+        Expression matrix. Rows correspond to genes and columns to tissues.
+    genes_b : numpy.array, default None
+        Second expression matrix, with the same tissues as genes_a. By
+        default, distances are computed between all the genes of genes_a.
+    block_size : int, default 1000
+        Number of genes of each set compared at a time.
+    processes : int, default None
+        Number of processes used to compute blocks of genes_a in parallel. By
+        default, blocks are computed in the current process.
+    k : int, default None
+        Only return the distances to the k nearest neighbours of each gene of
+        genes_a. If genes_b is not given, genes are not considered neighbours
+        of themselves.
+    progress : callable, default None
+        Function called with a Progress tuple after each block of genes_a is
+        computed.
+    cancel_token : CancellationToken, default None
+        Token checked between blocks. If it is cancelled, the blocks that were
+        not started are discarded, the worker processes are shut down and
+        ComputationCancelled is raised.
+
+    Returns
+    -------
+    numpy.array or tuple of numpy.array
+        Matrix of the Jensen-Shannon distances between each gene of genes_a
+        (rows) and each gene of genes_b (columns). If k is given, a tuple of
+        two matrices with k columns, containing the distances to the nearest
+        neighbours of each gene, in ascending order, and their row indices in
+        genes_b. Distances involving genes without expression are NaN and, for
+        the nearest neighbours, their indices are -1.
+
+    References
+    ----------
+    .. [1] Endres, Dominik Maria, and Johannes E. Schindelin. "A new metric for
+           probability distributions." IEEE Transactions on Information theory
+           (2003).
+    """
+
+    p_a, h_a = _normalized_profiles(genes_a)
+    if genes_b is None:
+        p_b, h_b = p_a, h_a
+    else:
+        p_b, h_b = _normalized_profiles(genes_b)
+        if p_b.shape[1] != p_a.shape[1]:
+            raise ValueError('Both sets of genes must have the same number of tissues.')
+    if k is not None:
+        k = min(k, len(p_b) - 1 if genes_b is None else len(p_b))
+        if k < 1:
+            raise ValueError('There are no neighbours to return.')
+    tasks = [
+        (
+            p_a[start : start + block_size],
+            h_a[start : start + block_size],
+            p_b,
+            h_b,
+            block_size,
+            k,
+            start if genes_b is None else None,
+        )
+        for start in range(0, len(p_a), block_size)
+    ]
+    tracker = None if progress is None else ProgressTracker(progress, len(p_a))
+    results = []
+    if processes is None or processes == 1:
+        for task in tasks:
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            results.append(_js_distance_rows(*task))
+            if tracker is not None:
+                tracker.update(len(task[0]))
+    else:
+        from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [executor.submit(_js_distance_rows, *task) for task in tasks]
+            try:
+                for task, future in zip(tasks, futures):
+                    while True:
+                        if cancel_token is not None:
+                            cancel_token.raise_if_cancelled()
+                        try:
+                            results.append(future.result(timeout=0.1))
+                            break
+                        except TimeoutError:
+                            continue
+                    if tracker is not None:
+                        tracker.update(len(task[0]))
+            except ComputationCancelled:
+                # Blocks that were not started are dropped; the running ones
+                # finish before the pool is shut down on exit
+                for future in futures:
+                    future.cancel()
+                raise
+    if k is None:
+        if not results:
+            return np.zeros((0, len(p_b)))
+        return np.concatenate(results)
+    if not results:
+        return np.zeros((0, k)), np.zeros((0, k), dtype=int)
+    return (
+        np.concatenate([distances for distances, _ in results]),
+        np.concatenate([indices for _, indices in results]),
+    )
+
+
+def top_tissue_fractions(matrix, k, ignore_missing=False):
+    """
+    Compute, for each gene, the fraction of its expression found in its top
+    tissues. The k tissues with the highest expression of each gene are
+    selected with a single partial sort (`numpy.argpartition`) of each row,
+    and only those k values are then fully sorted. Genes whose expression is
+    concentrated in a small group of tissues (e.g. brain regions) have high
+    fractions for small values of k.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Expression matrix. Rows correspond to genes and columns to tissues.
+    k : int
+        Largest number of top tissues to be considered.
+    ignore_missing : bool, default False
+        Rank and sum only the observed (non-NaN) expression values, placing
+        missing tissues last. By default, genes with missing values have NaN
+        fractions.
+
+    Returns
+    -------
+    tuple of numpy.array
+        Two matrices with k columns. The first contains, in column i, the
+        fraction of the expression of each gene in its top i+1 tissues. The
+        second contains the column indices of the top tissues, in descending
+        order of expression. Genes without expression have fractions of 0.
+    """
+
+    n = matrix.shape[1]
+    if not 1 <= k <= n:
+        raise ValueError(
+            'k must be between 1 and the number of tissues ({}).'.format(n)
+        )
+    missing = np.isnan(matrix)
+    ranked = np.where(missing, np.inf, -matrix) if ignore_missing else -matrix
+    if k < n:
+        top = np.argpartition(ranked, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(n), matrix.shape)
+    order = np.argsort(np.take_along_axis(ranked, top, axis=1), axis=1, kind='stable')
+    top = np.take_along_axis(top, order, axis=1)
+    top_values = np.take_along_axis(matrix, top, axis=1)
+    if ignore_missing:
+        top_values = np.where(np.isnan(top_values), 0, top_values)
+        row_sum = np.nansum(matrix, axis=1)
+    else:
+        row_sum = np.sum(matrix, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fractions = np.cumsum(top_values, axis=1) / row_sum[:, np.newaxis]
+    fractions[row_sum == 0] = 0.0
+    return fractions, top
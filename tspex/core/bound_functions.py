@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+"""
+Vectorized upper bounds of the tissue-specificity metrics. For each row of the
+expression matrix, each function returns a value that is greater than or
+equal to the value computed by its counterpart in
+`tspex.core.matrix_functions` (for metrics that score each tissue, the maximum
+value of the row). The bounds only depend on cheap row statistics, so they can
+be used to discard genes that cannot reach a tissue-specificity threshold
+before the metric itself is computed. Metrics whose exact computation is as
+cheap as a bound have no counterpart in this module.
+"""
+
+import numpy as np
+
+
+def _max_ratio(matrix):
+    # Ratio between the largest expression value and the row sum. Rows without
+    # expression are assigned a ratio of 0.
+    row_sum = np.sum(matrix, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.max(matrix, axis=1) / row_sum
+    ratio[row_sum == 0] = 0.0
+    return ratio
+
+
+def gini(matrix, **kwargs):
+    """
+    Upper bound of the Gini coefficient. The weighted sum of the sorted values
+    is largest when the expression is concentrated in as few tissues as the
+    row maximum allows, which bounds the transformed coefficient by the Tau
+    index.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues.
+    transform : bool, default True
+        Bound the transformed Gini coefficient.
+
+    Returns
+    -------
+    numpy.array
+        Upper bound of the Gini coefficient of each gene.
+    """
+
+    transform = kwargs.pop('transform', True)
+    n = matrix.shape[1]
+    if n == 1:
+        return np.zeros(len(matrix))
+    ratio = _max_ratio(matrix)
+    with np.errstate(divide='ignore'):
+        bound = np.maximum(1 - 1 / (n * ratio), 0)
+    if transform:
+        bound = bound * (n / (n - 1))
+    return bound
+
+
+def shannon_specificity(matrix, **kwargs):
+    """
+    Upper bound of the Shannon entropy-based specificity. The Shannon entropy
+    of a profile is at least its min-entropy, the negative logarithm of the
+    largest tissue proportion.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues.
+    transform : bool, default True
+        Bound the transformed values.
+
+    Returns
+    -------
+    numpy.array
+        Upper bound of the Shannon entropy-based specificity of each gene.
+    """
+
+    transform = kwargs.pop('transform', True)
+    n = matrix.shape[1]
+    if n == 1:
+        return np.zeros(len(matrix))
+    ratio = _max_ratio(matrix)
+    with np.errstate(divide='ignore'):
+        bound = np.maximum(np.log2(n * ratio), 0)
+    if transform:
+        bound = bound / np.log2(n)
+    return bound
+
+
+def roku_specificity(matrix, **kwargs):
+    """
+    Upper bound of the ROKU specificity. The Tukey biweight lies within the
+    range of the row, so no deviation from it exceeds the range, and the sum
+    of the deviations is at least the sum of the deviations from the median.
+    Together they bound the largest deviation proportion and, through the
+    min-entropy, the entropy of the deviations.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues.
+    transform : bool, default True
+        Bound the transformed values.
+
+    Returns
+    -------
+    numpy.array
+        Upper bound of the ROKU specificity of each gene.
+    """
+
+    transform = kwargs.pop('transform', True)
+    n = matrix.shape[1]
+    if n == 1:
+        return np.zeros(len(matrix))
+    median = np.median(matrix, axis=1)[:, np.newaxis]
+    deviation_sum = np.sum(np.abs(matrix - median), axis=1)
+    value_range = np.max(matrix, axis=1) - np.min(matrix, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.minimum(value_range / deviation_sum, 1)
+        bound = np.maximum(np.log2(n * ratio), 0)
+    if transform:
+        bound = bound / np.log2(n)
+    # Constant rows have no deviations from the biweight
+    bound[value_range == 0] = 0.0
+    return bound
+
+
+def js_specificity(matrix, **kwargs):
+    """
+    Upper bound of the largest Jensen-Shannon distance-based specificity of
+    each gene. By Pinsker's inequality, the Jensen-Shannon divergence between
+    the expression profile and the profile specific to tissue i is at least
+    (1 - p_i)^2 / (2 ln 2), where p_i is the proportion of the expression in
+    that tissue.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues.
+
+    Returns
+    -------
+    numpy.array
+        Upper bound of the largest tissue-specificity value of each gene.
+    """
+
+    n = matrix.shape[1]
+    if n == 1:
+        return np.zeros(len(matrix))
+    ratio = _max_ratio(matrix)
+    bound = 1 - (1 - ratio) / np.sqrt(2 * np.log(2))
+    bound[ratio == 0] = 0.0
+    return bound
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+"""
+Differential tissue-specificity between two expression matrices.
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from tspex.core.io_functions import prepare_expression_matrix
+from tspex.core.score_functions import METHODS, compute_block
+
+
+def _align(expression_a, expression_b):
+    # Genes and tissues are matched through the hash tables of the indexes,
+    # keeping the order of the first matrix
+    alignment = []
+    for labels_a, labels_b, name in [
+        (expression_a.index, expression_b.index, 'genes'),
+        (expression_a.columns, expression_b.columns, 'tissues'),
+    ]:
+        if not (labels_a.is_unique and labels_b.is_unique):
+            raise ValueError('There are duplicated {} in the matrices.'.format(name))
+        positions_b = labels_b.get_indexer(labels_a)
+        shared = positions_b >= 0
+        if not shared.any():
+            raise ValueError('The matrices have no {} in common.'.format(name))
+        unmatched = len(labels_a) + len(labels_b) - 2 * shared.sum()
+        if unmatched:
+            warnings.warn(
+                '{} {} were not found in both matrices and were removed.'.format(
+                    unmatched, name
+                )
+            )
+        alignment.append((np.flatnonzero(shared), positions_b[shared]))
+    (genes_a, genes_b), (tissues_a, tissues_b) = alignment
+    matrix_a = expression_a.values[np.ix_(genes_a, tissues_a)]
+    matrix_b = expression_b.values[np.ix_(genes_b, tissues_b)]
+    return matrix_a, matrix_b, expression_a.index[genes_a]
+
+
+def _representative(values):
+    # The maximum tissue value represents the genes of per-tissue metrics
+    if values.ndim == 2:
+        return pd.DataFrame(values).max(axis=1).values
+    return values
+
+
+def _score_pair(matrix_a, matrix_b, func, transform, threshold):
+    # Both matrices are stacked so that they are computed in a single call
+    values = _representative(
+        compute_block(np.concatenate([matrix_a, matrix_b]), func, transform, threshold)
+    )
+    return values[: len(matrix_a)], values[len(matrix_a) :]
+
+
+def compare(
+    expression_a,
+    expression_b,
+    method,
+    log=False,
+    transform=True,
+    threshold=0,
+    permutations=0,
+    random_state=None,
+    block_size=10000,
+):
+    """
+    Compare the tissue-specificity of the genes of two expression matrices
+    (e.g. healthy and disease samples, or orthologs of two species). Genes and
+    tissues are matched by name and the metric is computed for both matrices
+    in a single pass over blocks of genes. Optionally, the significance of the
+    differences is assessed by a permutation test in which the conditions of
+    randomly chosen tissues are swapped.
+
+    Parameters
+    ----------
+    expression_a : pandas.DataFrame
+        First expression matrix, with rows corresponding to genes and columns
+        to tissues.
+    expression_b : pandas.DataFrame
+        Second expression matrix. Only the genes and tissues found in both
+        matrices are compared, in the order of the first matrix.
+    method : str
+        Tissue-specificity metric. One of: 'counts', 'tau', 'gini', 'simpson',
+        'shannon_specificity', 'roku_specificity', 'tsi', 'zscore', 'spm',
+        'spm_dpm', 'js_specificity', 'js_specificity_dpm'. For the 'tsi',
+        'zscore', 'spm' and 'js_specificity' metrics, the maximum value of
+        each gene is compared.
+    log : bool, default False
+        Log-transform the expression values before computing
+        tissue-specificity.
+    transform : bool, default True
+        Transform the tissue-specificity values so that they range from 0 to 1.
+    threshold : int or float, default 0
+        Expression threshold used by the 'counts' metric.
+    permutations : int, default 0
+        Number of permutations of the test. In each permutation, the values of
+        each tissue are swapped between the two matrices with probability 0.5,
+        the same tissues being swapped for all genes. By default, no test is
+        performed.
+    random_state : int or numpy.random.Generator, optional
+        Seed or generator used to draw the permutations.
+    block_size : int, default 10000
+        Number of genes computed at a time.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Tissue-specificity of each gene in both matrices ('score_a' and
+        'score_b'), their difference ('delta', the second minus the first) and
+        the rank of the gene by absolute difference ('rank', 1 for the largest
+        change). If permutations is greater than zero, the 'p_value' column
+        contains the fraction of permutations, counting the observed one, with
+        an absolute difference at least as large as the observed one.
+    """
+
+    func = METHODS.get(method)
+    if func is None:
+        raise ValueError(
+            'Invalid method. Allowed values are: "{}".'.format('", "'.join(METHODS))
+        )
+    matrix_a, matrix_b, genes = _align(
+        prepare_expression_matrix(expression_a), prepare_expression_matrix(expression_b)
+    )
+    if log:
+        matrix_a = np.log(matrix_a + 1)
+        matrix_b = np.log(matrix_b + 1)
+    if permutations:
+        # Drawn once, so that every block is tested with the same permutations
+        swaps = (
+            np.random.default_rng(random_state).random(
+                (permutations, matrix_a.shape[1])
+            )
+            < 0.5
+        )
+    scores_a, scores_b, exceedances = [], [], []
+    for start in range(0, len(genes), block_size):
+        block_a = matrix_a[start : start + block_size]
+        block_b = matrix_b[start : start + block_size]
+        score_a, score_b = _score_pair(block_a, block_b, func, transform, threshold)
+        scores_a.append(score_a)
+        scores_b.append(score_b)
+        if permutations:
+            delta = np.abs(score_b - score_a)
+            count = np.zeros(len(block_a))
+            for swap in swaps:
+                permuted_a, permuted_b = _score_pair(
+                    np.where(swap, block_b, block_a),
+                    np.where(swap, block_a, block_b),
+                    func,
+                    transform,
+                    threshold,
+                )
+                count += np.abs(permuted_b - permuted_a) >= delta
+            exceedances.append(count)
+    result = pd.DataFrame(
+        {'score_a': np.concatenate(scores_a), 'score_b': np.concatenate(scores_b)},
+        index=genes,
+    )
+    result['delta'] = np.round(result['score_b'] - result['score_a'], 4)
+    result['rank'] = result['delta'].abs().rank(ascending=False, method='min')
+    if permutations:
+        p_value = (np.concatenate(exceedances) + 1) / (permutations + 1)
+        result['p_value'] = np.where(result['delta'].isna(), np.nan, p_value)
+    return result
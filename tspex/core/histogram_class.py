@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+"""
+StreamingHistogram class of the tspex library.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class StreamingHistogram:
+    """
+    Accumulate a histogram of tissue-specificity values incrementally, so that
+    values can be added block by block without being held in memory.
+
+    Parameters
+    ----------
+    bins : int, default 30
+        Number of bins in the histogram.
+    value_range : tuple, default (0, 1)
+        Lower and upper edges of the histogram. Values outside this range are
+        not binned, but are counted as underflow or overflow.
+    resolution : float, default 1e-4
+        Width of the fine-grained bins used to estimate quantiles. As
+        tissue-specificity values are rounded to four decimal places, the
+        default resolution yields quantiles that are accurate to the last
+        decimal place.
+
+    Attributes
+    ----------
+    edges : numpy.array
+        Edges of the histogram bins.
+    counts : numpy.array
+        Number of values in each bin.
+    n : int
+        Number of values added to the histogram, ignoring NaNs.
+    underflow : int
+        Number of values below the lower edge of the histogram.
+    overflow : int
+        Number of values above the upper edge of the histogram.
+    """
+
+    def __init__(self, bins=30, value_range=(0, 1), resolution=1e-4):
+        self._value_range = (float(value_range[0]), float(value_range[1]))
+        self.edges = np.linspace(self._value_range[0], self._value_range[1], bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)
+        fine_bins = max(
+            int(round((self._value_range[1] - self._value_range[0]) / resolution)), 1
+        )
+        self._fine_edges = np.linspace(
+            self._value_range[0], self._value_range[1], fine_bins + 1
+        )
+        self._fine_counts = np.zeros(fine_bins, dtype=np.int64)
+        self.n = 0
+        self.underflow = 0
+        self.overflow = 0
+        self._min = np.inf
+        self._max = -np.inf
+
+    def update(self, values):
+        """
+        Add values to the histogram.
+
+        Parameters
+        ----------
+        values : array-like
+            Tissue-specificity values. NaNs are ignored.
+        """
+
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.counts += np.histogram(
+            values, bins=len(self.counts), range=self._value_range
+        )[0]
+        self._fine_counts += np.histogram(
+            values, bins=len(self._fine_counts), range=self._value_range
+        )[0]
+        self.n += len(values)
+        self.underflow += int(np.sum(values < self._value_range[0]))
+        self.overflow += int(np.sum(values > self._value_range[1]))
+        self._min = min(self._min, values.min())
+        self._max = max(self._max, values.max())
+
+    def merge(self, other):
+        """
+        Add the values accumulated by another histogram with the same bins and
+        range, such as one filled by a different worker.
+
+        Parameters
+        ----------
+        other : tspex.core.histogram_class.StreamingHistogram
+            Histogram to be merged into this one.
+        """
+
+        if not (
+            np.array_equal(self.edges, other.edges)
+            and np.array_equal(self._fine_edges, other._fine_edges)
+        ):
+            raise ValueError('Only histograms with identical bins can be merged.')
+        self.counts += other.counts
+        self._fine_counts += other._fine_counts
+        self.n += other.n
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        self._min = min(self._min, other._min)
+        self._max = max(self._max, other._max)
+
+    def quantile(self, q):
+        """
+        Estimate quantiles of the values added to the histogram.
+
+        Parameters
+        ----------
+        q : float or array-like
+            Quantile or sequence of quantiles, in the [0,1] range.
+
+        Returns
+        -------
+        float or numpy.array
+            Approximate quantiles. NaN if no value was added.
+        """
+
+        q = np.asarray(q, dtype=float)
+        if not self.n:
+            return np.full(q.shape, np.nan)[()]
+        counts = np.concatenate([[self.underflow], self._fine_counts, [self.overflow]])
+        lower = np.concatenate(
+            [[self._min], self._fine_edges[:-1], [self._value_range[1]]]
+        )
+        upper = np.concatenate(
+            [[self._value_range[0]], self._fine_edges[1:], [self._max]]
+        )
+        cumulative = np.cumsum(counts)
+        rank = q * self.n
+        index = np.clip(
+            np.searchsorted(cumulative, rank, side='left'), 0, len(counts) - 1
+        )
+        previous = cumulative[index] - counts[index]
+        fraction = (rank - previous) / np.maximum(counts[index], 1)
+        estimate = lower[index] + fraction * (upper[index] - lower[index])
+        return np.clip(estimate, self._min, self._max)[()]
+
+    def summary(self, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+        """
+        Summarize the values added to the histogram.
+
+        Parameters
+        ----------
+        quantiles : tuple, default (0.05, 0.25, 0.5, 0.75, 0.95)
+            Quantiles to be estimated.
+
+        Returns
+        -------
+        pandas.Series
+            Number of values, minimum, estimated quantiles and maximum, rounded
+            to four decimal places.
+        """
+
+        index = ['n', 'min'] + ['q{:g}'.format(100 * q) for q in quantiles] + ['max']
+        if self.n:
+            values = [self.n, self._min] + list(self.quantile(quantiles)) + [self._max]
+            values = values[:1] + [round(float(value), 4) for value in values[1:]]
+        else:
+            values = [0] + [np.nan] * (len(quantiles) + 2)
+        return pd.Series(values, index=index, dtype=object)
+
+    def to_frame(self):
+        """
+        Return the histogram bins as a DataFrame.
+
+        Returns
+        -------
+        pandas.DataFrame
+            DataFrame with the lower edge, upper edge and number of values of
+            each bin. The first and last rows count the values below and above
+            the range of the histogram (underflow and overflow), so that the
+            counts always add up to the number of values.
+        """
+
+        edges = self.edges.round(4)
+        return pd.DataFrame(
+            {
+                'bin_start': np.concatenate([[-np.inf], edges[:-1], [edges[-1]]]),
+                'bin_end': np.concatenate([[edges[0]], edges[1:], [np.inf]]),
+                'count': np.concatenate(
+                    [[self.underflow], self.counts, [self.overflow]]
+                ),
+            }
+        )
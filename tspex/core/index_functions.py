@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+"""
+Functions to build and use per-gene statistics sidecar indexes.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from tspex.core import matrix_functions
+from tspex.core.matrix_functions import row_entropy
+
+INDEX_SUFFIX = '.tspex.npz'
+INDEX_METHODS = [
+    'counts',
+    'tau',
+    'gini',
+    'simpson',
+    'shannon_specificity',
+    'roku_specificity',
+    'spm_dpm',
+    'js_specificity_dpm',
+]
+
+
+# Arrays of the index with one entry per gene
+_GENE_ARRAYS = ['sorted_profile', 'genes', 'line_offsets'] + [
+    prefix + name
+    for prefix in ['raw_', 'log_']
+    for name in ['sum', 'tau_sum', 'squared_proportions', 'entropy']
+]
+
+# Statistics from which each metric is derived, besides the row sums. The other
+# metrics are computed from the sorted expression profiles
+_STATISTIC_METHODS = {
+    'tau': 'tau_sum',
+    'simpson': 'squared_proportions',
+    'shannon_specificity': 'entropy',
+}
+
+
+def index_path(input_file):
+    """
+    Return the path of the sidecar index of an expression matrix file.
+
+    Parameters
+    ----------
+    input_file : str
+        Path to the expression matrix file.
+
+    Returns
+    -------
+    str
+        Path to the sidecar index.
+    """
+
+    return input_file + INDEX_SUFFIX
+
+
+def _line_offsets(input_file):
+    # Byte offset of each non-empty line of a delimited text file, skipping the
+    # header line
+    offsets = []
+    with open(input_file, 'rb') as fin:
+        offset = len(fin.readline())
+        for line in fin:
+            if line.strip():
+                offsets.append(offset)
+            offset += len(line)
+    return np.array(offsets, dtype=np.int64)
+
+
+def _file_signature(input_file):
+    stat = os.stat(input_file)
+    return np.array([stat.st_size, stat.st_mtime_ns])
+
+
+def _row_statistics(matrix):
+    # The sums of tau and of the Simpson index are computed with the same
+    # operations as in tspex.core.matrix_functions, so that the metrics derived
+    # from them do not differ after rounding
+    row_sum = np.sum(matrix, axis=1)
+    row_max = np.max(matrix, axis=1) if matrix.shape[1] else np.zeros(len(matrix))
+    return {
+        'sum': row_sum,
+        'tau_sum': np.sum(1 - matrix / row_max[:, np.newaxis], axis=1),
+        'squared_proportions': np.sum((matrix / row_sum[:, np.newaxis]) ** 2, axis=1),
+        'entropy': row_entropy(matrix),
+    }
+
+
+def build_index(expression_data, block_size=10000):
+    """
+    Compute the per-gene statistics from which scalar tissue-specificity
+    metrics can be derived: the sum, the sum of the expression deficits
+    relative to the maximum (tau), the sum of the squared expression
+    proportions (Simpson index) and the entropy of each gene, for both the
+    raw and the log-transformed expression values, along with the sorted
+    expression profile of each gene.
+
+    Parameters
+    ----------
+    expression_data : pandas.DataFrame
+        Validated expression matrix, with rows corresponding to genes and
+        columns to tissues/conditions.
+    block_size : int, default 10000
+        Number of genes processed at a time.
+
+    Returns
+    -------
+    dict
+        Dictionary of arrays containing the per-gene statistics.
+    """
+
+    matrix = expression_data.values
+    blocks = []
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for start in range(0, max(len(matrix), 1), block_size):
+            # Rows are C-ordered, as in tspex.core.score_functions.compute_block
+            block = np.ascontiguousarray(matrix[start : start + block_size])
+            statistics = {'sorted_profile': np.sort(block, axis=1)}
+            for prefix, values in [('raw_', block), ('log_', np.log(block + 1))]:
+                for name, value in _row_statistics(values).items():
+                    statistics[prefix + name] = value
+            blocks.append(statistics)
+    index = {
+        name: np.concatenate([block[name] for block in blocks]) for name in blocks[0]
+    }
+    index['genes'] = np.array(expression_data.index, dtype=str)
+    index['tissues'] = np.array(expression_data.columns, dtype=str)
+    return index
+
+
+def write_index(input_file, expression_data, output_file=None):
+    """
+    Build the sidecar index of an expression matrix file and save it next to
+    the file. For uncompressed TSV, CSV and TXT files, the byte offset of the
+    line of each gene is also stored, so that single genes can be read from
+    the file without parsing it (see
+    `tspex.core.io_functions.read_expression_matrix`).
+
+    Parameters
+    ----------
+    input_file : str
+        Path to the expression matrix file.
+    expression_data : pandas.DataFrame
+        Validated expression matrix read from the file.
+    output_file : str, optional
+        Path to the sidecar index. By default, the index is saved as the path
+        of the expression matrix file followed by '.tspex.npz'.
+    """
+
+    index = build_index(expression_data)
+    index['signature'] = _file_signature(input_file)
+    if input_file.rsplit('.', 1)[-1].lower() in ['csv', 'tsv', 'txt']:
+        line_offsets = _line_offsets(input_file)
+        if len(line_offsets) == len(expression_data):
+            index['line_offsets'] = line_offsets
+    with open(output_file or index_path(input_file), 'wb') as handle:
+        np.savez(handle, **index)
+
+
+def read_index(input_file, keys=None):
+    """
+    Load the sidecar index of an expression matrix file, if it exists and is
+    up to date with the file.
+
+    Parameters
+    ----------
+    input_file : str
+        Path to the expression matrix file.
+    keys : list of str, optional
+        Names of the arrays to be loaded. By default, all the arrays are
+        loaded.
+
+    Returns
+    -------
+    dict or None
+        Dictionary of arrays containing the per-gene statistics, or None if
+        there is no up-to-date index or if some of the arrays are not in the
+        index (e.g. an index built by an older version of tspex).
+    """
+
+    path = index_path(input_file)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as index:
+        if not np.array_equal(index['signature'], _file_signature(input_file)):
+            return None
+        if keys is not None and not set(keys).issubset(index.files):
+            return None
+        return {
+            name: index[name] for name in index.files if keys is None or name in keys
+        }
+
+
+def index_keys(method, log=False):
+    """
+    Return the names of the arrays of a sidecar index that are needed to
+    compute a metric, so that `read_index` only loads those. The sorted
+    expression profiles, which are as large as the expression matrix, are
+    only needed by the metrics that are not derived from per-gene statistics.
+
+    Parameters
+    ----------
+    method : str
+        Tissue-specificity metric.
+    log : bool, default False
+        Use the statistics of the log-transformed expression values.
+
+    Returns
+    -------
+    list of str
+        Names of the arrays.
+    """
+
+    prefix = 'log_' if log else 'raw_'
+    keys = ['genes', 'tissues', prefix + 'sum']
+    if method in _STATISTIC_METHODS:
+        keys.append(prefix + _STATISTIC_METHODS[method])
+    else:
+        keys.append('sorted_profile')
+    return keys
+
+
+def index_specificity(
+    index, method, log=False, transform=True, threshold=0, genes=None
+):
+    """
+    Compute scalar tissue-specificity metrics from a sidecar index, without
+    reading the expression matrix. The 'tau', 'simpson' and
+    'shannon_specificity' metrics are derived from the per-gene statistics
+    alone, while the other metrics are computed from the sorted expression
+    profiles.
+
+    Parameters
+    ----------
+    index : dict
+        Dictionary of arrays returned by `build_index` or `read_index`. Only
+        the arrays listed by `index_keys` are needed.
+    method : str
+        Tissue-specificity metric. One of: 'counts', 'tau', 'gini',
+        'simpson', 'shannon_specificity', 'roku_specificity', 'spm_dpm',
+        'js_specificity_dpm'.
+    log : bool, default False
+        Use the statistics of the log-transformed expression values.
+    transform : bool, default True
+        Transform the tissue-specificity values so that they range from 0 to 1.
+    threshold : int, float or array-like, default 0
+        Expression threshold used by the 'counts' metric. If an array of
+        thresholds is given, the metric is computed for each one of them.
+    genes : list, optional
+        Names of the genes to be scored, in which case only their statistics
+        are used. By default, all the genes of the index are scored. Genes
+        that are not in the index are ignored.
+
+    Returns
+    -------
+    pandas.Series or pandas.DataFrame
+        Tissue-specificity value of each gene, rounded to four decimal places.
+        If an array of thresholds was given for the 'counts' metric, a gene ×
+        threshold DataFrame.
+    """
+
+    if method not in INDEX_METHODS:
+        raise ValueError(
+            'The "{}" metric cannot be computed from an index.'.format(method)
+        )
+    if genes is not None:
+        selected = np.isin(index['genes'], [str(gene) for gene in genes])
+        index = {
+            name: values[selected] if name in _GENE_ARRAYS else values
+            for name, values in index.items()
+        }
+    prefix = 'log_' if log else 'raw_'
+    n = len(index['tissues'])
+    row_sum = index[prefix + 'sum']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if n <= 1 and method == 'counts':
+            values = np.zeros((len(row_sum),) + np.shape(threshold))
+        elif n <= 1:
+            values = np.zeros(len(row_sum))
+        elif method == 'tau':
+            values = index[prefix + 'tau_sum'] / (n - 1)
+        elif method == 'simpson':
+            values = index[prefix + 'squared_proportions']
+            if transform:
+                min_simpson = 1 / n
+                values = (values - min_simpson) / (1 - min_simpson)
+        elif method == 'shannon_specificity':
+            values = np.log2(n) - index[prefix + 'entropy']
+            if transform:
+                values = values / np.log2(n)
+        else:
+            profile = index['sorted_profile']
+            if log:
+                profile = np.log(profile + 1)
+            values = getattr(matrix_functions, method)(
+                profile, transform=transform, threshold=threshold
+            )
+    if method in ['tau', 'simpson', 'shannon_specificity']:
+        values[row_sum == 0] = 0.0
+    values = np.round(values, 4)
+    if values.ndim == 2:
+        return pd.DataFrame(
+            values,
+            index=index['genes'],
+            columns=pd.Index(np.asarray(threshold, dtype=float), name='threshold'),
+        )
+    return pd.Series(values, index=index['genes'])
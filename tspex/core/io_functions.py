@@ -0,0 +1,558 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+"""
+Functions to read, validate and aggregate expression matrices.
+"""
+
+import csv
+import io
+import itertools
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from tspex.core.index_functions import read_index
+
+_COMPRESSED_EXTENSIONS = ['gz', 'bz2', 'zip', 'xz', 'zst']
+
+
+def read_expression_matrix(input_file, sheet=None, genes=None):
+    """
+    Read an expression matrix file, with rows corresponding to genes and
+    columns to tissues/conditions. The first column is used as the gene index.
+
+    Parameters
+    ----------
+    input_file : str
+        Path to an expression matrix file in the TSV, CSV, Excel or Parquet
+        formats. Parquet files are read with their stored index or, if there
+        is none, with the first non-numerical column as the index. Excel
+        (xlsx) files are read with `iter_excel_blocks`.
+    sheet : str or int, default None
+        Name or zero-based index of the Excel worksheet to read. By default,
+        the first worksheet is read. Ignored for other formats.
+    genes : list, optional
+        Names of the genes to be read. By default, all the genes are read.
+        Otherwise, only the rows of these genes are parsed: Parquet files are
+        filtered on the gene column while they are read, Excel files are
+        filtered block by block and the rows of uncompressed delimited text
+        files are selected by their first field before parsing. If a text
+        file has an up-to-date sidecar index (see `tspex index`), the rows
+        are read directly at their stored offsets. Gene names are compared
+        as strings and genes that are not found are reported in a warning.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Expression matrix.
+    """
+
+    extension = input_file.rsplit('.', 1)[-1].lower()
+    if extension in ['parquet', 'pq']:
+        expression_matrix = _read_parquet(input_file, genes)
+    elif extension == 'xlsx':
+        expression_blocks = iter_excel_blocks(input_file, sheet=sheet)
+        if genes is not None:
+            expression_blocks = (
+                expression_block[gene_mask(expression_block.index, genes)]
+                for expression_block in expression_blocks
+            )
+        expression_matrix = pd.concat(list(expression_blocks))
+    elif extension == 'xls':
+        expression_matrix = pd.read_excel(
+            input_file,
+            sheet_name=0 if sheet is None else sheet,
+            index_col=0,
+            header=0,
+            thousands=',',
+        )
+    elif genes is not None and extension not in _COMPRESSED_EXTENSIONS:
+        expression_matrix = _read_delimited_genes(input_file, genes)
+    else:
+        expression_matrix = pd.read_csv(
+            input_file, index_col=0, header=0, sep=None, thousands=',', engine='python'
+        )
+    if genes is not None:
+        expression_matrix = select_genes(expression_matrix, genes)
+    return expression_matrix
+
+
+def gene_mask(index, genes):
+    """
+    Find which entries of a gene index are in a list of genes. Gene names are
+    compared as strings.
+
+    Parameters
+    ----------
+    index : pandas.Index
+        Gene index.
+    genes : list
+        Names of the genes to be found.
+
+    Returns
+    -------
+    numpy.array
+        Boolean array that is True for the genes of the index that are in the
+        list.
+    """
+
+    return np.asarray(pd.Index(index).astype(str).isin([str(gene) for gene in genes]))
+
+
+def select_genes(expression_data, genes):
+    """
+    Select the rows of an expression matrix corresponding to a list of genes,
+    keeping their original order. Gene names are compared as strings and a
+    warning is issued if some of the genes are not found.
+
+    Parameters
+    ----------
+    expression_data : pandas.DataFrame
+        Expression matrix, with rows corresponding to genes.
+    genes : list
+        Names of the genes to be selected.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Expression matrix of the selected genes.
+    """
+
+    genes = pd.Index([str(gene) for gene in genes]).unique()
+    missing_genes = genes[~genes.isin(expression_data.index.astype(str))]
+    if len(missing_genes):
+        warnings.warn(
+            '{} of the requested genes were not found in the expression matrix: {}.'.format(
+                len(missing_genes), ', '.join(missing_genes[:10])
+            )
+            + (' (...)' if len(missing_genes) > 10 else '')
+        )
+    return expression_data[gene_mask(expression_data.index, genes)]
+
+
+def read_gmt(input_file):
+    """
+    Read gene sets from a file in the GMT format, in which each line holds the
+    name of a gene set, a description and the names of its genes, separated
+    by tabs.
+
+    Parameters
+    ----------
+    input_file : str
+        Path to the GMT file.
+
+    Returns
+    -------
+    dict
+        Dictionary mapping the name of each gene set to the list of its genes.
+    """
+
+    gene_sets = {}
+    with open(input_file) as fin:
+        for line in fin:
+            fields = line.rstrip('\r\n').split('\t')
+            if not fields[0].strip():
+                continue
+            gene_sets[fields[0]] = [gene for gene in fields[2:] if gene.strip()]
+    return gene_sets
+
+
+def prepare_expression_matrix(expression_data, lazy=False):
+    """
+    Remove the non-numerical columns of an expression matrix, convert its
+    values to floats and validate it (see `validate_expression_matrix`).
+
+    Parameters
+    ----------
+    expression_data : pandas.DataFrame
+        Expression matrix, with rows corresponding to genes and columns to
+        tissues/conditions. A dask DataFrame is also accepted.
+    lazy : bool, default False
+        Whether the expression matrix is a dask DataFrame.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Validated numerical expression matrix.
+    """
+
+    numeric_data = expression_data.select_dtypes(include='number').astype(float)
+    if numeric_data.shape[1] < expression_data.shape[1]:
+        warnings.warn(
+            'The input DataFrame contains non-numerical columns. These columns were removed.'
+        )
+    return validate_expression_matrix(numeric_data, lazy)
+
+
+def validate_expression_matrix(numeric_data, lazy=False):
+    """
+    Check that a numerical expression matrix has no negative values and no
+    duplicated gene names.
+
+    Parameters
+    ----------
+    numeric_data : pandas.DataFrame
+        Expression matrix of float values. A dask DataFrame is also accepted.
+    lazy : bool, default False
+        Whether the expression matrix is a dask DataFrame.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The expression matrix.
+    """
+
+    if lazy:
+        import dask
+
+        negative_values, duplicated_genes = dask.compute(
+            (numeric_data < 0).any().any(),
+            (numeric_data.index.value_counts() > 1).any(),
+        )
+    else:
+        negative_values = np.any(numeric_data < 0)
+        duplicated_genes = numeric_data.index.duplicated().any()
+    if negative_values:
+        raise ValueError('Negative expression values are not allowed.')
+    if duplicated_genes:
+        raise ValueError(
+            'There are duplicated gene names in the input DataFrame index. Please, correct this issue.'
+        )
+    return numeric_data
+
+
+def aggregate_gene_sets(expression_data, gene_sets, agg='sum', missing='propagate'):
+    """
+    Aggregate the expression of the genes of each gene set (e.g. pathways).
+    The membership of the genes of each set is kept in compressed sparse row
+    form (the rows of the member genes, with one offset per set), and the
+    sparse-dense product is computed by summing the member rows of each set
+    with np.add.reduceat. Genes may belong to several sets.
+
+    Parameters
+    ----------
+    expression_data : pandas.DataFrame
+        Validated expression matrix, with rows corresponding to genes and
+        columns to tissues/conditions.
+    gene_sets : dict
+        Mapping of gene set names to lists of gene names, such as the one
+        returned by `read_gmt`. Gene names are compared as strings.
+    agg : str, default 'sum'
+        How the expression of the genes of each set is aggregated. One of:
+        'sum', 'mean'.
+    missing : str, default 'propagate'
+        If 'ignore', missing values are left out of the aggregation.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Gene set × tissue matrix of aggregated expression values. Gene sets
+        without genes in the expression matrix are removed.
+    """
+
+    if agg not in ['sum', 'mean']:
+        raise ValueError('Invalid aggregation. Allowed values are: "sum", "mean".')
+    set_genes = [
+        list(dict.fromkeys(str(gene) for gene in genes)) for genes in gene_sets.values()
+    ]
+    flat_genes = [gene for genes in set_genes for gene in genes]
+    rows = pd.Index(expression_data.index.astype(str)).get_indexer(flat_genes)
+    set_ids = np.repeat(np.arange(len(set_genes)), [len(genes) for genes in set_genes])
+    found = rows >= 0
+    if not np.all(found):
+        warnings.warn(
+            '{} genes of the gene sets were not found in the expression matrix.'.format(
+                len(set(np.array(flat_genes, dtype=object)[~found]))
+            )
+        )
+    sizes = np.bincount(set_ids[found], minlength=len(set_genes))
+    if np.any(sizes == 0):
+        warnings.warn(
+            '{} gene sets have no genes in the expression matrix. These gene sets were '
+            'removed.'.format(np.sum(sizes == 0))
+        )
+    index = pd.Index(
+        [name for name, size in zip(gene_sets, sizes) if size], name='gene_set'
+    )
+    if not len(index):
+        return pd.DataFrame(index=index, columns=expression_data.columns, dtype=float)
+    sizes = sizes[sizes > 0]
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    # Member rows are already grouped by gene set. They are gathered as the
+    # columns of a tissue × member matrix, so that each tissue is summed over
+    # contiguous memory.
+    matrix = np.take(expression_data.values.T, rows[found], axis=1)
+    if missing == 'ignore':
+        observed = ~np.isnan(matrix)
+        aggregated = np.add.reduceat(np.where(observed, matrix, 0), offsets, axis=1).T
+        sizes = np.add.reduceat(observed.astype(int), offsets, axis=1).T
+        aggregated[sizes == 0] = np.nan
+    else:
+        aggregated = np.add.reduceat(matrix, offsets, axis=1).T
+        sizes = sizes[:, np.newaxis]
+    if agg == 'mean':
+        with np.errstate(divide='ignore', invalid='ignore'):
+            aggregated = aggregated / sizes
+    return pd.DataFrame(aggregated, index=index, columns=expression_data.columns)
+
+
+def _read_parquet(input_file, genes=None):
+    filters = None
+    if genes is not None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # Filter the gene column while reading, so that only the row groups and
+        # rows of the requested genes are loaded
+        schema = pq.read_schema(input_file)
+        index_columns = [
+            column
+            for column in (schema.pandas_metadata or {}).get('index_columns', [])
+            if isinstance(column, str)
+        ]
+        gene_column = index_columns[0] if index_columns else schema.names[0]
+        gene_type = schema.field(gene_column).type
+        if pa.types.is_string(gene_type) or pa.types.is_large_string(gene_type):
+            filters = [(gene_column, 'in', [str(gene) for gene in genes])]
+    expression_matrix = pd.read_parquet(input_file, filters=filters)
+    if isinstance(expression_matrix.index, pd.RangeIndex) and not (
+        pd.api.types.is_numeric_dtype(expression_matrix.iloc[:, 0])
+    ):
+        expression_matrix = expression_matrix.set_index(expression_matrix.columns[0])
+    return expression_matrix
+
+
+def _sniff_delimiter(header):
+    try:
+        return csv.Sniffer().sniff(header, delimiters='\t,;').delimiter
+    except csv.Error:
+        return '\t'
+
+
+def _read_delimited_genes(input_file, genes):
+    genes = set(str(gene) for gene in genes)
+    line_offsets = None
+    index = read_index(input_file, keys=['genes', 'line_offsets'])
+    if index is not None and 'line_offsets' in index:
+        positions = pd.Index(index['genes']).get_indexer(list(genes))
+        line_offsets = np.sort(index['line_offsets'][positions[positions >= 0]])
+    with open(input_file, 'rb') as fin:
+        header = fin.readline()
+        delimiter = _sniff_delimiter(header.decode())
+        separator = delimiter.encode()
+        if line_offsets is None:
+            # Only the first field of each line is decoded
+            lines = [
+                line
+                for line in fin
+                if line.split(separator, 1)[0].strip().strip(b'"').decode() in genes
+            ]
+        else:
+            lines = []
+            for offset in line_offsets:
+                fin.seek(offset)
+                lines.append(fin.readline())
+    return pd.read_csv(
+        io.BytesIO(header + b''.join(lines)),
+        sep=delimiter,
+        index_col=0,
+        header=0,
+        thousands=',' if delimiter != ',' else None,
+    )
+
+
+def iter_expression_blocks(handle, block_size=10000):
+    """
+    Read an expression matrix in a delimited text format (e.g. TSV or CSV)
+    from an open file handle, such as the standard input, in blocks of genes.
+    The delimiter is detected from the header line and each block is yielded
+    as soon as it is read, so the whole matrix is never kept in memory. As the
+    types of the columns cannot be inferred from the whole matrix, the text
+    columns (e.g. gene descriptions) are found in the first block and the
+    other columns are read as numbers in the later blocks, so that all blocks
+    have the same columns. Cells of these columns that are not numbers are
+    read as missing values, with a warning.
+
+    Parameters
+    ----------
+    handle : file object
+        Text file handle positioned at the header line of the matrix.
+    block_size : int, default 10000
+        Number of genes in each block.
+
+    Yields
+    ------
+    pandas.DataFrame
+        Block of the expression matrix.
+    """
+
+    header = handle.readline()
+    if not header.strip():
+        raise ValueError('The input expression matrix is empty.')
+    delimiter = _sniff_delimiter(header)
+    names = next(csv.reader([header], delimiter=delimiter))
+    yield from _match_columns(
+        _iter_delimited_blocks(handle, delimiter, names, block_size), delimiter != ','
+    )
+
+
+def _iter_delimited_blocks(handle, delimiter, names, block_size):
+    while True:
+        # Lines are taken from the handle as they become available, so that a
+        # block is parsed as soon as all of its lines have been read
+        lines = list(itertools.islice(handle, block_size))
+        if not lines:
+            return
+        expression_block = pd.read_csv(
+            io.StringIO(''.join(lines)),
+            sep=delimiter,
+            header=None,
+            names=names,
+            index_col=0,
+            thousands=',' if delimiter != ',' else None,
+        )
+        if not names[0]:
+            expression_block.index.name = None
+        yield expression_block
+
+
+def _match_columns(expression_blocks, thousands):
+    # The text columns are found in the first block, as in a matrix that is
+    # read at once. They are kept as text in the later blocks, whose other
+    # columns are read as numbers, so that all blocks have the same columns
+    text_columns = None
+    for expression_block in expression_blocks:
+        if text_columns is None:
+            text_columns = expression_block.columns[expression_block.dtypes == object]
+        else:
+            expression_block = _coerce_numeric(
+                expression_block, text_columns, thousands
+            )
+        yield expression_block
+
+
+def _coerce_numeric(expression_block, text_columns, thousands):
+    # Columns inferred as text in this block only are converted to numbers
+    # and the text columns of the first block are kept as text
+    numeric_columns = expression_block.columns[
+        (expression_block.dtypes == object)
+        & ~expression_block.columns.isin(text_columns)
+    ]
+    if (
+        not len(numeric_columns)
+        and (expression_block.dtypes[text_columns] == object).all()
+    ):
+        return expression_block
+    expression_block = expression_block.copy()
+    expression_block[text_columns] = expression_block[text_columns].astype(object)
+    coerced = 0
+    for column in numeric_columns:
+        values = expression_block[column]
+        if thousands:
+            values = values.where(
+                values.isna(), values.astype(str).str.replace(',', '')
+            )
+        numbers = pd.to_numeric(values, errors='coerce')
+        coerced += int((numbers.isna() & values.notna()).sum())
+        expression_block[column] = numbers
+    if coerced:
+        warnings.warn(
+            '{} non-numerical values in columns "{}" were read as missing values.'.format(
+                coerced, '", "'.join(str(column) for column in numeric_columns)
+            )
+        )
+    return expression_block
+
+
+def _parse_thousands(column):
+    # Convert text cells such as "1,234" to numbers, keeping columns that are
+    # not numerical
+    if column.dtype != object:
+        return column
+    text = column.where(column.isna(), column.astype(str).str.replace(',', ''))
+    try:
+        return pd.to_numeric(text)
+    except (TypeError, ValueError):
+        return column
+
+
+def iter_excel_blocks(input_file, block_size=10000, sheet=None):
+    """
+    Read an expression matrix from an Excel (xlsx) file in blocks of genes.
+    Rows are streamed from the worksheet by a read-only openpyxl workbook, so
+    that the whole workbook is never kept in memory. Text cells with
+    thousands separators (e.g. "1,234") are read as numbers. The text columns
+    are found in the first block and, in the later blocks, the cells of the
+    other columns that are not numbers are read as missing values, with a
+    warning.
+
+    Parameters
+    ----------
+    input_file : str
+        Path to an Excel (xlsx) file.
+    block_size : int, default 10000
+        Number of genes in each block.
+    sheet : str or int, default None
+        Name or zero-based index of the worksheet to read. By default, the
+        first worksheet is read.
+
+    Yields
+    ------
+    pandas.DataFrame
+        Block of the expression matrix.
+    """
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(input_file, read_only=True, data_only=True)
+    try:
+        if sheet is None:
+            worksheet = workbook.worksheets[0]
+        elif str(sheet) in workbook.sheetnames:
+            worksheet = workbook[str(sheet)]
+        elif str(sheet).isdigit() and int(sheet) < len(workbook.worksheets):
+            worksheet = workbook.worksheets[int(sheet)]
+        else:
+            raise ValueError(
+                'Worksheet "{}" not found. Available worksheets are: "{}".'.format(
+                    sheet, '", "'.join(workbook.sheetnames)
+                )
+            )
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise ValueError('The input expression matrix is empty.')
+        # Blank rows are skipped before the rows are split into blocks, so that
+        # a run of blank rows does not end the iteration
+        rows = (row for row in rows if any(value is not None for value in row))
+        expression_blocks = (
+            pd.DataFrame.from_records(
+                [row[1:] for row in block_rows],
+                index=pd.Index([row[0] for row in block_rows], name=header[0]),
+                columns=list(header[1:]),
+            ).apply(_parse_thousands)
+            for block_rows in iter(lambda: list(itertools.islice(rows, block_size)), [])
+        )
+        yield from _match_columns(expression_blocks, True)
+    finally:
+        workbook.close()
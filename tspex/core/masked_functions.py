@@ -0,0 +1,430 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+"""
+Vectorized functions to compute tissue-specificity metrics from expression
+matrices with missing values. Missing values are represented as NaN and each
+metric is computed over the observed tissues of each row, as if the missing
+tissues were absent from the profile.
+"""
+
+import warnings
+
+import numpy as np
+
+from tspex.core.matrix_functions import counts_above
+
+
+def _observed(matrix):
+    mask = ~np.isnan(matrix)
+    return np.where(mask, matrix, 0), mask, np.sum(mask, axis=1)
+
+
+def _finalize(values, mask, n):
+    # Profiles with a single observed tissue have no specificity and profiles
+    # without observed tissues are undefined
+    if values.ndim == 2:
+        values[(n == 1)[:, np.newaxis] & mask] = 0.0
+        values[~mask] = np.nan
+    else:
+        values[n == 1] = 0.0
+        values[n == 0] = np.nan
+    return values
+
+
+def _dpm(matrix, mask, n):
+    values = np.where(mask, matrix, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.sum(values, axis=1) / n
+        deviation = np.where(mask, matrix - mean[:, np.newaxis], 0)
+        std = np.sqrt(np.sum(deviation**2, axis=1) / (n - 1))
+    return _finalize(std * np.sqrt(n), mask, n)
+
+
+def _tukey_biweight(matrix, mask, c=5, epsilon=1e-4):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        m = np.nanmedian(matrix, axis=1)[:, np.newaxis]
+        s = np.nanmedian(np.abs(matrix - m), axis=1)[:, np.newaxis]
+    u = (matrix - m) / ((c * s) + epsilon)
+    w = np.where(mask & (np.abs(u) <= 1), (1 - u**2) ** 2, 0)
+    return np.sum(w * np.where(mask, matrix, 0), axis=1) / np.sum(w, axis=1)
+
+
+def _entropy(values, n):
+    row_sum = np.sum(values, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = values / row_sum[:, np.newaxis]
+        h = -1 * np.sum(np.where(p != 0, p * np.log2(p), 0), axis=1)
+        h[row_sum == 0] = np.log2(n[row_sum == 0])
+    return h
+
+
+def _zero_rows(values):
+    return ~np.any(values, axis=1)
+
+
+def counts(matrix, **kwargs):
+    """
+    Quantify tissue-specificity as the proportion of observed tissues above an
+    expression threshold.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues. Missing values are represented as NaN.
+    threshold : int, float or array-like, default 0
+        Value above which the gene is considered to be expressed. By default,
+        any positive expression value is considered. If an array of
+        thresholds is given, the metric is computed for each one of them.
+
+    Returns
+    -------
+    numpy.array
+        Single summary of the tissue-specificity of each gene. If an array of
+        thresholds was given, a matrix with one column per threshold.
+    """
+
+    threshold = kwargs.pop('threshold', 0)
+    values, mask, n = _observed(matrix)
+    if np.ndim(threshold):
+        cts = counts_above(matrix, np.asarray(threshold, dtype=float))
+        n = n[:, np.newaxis]
+    else:
+        cts = np.sum(mask & (values > threshold), axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cts_transformed = (1 - (cts / n)) * (n / (n - 1))
+    cts_transformed[cts == 0] = 0.0
+    cts_transformed[np.broadcast_to(n == 1, cts.shape)] = 0.0
+    cts_transformed[np.broadcast_to(n == 0, cts.shape)] = np.nan
+    return cts_transformed
+
+
+def tau(matrix, **kwargs):
+    """
+    Quantify tissue-specificity as the Tau index computed over the observed
+    tissues.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues. Missing values are represented as NaN.
+
+    Returns
+    -------
+    numpy.array
+        Single summary of the tissue-specificity of each gene.
+    """
+
+    values, mask, n = _observed(matrix)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tau_index = (n - np.sum(values, axis=1) / np.max(values, axis=1)) / (n - 1)
+    tau_index[_zero_rows(values)] = 0.0
+    return _finalize(tau_index, mask, n)
+
+
+def gini(matrix, **kwargs):
+    """
+    Quantify tissue-specificity as the Gini coefficient computed over the
+    observed tissues.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues. Missing values are represented as NaN.
+    transform : bool, default True
+        Transform the computed values so they lie in the [0,1] range.
+
+    Returns
+    -------
+    numpy.array
+        Single summary of the tissue-specificity of each gene.
+    """
+
+    transform = kwargs.pop('transform', True)
+    values, mask, n = _observed(matrix)
+    # Missing values are sorted to the end of each row, after the observed ones
+    sorted_matrix = np.sort(matrix, axis=1)
+    sorted_matrix[np.isnan(sorted_matrix)] = 0
+    index = np.arange(1, matrix.shape[1] + 1)
+    weights = 2 * index - n[:, np.newaxis] - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gini_coefficient = np.sum(weights * sorted_matrix, axis=1) / (
+            n * np.sum(sorted_matrix, axis=1)
+        )
+        if transform:
+            gini_coefficient = gini_coefficient * (n / (n - 1))
+    gini_coefficient[_zero_rows(values)] = 0.0
+    return _finalize(gini_coefficient, mask, n)
+
+
+def simpson(matrix, **kwargs):
+    """
+    Quantify tissue-specificity as the Simpson index computed over the
+    observed tissues.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues. Missing values are represented as NaN.
+    transform : bool, default True
+        Transform the computed values so they lie in the [0,1] range.
+
+    Returns
+    -------
+    numpy.array
+        Single summary of the tissue-specificity of each gene.
+    """
+
+    transform = kwargs.pop('transform', True)
+    values, mask, n = _observed(matrix)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = values / np.sum(values, axis=1)[:, np.newaxis]
+        simpson_index = np.sum(p**2, axis=1)
+        if transform:
+            min_simpson = 1 / n
+            simpson_index = (simpson_index - min_simpson) / (1 - min_simpson)
+    simpson_index[_zero_rows(values)] = 0.0
+    return _finalize(simpson_index, mask, n)
+
+
+def shannon_specificity(matrix, **kwargs):
+    """
+    Quantify tissue-specificity as the difference between the maximum and the
+    observed Shannon entropy, computed over the observed tissues.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues. Missing values are represented as NaN.
+    transform : bool, default True
+        Transform the computed values so they lie in the [0,1] range.
+
+    Returns
+    -------
+    numpy.array
+        Single summary of the tissue-specificity of each gene.
+    """
+
+    transform = kwargs.pop('transform', True)
+    values, mask, n = _observed(matrix)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ss = np.log2(n) - _entropy(values, n)
+        if transform:
+            ss = ss / np.log2(n)
+    ss[_zero_rows(values)] = 0.0
+    return _finalize(ss, mask, n)
+
+
+def roku_specificity(matrix, **kwargs):
+    """
+    Quantify tissue-specificity using the ROKU method, computed over the
+    observed tissues.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues. Missing values are represented as NaN.
+    transform : bool, default True
+        Transform the computed values so they lie in the [0,1] range.
+
+    Returns
+    -------
+    numpy.array
+        Single summary of the tissue-specificity of each gene.
+    """
+
+    transform = kwargs.pop('transform', True)
+    values, mask, n = _observed(matrix)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tbi = _tukey_biweight(matrix, mask)
+        deviation = np.where(mask, np.abs(matrix - tbi[:, np.newaxis]), 0)
+        rs = np.log2(n) - _entropy(deviation, n)
+        if transform:
+            rs = rs / np.log2(n)
+    rs[_zero_rows(values)] = 0.0
+    return _finalize(rs, mask, n)
+
+
+def tsi(matrix, **kwargs):
+    """
+    Quantify tissue-specificity as the ratio between the expression in each
+    observed tissue and the sum of the observed expression values.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues. Missing values are represented as NaN.
+
+    Returns
+    -------
+    numpy.array
+        Tissue-specificity of each gene in each tissue. Missing tissues are
+        assigned NaN.
+    """
+
+    values, mask, n = _observed(matrix)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tissue_specificity_index = values / np.sum(values, axis=1)[:, np.newaxis]
+    tissue_specificity_index[_zero_rows(values)] = 0.0
+    return _finalize(tissue_specificity_index, mask, n)
+
+
+def zscore(matrix, **kwargs):
+    """
+    Quantify tissue-specificity as z-scores computed over the observed tissues.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues. Missing values are represented as NaN.
+    transform : bool, default True
+        Transform the computed values so they lie in the [0,1] range.
+
+    Returns
+    -------
+    numpy.array
+        Tissue-specificity of each gene in each tissue. Missing tissues are
+        assigned NaN.
+    """
+
+    transform = kwargs.pop('transform', True)
+    values, mask, n = _observed(matrix)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = (np.sum(values, axis=1) / n)[:, np.newaxis]
+        deviation = np.where(mask, matrix - mean, 0)
+        std = np.sqrt(np.sum(deviation**2, axis=1) / (n - 1))[:, np.newaxis]
+        zs = deviation / std
+        if transform:
+            max_zs = ((n - 1) / np.sqrt(n))[:, np.newaxis]
+            zs = (zs + max_zs) / (2 * max_zs)
+    zs[std[:, 0] == 0] = 0.0
+    return _finalize(zs, mask, n)
+
+
+def spm(matrix, **kwargs):
+    """
+    Quantify tissue-specificity as the Specificity Measure (SPM) computed over
+    the observed tissues.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues. Missing values are represented as NaN.
+
+    Returns
+    -------
+    numpy.array
+        Tissue-specificity of each gene in each tissue. Missing tissues are
+        assigned NaN.
+    """
+
+    values, mask, n = _observed(matrix)
+    norm = np.linalg.norm(values, axis=1)[:, np.newaxis]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        spm_matrix = np.where(values == 0, 0.0, (values**2) / (norm * values))
+    return _finalize(spm_matrix, mask, n)
+
+
+def spm_dpm(matrix, **kwargs):
+    """
+    Quantify tissue-specificity as the Dispersion Measure (DPM) computed with
+    SPM values of the observed tissues.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues. Missing values are represented as NaN.
+
+    Returns
+    -------
+    numpy.array
+        Single summary of the tissue-specificity of each gene.
+    """
+
+    _, mask, n = _observed(matrix)
+    return _dpm(spm(matrix), mask, n)
+
+
+def js_specificity(matrix, **kwargs):
+    """
+    Quantify tissue-specificity using the Jensen-Shannon distance between the
+    observed expression profile and each tissue-specific profile.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues. Missing values are represented as NaN.
+
+    Returns
+    -------
+    numpy.array
+        Tissue-specificity of each gene in each tissue. Missing tissues are
+        assigned NaN.
+    """
+
+    values, mask, n = _observed(matrix)
+    # Missing tissues have zero probability, so they do not contribute to the
+    # entropy sums (see `tspex.core.matrix_functions.js_specificity`)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = values / np.sum(values, axis=1)[:, np.newaxis]
+        half_p = p / 2
+        half_p_log = np.where(p != 0, half_p * np.log2(half_p), 0)
+        mixture_i = (p + 1) / 2
+        mixture_entropy = -1 * (
+            np.sum(half_p_log, axis=1)[:, np.newaxis] - half_p_log
+        ) - mixture_i * np.log2(mixture_i)
+        js = mixture_entropy - _entropy(values, n)[:, np.newaxis] / 2
+        js_matrix = 1 - np.sqrt(np.maximum(js, 0))
+    js_matrix[values == 0] = 0.0
+    return _finalize(js_matrix, mask, n)
+
+
+def js_specificity_dpm(matrix, **kwargs):
+    """
+    Quantify tissue-specificity as the Dispersion Measure (DPM) computed with
+    Jensen-Shannon distance-based specificity values of the observed tissues.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues. Missing values are represented as NaN.
+
+    Returns
+    -------
+    numpy.array
+        Single summary of the tissue-specificity of each gene.
+    """
+
+    _, mask, n = _observed(matrix)
+    return _dpm(js_specificity(matrix), mask, n)
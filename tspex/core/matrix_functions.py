@@ -0,0 +1,470 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+"""
+Vectorized functions to compute tissue-specificity metrics from expression
+matrices. Each function computes the same metric as its counterpart in
+`tspex.core.specificity_functions` for every row of the matrix at once.
+"""
+
+import numpy as np
+
+
+def _dpm(matrix):
+    n = matrix.shape[1]
+    if n == 1:
+        return np.zeros(len(matrix))
+    else:
+        return np.std(matrix, axis=1, ddof=1) * np.sqrt(n)
+
+
+def _tukey_biweight(matrix, c=5, epsilon=1e-4):
+    m = np.median(matrix, axis=1)[:, np.newaxis]
+    s = np.median(np.abs(matrix - m), axis=1)[:, np.newaxis]
+    u = (matrix - m) / ((c * s) + epsilon)
+    w = (1 - u**2) ** 2
+    w[np.abs(u) > 1] = 0
+    return np.sum(w * matrix, axis=1) / np.sum(w, axis=1)
+
+
+def row_entropy(matrix):
+    """
+    Compute the Shannon entropy, in bits, of the expression profile of each
+    gene. Genes without expression are assigned the maximum entropy.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues.
+
+    Returns
+    -------
+    numpy.array
+        Entropy of each gene.
+    """
+
+    n = matrix.shape[1]
+    row_sum = np.sum(matrix, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = matrix / row_sum[:, np.newaxis]
+        h = -1 * np.sum(np.where(p != 0, p * np.log2(p), 0), axis=1)
+    h[row_sum == 0] = np.log2(n)
+    return h
+
+
+def _zero_rows(matrix):
+    return ~np.any(matrix, axis=1)
+
+
+def counts_above(matrix, thresholds):
+    """
+    Count, for each gene, the tissues whose expression is above each one of
+    several thresholds. Every expression value is located among the sorted
+    thresholds at once and the values that fall after each threshold are
+    counted per row. Sorting the rows first lets each binary search start from
+    the previous result. Missing values are not counted.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues.
+    thresholds : numpy.array
+        Expression thresholds.
+
+    Returns
+    -------
+    numpy.array
+        Matrix with the number of tissues above each threshold (columns) for
+        each gene (rows).
+    """
+
+    order = np.argsort(thresholds)
+    m = len(thresholds)
+    sorted_matrix = np.sort(matrix, axis=1)
+    position = np.searchsorted(thresholds[order], sorted_matrix, side='left')
+    position[np.isnan(sorted_matrix)] = 0
+    position += np.arange(len(matrix))[:, np.newaxis] * (m + 1)
+    histogram = np.bincount(position.ravel(), minlength=len(matrix) * (m + 1))
+    histogram = histogram.reshape(len(matrix), m + 1)
+    above = np.cumsum(histogram[:, ::-1], axis=1)[:, ::-1][:, 1:]
+    cts = np.empty((len(matrix), m), dtype=int)
+    cts[:, order] = above
+    return cts
+
+
+def counts(matrix, **kwargs):
+    """
+    Quantify tissue-specificity as the proportion of tissues above an
+    expression threshold.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues.
+    threshold : int, float or array-like, default 0
+        Value above which the gene is considered to be expressed. By default,
+        any positive expression value is considered. If an array of
+        thresholds is given, the metric is computed for each one of them.
+
+    Returns
+    -------
+    numpy.array
+        Single summary of the tissue-specificity of each gene. If an array of
+        thresholds was given, a matrix with one column per threshold.
+    """
+
+    threshold = kwargs.pop('threshold', 0)
+    n = matrix.shape[1]
+    if n <= 1:
+        return np.zeros((len(matrix),) + np.shape(threshold))
+    else:
+        if np.ndim(threshold):
+            cts = counts_above(matrix, np.asarray(threshold, dtype=float))
+        else:
+            cts = np.sum(matrix > threshold, axis=1)
+        cts_transformed = (1 - (cts / n)) * (n / (n - 1))
+        cts_transformed[cts == 0] = 0.0
+        return cts_transformed
+
+
+def tau(matrix, **kwargs):
+    """
+    Quantify tissue-specificity as the Tau index.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues.
+
+    Returns
+    -------
+    numpy.array
+        Single summary of the tissue-specificity of each gene.
+    """
+
+    n = matrix.shape[1]
+    if n == 1:
+        return np.zeros(len(matrix))
+    else:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            matrix_r = matrix / np.max(matrix, axis=1)[:, np.newaxis]
+            tau_index = np.sum(1 - matrix_r, axis=1) / (n - 1)
+        tau_index[_zero_rows(matrix)] = 0.0
+        return tau_index
+
+
+def gini(matrix, **kwargs):
+    """
+    Quantify tissue-specificity as the Gini coefficient.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues.
+    transform : bool, default True
+        Transform the computed values so they lie in the [0,1] range.
+
+    Returns
+    -------
+    numpy.array
+        Single summary of the tissue-specificity of each gene.
+    """
+
+    transform = kwargs.pop('transform', True)
+    n = matrix.shape[1]
+    if n == 1:
+        return np.zeros(len(matrix))
+    else:
+        sorted_matrix = np.sort(matrix, axis=1)
+        index = np.arange(1, n + 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            gini_coefficient = np.sum((2 * index - n - 1) * sorted_matrix, axis=1) / (
+                n * np.sum(sorted_matrix, axis=1)
+            )
+        if transform:
+            gini_coefficient = gini_coefficient * (n / (n - 1))
+        gini_coefficient[_zero_rows(matrix)] = 0.0
+        return gini_coefficient
+
+
+def simpson(matrix, **kwargs):
+    """
+    Quantify tissue-specificity as the Simpson index.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues.
+    transform : bool, default True
+        Transform the computed values so they lie in the [0,1] range.
+
+    Returns
+    -------
+    numpy.array
+        Single summary of the tissue-specificity of each gene.
+    """
+
+    transform = kwargs.pop('transform', True)
+    n = matrix.shape[1]
+    if n == 1:
+        return np.zeros(len(matrix))
+    else:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            p = matrix / np.sum(matrix, axis=1)[:, np.newaxis]
+            simpson_index = np.sum(p**2, axis=1)
+        if transform:
+            min_simpson = 1 / n
+            simpson_index = (simpson_index - min_simpson) / (1 - min_simpson)
+        simpson_index[_zero_rows(matrix)] = 0.0
+        return simpson_index
+
+
+def shannon_specificity(matrix, **kwargs):
+    """
+    Quantify tissue-specificity as the difference between the maximum and the
+    observed Shannon entropy.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues.
+    transform : bool, default True
+        Transform the computed values so they lie in the [0,1] range.
+
+    Returns
+    -------
+    numpy.array
+        Single summary of the tissue-specificity of each gene.
+    """
+
+    transform = kwargs.pop('transform', True)
+    n = matrix.shape[1]
+    if n == 1:
+        return np.zeros(len(matrix))
+    else:
+        ss = np.log2(n) - row_entropy(matrix)
+        if transform:
+            ss = ss / np.log2(n)
+        ss[_zero_rows(matrix)] = 0.0
+        return ss
+
+
+def roku_specificity(matrix, **kwargs):
+    """
+    Quantify tissue-specificity using the ROKU method.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues.
+    transform : bool, default True
+        Transform the computed values so they lie in the [0,1] range.
+
+    Returns
+    -------
+    numpy.array
+        Single summary of the tissue-specificity of each gene.
+    """
+
+    transform = kwargs.pop('transform', True)
+    n = matrix.shape[1]
+    if n == 1:
+        return np.zeros(len(matrix))
+    else:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tbi = _tukey_biweight(matrix)
+        rs = np.log2(n) - row_entropy(np.abs(matrix - tbi[:, np.newaxis]))
+        if transform:
+            rs = rs / np.log2(n)
+        rs[_zero_rows(matrix)] = 0.0
+        return rs
+
+
+def tsi(matrix, **kwargs):
+    """
+    Quantify tissue-specificity as the ratio between the expression in each
+    tissue and the sum of the expression values in all tissues.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues.
+
+    Returns
+    -------
+    numpy.array
+        Tissue-specificity of each gene in each tissue.
+    """
+
+    n = matrix.shape[1]
+    if n == 1:
+        return np.zeros(matrix.shape)
+    else:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tissue_specificity_index = matrix / np.sum(matrix, axis=1)[:, np.newaxis]
+        tissue_specificity_index[_zero_rows(matrix)] = 0.0
+        return tissue_specificity_index
+
+
+def zscore(matrix, **kwargs):
+    """
+    Quantify tissue-specificity as z-scores.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues.
+    transform : bool, default True
+        Transform the computed values so they lie in the [0,1] range.
+
+    Returns
+    -------
+    numpy.array
+        Tissue-specificity of each gene in each tissue.
+    """
+
+    transform = kwargs.pop('transform', True)
+    n = matrix.shape[1]
+    if n == 1:
+        return np.zeros(matrix.shape)
+    else:
+        std = np.std(matrix, axis=1, ddof=1)[:, np.newaxis]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            zs = (matrix - np.mean(matrix, axis=1)[:, np.newaxis]) / std
+        if transform:
+            max_zs = (n - 1) / np.sqrt(n)
+            zs = (zs + max_zs) / (2 * max_zs)
+        zs[std[:, 0] == 0] = 0.0
+        return zs
+
+
+def spm(matrix, **kwargs):
+    """
+    Quantify tissue-specificity as the Specificity Measure (SPM).
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues.
+
+    Returns
+    -------
+    numpy.array
+        Tissue-specificity of each gene in each tissue.
+    """
+
+    n = matrix.shape[1]
+    if n == 1:
+        return np.zeros(matrix.shape)
+    else:
+        norm = np.linalg.norm(matrix, axis=1)[:, np.newaxis]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            spm_matrix = np.where(matrix == 0, 0.0, (matrix**2) / (norm * matrix))
+        return spm_matrix
+
+
+def spm_dpm(matrix, **kwargs):
+    """
+    Quantify tissue-specificity as the Dispersion Measure (DPM) computed with
+    SPM values.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues.
+
+    Returns
+    -------
+    numpy.array
+        Single summary of the tissue-specificity of each gene.
+    """
+
+    return _dpm(spm(matrix))
+
+
+def js_specificity(matrix, **kwargs):
+    """
+    Quantify tissue-specificity using the Jensen-Shannon distance between the
+    expression profile and each tissue-specific profile.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues.
+
+    Returns
+    -------
+    numpy.array
+        Tissue-specificity of each gene in each tissue.
+    """
+
+    n = matrix.shape[1]
+    if n == 1:
+        return np.zeros(matrix.shape)
+    else:
+        # The mixture of the expression profile p with the profile specific to
+        # tissue i differs from p/2 only at tissue i, so its entropy can be
+        # derived from the entropy of p/2 without building each mixture.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            p = matrix / np.sum(matrix, axis=1)[:, np.newaxis]
+            half_p = p / 2
+            half_p_log = np.where(p != 0, half_p * np.log2(half_p), 0)
+            mixture_i = (p + 1) / 2
+            mixture_entropy = -1 * (
+                np.sum(half_p_log, axis=1)[:, np.newaxis] - half_p_log
+            ) - mixture_i * np.log2(mixture_i)
+            js = mixture_entropy - row_entropy(matrix)[:, np.newaxis] / 2
+            js_matrix = 1 - np.sqrt(np.maximum(js, 0))
+        js_matrix[matrix == 0] = 0.0
+        return js_matrix
+
+
+def js_specificity_dpm(matrix, **kwargs):
+    """
+    Quantify tissue-specificity as the Dispersion Measure (DPM) computed with
+    Jensen-Shannon distance-based specificity values.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        tissues.
+
+    Returns
+    -------
+    numpy.array
+        Single summary of the tissue-specificity of each gene.
+    """
+
+    return _dpm(js_specificity(matrix))
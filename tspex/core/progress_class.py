@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+"""
+Progress reporting and cancellation classes of the tspex library.
+"""
+
+import collections
+import threading
+import time
+
+Progress = collections.namedtuple(
+    'Progress', ['processed', 'total', 'elapsed', 'throughput', 'eta']
+)
+Progress.__doc__ = """
+Progress of a computation, reported after each block of genes.
+
+Attributes
+----------
+processed : int
+    Number of genes processed so far.
+total : int or None
+    Total number of genes, if known.
+elapsed : float
+    Time, in seconds, since the computation started.
+throughput : float
+    Number of genes processed per second.
+eta : float or None
+    Estimated time, in seconds, until the computation finishes, if the total
+    number of genes is known.
+"""
+
+
+class ComputationCancelled(Exception):
+    """
+    Exception raised when a computation is cancelled through a
+    CancellationToken.
+
+    Attributes
+    ----------
+    partial : pandas.Series, pandas.DataFrame or None
+        Results of the blocks of genes that were computed before the
+        cancellation, if the computation returns them.
+    """
+
+    def __init__(self, message='The computation was cancelled.', partial=None):
+        super().__init__(message)
+        self.partial = partial
+
+
+class CancellationToken:
+    """
+    Request the cancellation of a computation from another thread or from a
+    signal handler. Computations check the token between blocks of genes and
+    stop cleanly, raising ComputationCancelled.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        """Request the cancellation of the computations that use the token."""
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self, partial=None):
+        """
+        Raise ComputationCancelled if the cancellation was requested.
+
+        Parameters
+        ----------
+        partial : optional
+            Partial results attached to the exception.
+        """
+
+        if self._event.is_set():
+            raise ComputationCancelled(partial=partial)
+
+
+class ProgressTracker:
+    """
+    Count the genes processed by a computation and report its progress to a
+    callback after each block.
+
+    Parameters
+    ----------
+    callback : callable
+        Function called with a Progress tuple after each block.
+    total : int, optional
+        Total number of genes. It may also be set later through the total
+        attribute, once it is known.
+    """
+
+    def __init__(self, callback, total=None):
+        self._callback = callback
+        self.total = total
+        self.processed = 0
+        self._start = time.perf_counter()
+
+    def report(self):
+        """
+        Return the current progress.
+
+        Returns
+        -------
+        Progress
+            Progress of the computation.
+        """
+
+        elapsed = time.perf_counter() - self._start
+        throughput = self.processed / elapsed if elapsed > 0 else 0.0
+        if self.total is not None and throughput > 0:
+            eta = max(self.total - self.processed, 0) / throughput
+        else:
+            eta = None
+        return Progress(self.processed, self.total, elapsed, throughput, eta)
+
+    def update(self, processed):
+        """
+        Add a block of processed genes and report the progress.
+
+        Parameters
+        ----------
+        processed : int
+            Number of genes in the block.
+        """
+
+        self.processed += processed
+        self._callback(self.report())
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+"""
+Low-latency scoring of raw expression profiles.
+"""
+
+import numpy as np
+
+from tspex.core import masked_functions, matrix_functions
+
+METHODS = {
+    name: getattr(matrix_functions, name)
+    for name in [
+        'counts',
+        'tau',
+        'gini',
+        'simpson',
+        'shannon_specificity',
+        'roku_specificity',
+        'tsi',
+        'zscore',
+        'spm',
+        'spm_dpm',
+        'js_specificity',
+        'js_specificity_dpm',
+    ]
+}
+
+
+def compute_block(matrix, func, transform, threshold, missing='propagate'):
+    """
+    Compute a tissue-specificity metric for a block of genes, as the
+    TissueSpecificity class does, rounding the values to four decimal places.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Expression matrix. Rows correspond to genes and columns to tissues.
+    func : callable
+        Metric function of `tspex.core.matrix_functions`.
+    transform : bool
+        Transform the tissue-specificity values so that they range from 0 to 1.
+    threshold : int, float or array-like
+        Expression threshold used by the 'counts' metric.
+    missing : str, default 'propagate'
+        If 'ignore', the genes with missing values are computed with the
+        function of the same name of `tspex.core.masked_functions`, over the
+        tissues in which they were observed.
+
+    Returns
+    -------
+    numpy.array
+        Tissue-specificity values of the block.
+    """
+
+    # Row sums depend on the memory layout of the matrix, so that the values
+    # are always computed from C-ordered rows (e.g. as in the sidecar index)
+    matrix = np.ascontiguousarray(matrix)
+    kwargs = {'transform': transform, 'threshold': threshold}
+    if missing == 'ignore':
+        # Only genes with missing values go through the masked functions
+        missing_rows = np.isnan(matrix).any(axis=1)
+        if missing_rows.any():
+            complete_values = func(matrix[~missing_rows], **kwargs)
+            values = np.empty((len(matrix),) + complete_values.shape[1:])
+            values[~missing_rows] = complete_values
+            values[missing_rows] = getattr(masked_functions, func.__name__)(
+                matrix[missing_rows], **kwargs
+            )
+            return np.round(values, 4)
+    return np.round(func(matrix, **kwargs), 4)
+
+
+def score(
+    expression, method, log=False, transform=True, threshold=0, validate=True, out=None
+):
+    """
+    Compute the tissue-specificity of one or more expression profiles given as
+    a NumPy array, without building DataFrames. The values are the same as the
+    ones computed by the TissueSpecificity class, which is better suited for
+    whole expression matrices with named genes and tissues.
+
+    Parameters
+    ----------
+    expression : numpy.array
+        Expression profile of a single gene (one-dimensional), expression
+        matrix (two-dimensional), with rows corresponding to genes and columns
+        to tissues, or stack of expression matrices of the same genes and
+        tissues in several conditions (three-dimensional, condition × gene ×
+        tissue). Stacks are computed in a single call, as one matrix with a
+        row per (condition, gene) pair.
+    method : str
+        Tissue-specificity metric. One of: 'counts', 'tau', 'gini', 'simpson',
+        'shannon_specificity', 'roku_specificity', 'tsi', 'zscore', 'spm',
+        'spm_dpm', 'js_specificity', 'js_specificity_dpm'.
+    log : bool, default False
+        Log-transform the expression values before computing
+        tissue-specificity.
+    transform : bool, default True
+        Transform the tissue-specificity values so that they range from 0 to 1.
+    threshold : int or float, default 0
+        Expression threshold used by the 'counts' metric.
+    validate : bool, default True
+        Check the shape of the input and the absence of negative values. Set it
+        to False to skip the checks for inputs that are known to be valid.
+    out : numpy.array, optional
+        Preallocated array, with the shape of the result, in which the rounded
+        values are written. Only the final result is written to it; the
+        temporary arrays computed by the metric are still allocated on every
+        call.
+
+    Returns
+    -------
+    float or numpy.array
+        Tissue-specificity of the profile (a float, or an array with one value
+        per tissue for the 'tsi', 'zscore', 'spm' and 'js_specificity'
+        metrics) or of each row of the matrix. For three-dimensional inputs,
+        the values have a condition × gene (× tissue) shape. If out is given,
+        it is returned.
+    """
+
+    func = METHODS.get(method)
+    if func is None:
+        raise ValueError(
+            'Invalid method. Allowed values are: "{}".'.format('", "'.join(METHODS))
+        )
+    matrix = np.asarray(expression, dtype=float)
+    single = matrix.ndim == 1
+    stacked_shape = matrix.shape[:2] if matrix.ndim == 3 else None
+    if validate:
+        if matrix.ndim not in [1, 2, 3]:
+            raise ValueError(
+                'The expression input must be one-, two- or three-dimensional.'
+            )
+        if np.any(matrix < 0):
+            raise ValueError('Negative expression values are not allowed.')
+    if single:
+        matrix = matrix[np.newaxis]
+    elif stacked_shape is not None:
+        matrix = matrix.reshape(-1, matrix.shape[2])
+    if log:
+        # The logarithm is taken in place, in the array holding matrix + 1
+        matrix = np.add(matrix, 1)
+        np.log(matrix, out=matrix)
+    values = func(matrix, transform=transform, threshold=threshold)
+    if single:
+        values = values[0]
+    elif stacked_shape is not None:
+        values = values.reshape(stacked_shape + values.shape[1:])
+    if out is not None:
+        return np.round(values, 4, out=out)
+    values = np.round(values, 4)
+    return float(values) if values.ndim == 0 else values
@@ -22,13 +22,33 @@
 TissueSpecificity class of the tspex library.
 """
 
+import functools
+import json
+import os
 import warnings
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
-from tspex.core.specificity_functions import (
+from tspex.core import bound_functions, masked_functions, window_functions
+from tspex.core.auxiliary_functions import top_tissue_fractions
+from tspex.core.histogram_class import StreamingHistogram
+from tspex.core.index_functions import (
+    INDEX_METHODS,
+    index_keys,
+    index_specificity,
+    read_index,
+)
+from tspex.core.io_functions import (
+    aggregate_gene_sets,
+    gene_mask,
+    prepare_expression_matrix,
+    read_expression_matrix,
+    select_genes,
+    validate_expression_matrix,
+)
+from tspex.core.matrix_functions import (
     counts,
     gini,
     js_specificity,
@@ -42,6 +62,231 @@ from tspex.core.specificity_functions import (
     tsi,
     zscore,
 )
+from tspex.core.progress_class import ComputationCancelled, ProgressTracker
+from tspex.core.score_functions import compute_block
+from tspex.core.storage_functions import STORAGE_TYPES, decode_values, encode_values
+
+
+def _is_dask_collection(data):
+    try:
+        import dask
+    except ImportError:
+        return False
+    return dask.is_dask_collection(data)
+
+
+def _materialize(data):
+    if _is_dask_collection(data):
+        data = data.compute()
+    if isinstance(data, np.ndarray):
+        data = pd.DataFrame(data) if data.ndim == 2 else pd.Series(data)
+    return data
+
+
+def _compute_window_block(
+    matrix, func, window, step, transform, threshold, missing='propagate'
+):
+    window_func = getattr(window_functions, func.__name__, None)
+    if window_func is None or (missing == 'ignore' and np.isnan(matrix).any()):
+        # Metrics without a sliding-window counterpart are computed window by
+        # window
+        return np.column_stack(
+            [
+                compute_block(
+                    matrix[:, start : start + window],
+                    func,
+                    transform,
+                    threshold,
+                    missing,
+                )
+                for start in range(0, matrix.shape[1] - window + 1, step)
+            ]
+        )
+    return np.round(
+        window_func(matrix, window, step, transform=transform, threshold=threshold), 4
+    )
+
+
+def _compute_frame_block(
+    frame, func, transform, threshold, missing='propagate', columns=None
+):
+    values = compute_block(frame.values, func, transform, threshold, missing)
+    if values.ndim == 2:
+        if columns is None:
+            columns = frame.columns
+        return pd.DataFrame(values, index=frame.index, columns=columns)
+    return pd.Series(values, index=frame.index)
+
+
+def _select_partition_genes(partition, genes):
+    return partition[gene_mask(partition.index, genes)]
+
+
+def _label_array(labels):
+    labels = np.asarray(labels)
+    if labels.dtype == object:
+        labels = labels.astype(str)
+    return labels
+
+
+def _tissue_group_frame(tissue_groups, tissues):
+    """
+    Convert a mapping of tissues to groups, or a mapping of level names to such
+    mappings, to a DataFrame with one row per tissue and one column per level.
+    """
+
+    if isinstance(tissue_groups, pd.DataFrame):
+        groups = tissue_groups
+    elif isinstance(tissue_groups, pd.Series):
+        groups = tissue_groups.to_frame(tissue_groups.name or 'group')
+    elif tissue_groups and all(
+        isinstance(mapping, (dict, pd.Series)) for mapping in tissue_groups.values()
+    ):
+        groups = pd.DataFrame(
+            {level: pd.Series(mapping) for level, mapping in tissue_groups.items()}
+        )
+    else:
+        groups = pd.Series(tissue_groups, dtype=object).to_frame('group')
+    groups = groups.reindex(tissues)
+    for level in groups.columns:
+        unassigned = groups[level].isnull().sum()
+        if unassigned:
+            warnings.warn(
+                '{} tissues are not assigned to any group of the "{}" level. These tissues '
+                'were not included in its groups.'.format(unassigned, level)
+            )
+    return groups
+
+
+def _aggregate_groups(expression_data, groups, missing='propagate'):
+    # Sum the expression of the tissues of every group of every level with a
+    # single multiplication by a tissue × group indicator matrix
+    columns = []
+    indicator = []
+    for level in groups.columns:
+        for group in pd.unique(groups[level].dropna()):
+            columns.append((level, group))
+            indicator.append((groups[level] == group).values)
+    indicator = np.array(indicator, dtype=float).reshape(-1, len(groups)).T
+    matrix = expression_data.values
+    if missing == 'ignore':
+        observed = ~np.isnan(matrix)
+        aggregated = np.where(observed, matrix, 0) @ indicator
+        aggregated[(observed @ indicator) == 0] = np.nan
+    else:
+        aggregated = matrix @ indicator
+    return pd.DataFrame(
+        aggregated,
+        index=expression_data.index,
+        columns=pd.MultiIndex.from_tuples(columns, names=['level', 'group']),
+    )
+
+
+def _native_library(data):
+    # Identify polars and pyarrow inputs without importing the libraries
+    module = type(data).__module__.split('.')[0]
+    if module == 'polars' and hasattr(data, 'schema'):
+        return 'polars'
+    if module == 'pyarrow' and hasattr(data, 'column_names'):
+        return 'pyarrow'
+    return None
+
+
+def _native_to_dataframe(expression_data, library):
+    """
+    Convert a polars DataFrame or a pyarrow Table to a pandas DataFrame of
+    float64 values. The first column is used as the gene index if it is not
+    numerical. Numerical columns are copied once, column by column, into a
+    single Fortran-ordered matrix that the DataFrame wraps without the extra
+    copies made by ``select_dtypes`` and ``astype``.
+    """
+
+    if library == 'polars':
+        names = list(expression_data.schema)
+        numeric = [
+            name for name, dtype in expression_data.schema.items() if dtype.is_numeric()
+        ]
+    else:
+        import pyarrow as pa
+
+        names = list(expression_data.column_names)
+        numeric = [
+            field.name
+            for field in expression_data.schema
+            if pa.types.is_integer(field.type) or pa.types.is_floating(field.type)
+        ]
+    gene_column = names[0] if names and names[0] not in numeric else None
+    if len(numeric) + (gene_column is not None) < len(names):
+        warnings.warn(
+            'The input DataFrame contains non-numerical columns. These columns were removed.'
+        )
+    if library == 'polars':
+        import polars as pl
+
+        matrix = (
+            expression_data.select(pl.col(numeric).cast(pl.Float64)).to_numpy(
+                order='fortran'
+            )
+            if numeric
+            else np.zeros((len(expression_data), 0))
+        )
+        genes = None if gene_column is None else expression_data[gene_column].to_list()
+    else:
+        matrix = np.empty((expression_data.num_rows, len(numeric)), order='F')
+        for j, name in enumerate(numeric):
+            matrix[:, j] = expression_data.column(name).to_numpy()
+        genes = (
+            None
+            if gene_column is None
+            else expression_data.column(gene_column).to_pylist()
+        )
+    return pd.DataFrame(
+        matrix,
+        index=pd.Index(genes, name=gene_column) if genes is not None else None,
+        columns=pd.Index(numeric),
+    )
+
+
+def _is_cube(data):
+    # Three-dimensional NumPy arrays and xarray DataArrays, identified without
+    # importing xarray
+    if isinstance(data, np.ndarray):
+        return data.ndim == 3
+    module = type(data).__module__.split('.')[0]
+    return module == 'xarray' and hasattr(data, 'dims') and len(data.dims) == 3
+
+
+def _cube_to_dataframe(cube):
+    """
+    Convert a condition × gene × tissue array to a DataFrame whose rows are
+    indexed by (condition, gene) pairs. The array is reshaped, without
+    copying if it is C-contiguous, so that every condition is computed in the
+    same pass over the rows. The labels and names of the dimensions of xarray
+    DataArrays are kept; NumPy arrays are labeled by position.
+    """
+
+    if isinstance(cube, np.ndarray):
+        names = ['condition', 'gene', 'tissue']
+        labels = [pd.RangeIndex(size) for size in cube.shape]
+        values = cube
+    else:
+        names = [str(dim) for dim in cube.dims]
+        labels = [
+            (
+                pd.Index(np.asarray(cube.coords[dim].values))
+                if dim in cube.coords
+                else pd.RangeIndex(size)
+            )
+            for dim, size in zip(cube.dims, cube.shape)
+        ]
+        values = np.asarray(cube.values)
+    values = np.asarray(values, dtype=float)
+    conditions, genes, tissues = values.shape
+    return pd.DataFrame(
+        values.reshape(conditions * genes, tissues),
+        index=pd.MultiIndex.from_product(labels[:2], names=names[:2]),
+        columns=pd.Index(labels[2], name=names[2]),
+    )
 
 
 class TissueSpecificity:
@@ -52,7 +297,20 @@ class TissueSpecificity:
     ----------
     expression_data : pandas.core.frame.DataFrame
         Pandas DataFrame containing the expression matrix, with rows
-        corresponding to genes and columns to tissues/conditions.
+        corresponding to genes and columns to tissues/conditions. A
+        dask.dataframe.DataFrame or a two-dimensional dask.array.Array
+        partitioned along genes is also accepted, in which case the
+        tissue-specificity values are returned as a lazy dask collection of the
+        same type.
+        A polars DataFrame or a pyarrow Table is also accepted; its first
+        column is used as the gene names if it is not numerical.
+        A three-dimensional NumPy array or xarray DataArray, whose dimensions
+        correspond to conditions (e.g. donors or treatments), genes and
+        tissues, in this order, is also accepted. All conditions are computed
+        in a single pass and the rows of the results are indexed by
+        (condition, gene) pairs; use ``unstack`` to obtain a condition × gene
+        table. The coordinates and dimension names of DataArrays are used as
+        labels, while NumPy arrays are labeled by position.
     method : str
         A string representing which tissue-expression metric should be
         calculated. One of: 'counts', 'tau', 'gini', 'simpson',
@@ -68,10 +326,77 @@ class TissueSpecificity:
         value is transformed. The following metrics are affected by changes in
         this parameter: 'gini', 'simpson', 'shannon_specificity',
         'roku_specificity', 'zscore'.
-    threshold : int or float, default 0
+    threshold : int, float or array-like, default 0
         Value above which the gene is considered to be expressed. By default,
         any positive expression value is considered. Only the 'counts' metric
-        is affected by changes in this parameter.
+        is affected by changes in this parameter. If an array of thresholds is
+        given, the 'counts' metric is computed for each one of them and the
+        tissue-specificity values are returned as a gene × threshold
+        DataFrame.
+    storage : str, default 'float64'
+        Representation used to keep the tissue-specificity values in memory.
+        One of: 'float64', 'float32' (lossless for values rounded to four
+        decimal places), 'float16' (lossy, about three significant digits),
+        'uint16' (values quantized to four decimal places, restricted to the
+        [0,6.5534] range) or 'sparse' (only non-zero values are stored). With
+        any storage other than 'float64', the `tissue_specificity` DataFrame is
+        materialized each time it is accessed. Only the 'float64' storage is
+        available for dask inputs.
+    genes : list, optional
+        Names of the genes to be scored. By default, all the genes of the
+        expression matrix are scored. Otherwise, the expression matrix is
+        restricted to these genes, in their original order, before it is
+        validated and before any value is computed. Gene names are compared as
+        strings. Not available for dask arrays.
+    native_output : bool, default False
+        If the expression matrix is a polars DataFrame or a pyarrow Table,
+        return the tissue-specificity values in the same library, as a table
+        whose first column holds the gene names. By default, the values are
+        returned as a pandas object.
+    missing : str, default 'propagate'
+        How missing (NaN) expression values are handled. If 'propagate', genes
+        with missing values may be assigned NaN tissue-specificity values. If
+        'ignore', the tissue-specificity of each gene is computed over the
+        tissues in which it was observed and, for the 'tsi', 'zscore', 'spm'
+        and 'js_specificity' metrics, missing tissues are assigned NaN.
+    tissue_groups : dict, pandas.Series or pandas.DataFrame, optional
+        Groups of tissues in which tissue-specificity is computed instead of in
+        individual tissues, such as the tissue or organ system of each cell
+        type. Either a mapping of tissues to groups, a mapping of level names
+        to such mappings or a DataFrame with one row per tissue and one column
+        per level (e.g. 'tissue', 'organ_system'). The expression of the
+        tissues of each group is summed for all levels at once and the metric
+        is computed at every level. The values are returned as a DataFrame
+        with one column per level or, for the 'tsi', 'zscore', 'spm' and
+        'js_specificity' metrics, with (level, group) columns. Tissues without
+        a group in a level are left out of that level. Not available for dask
+        inputs.
+    window : int, optional
+        Number of consecutive columns (e.g. the stages of a developmental time
+        course) in which the metric is computed. If given, the column order is
+        treated as time and the tissue-specificity values are returned as a
+        gene × window DataFrame, whose columns are labeled after the first
+        column of each window. Only available for the metrics that summarize
+        each gene in a single value. The 'counts', 'tau', 'simpson' and
+        'shannon_specificity' metrics are computed for all windows at once,
+        at a cost that does not depend on the size of the windows. Not
+        available for dask inputs or together with tissue groups.
+    step : int, default 1
+        Number of columns between the starts of consecutive windows.
+    compute : bool, default True
+        Compute the tissue-specificity values of all genes when the object is
+        created. If False, they are computed the first time they are needed,
+        and `filter_above` and `plot_heatmap` only compute the metric for the
+        genes that can reach their threshold. Ignored for dask inputs.
+    progress : callable, optional
+        Function called with a Progress tuple (genes processed, total number
+        of genes, elapsed time, throughput and estimated time remaining) after
+        each block of genes is computed. Ignored for dask inputs.
+    cancel_token : CancellationToken, optional
+        Token checked between blocks of genes. If it is cancelled, the
+        computation stops and raises ComputationCancelled, whose partial
+        attribute holds the values of the blocks computed so far. Ignored for
+        dask inputs.
 
     Attributes
     ----------
@@ -80,8 +405,23 @@ class TissueSpecificity:
         log parameter was set to True, the values will be log-transformed.
     tissue_specificity : pandas.Series or pandas.DataFrame
         Tissue-specificity values computed from the input expression matrix.
+        For dask inputs, this is a lazy dask collection that can be computed or
+        written out (e.g. with `to_parquet`) without loading the whole result
+        into memory.
     """
 
+    _block_size = 10000
+    _expression_data = None
+    _expression_file = None
+    _expression_genes = None
+    _native_library = None
+    _native_output = False
+    _native_tissue_specificity = None
+    _tissue_specificity = None
+    _tissue_specificity_values = None
+    _tissue_groups = None
+    _grouped_data = None
+
     def __init__(self, expression_data, method, log=False, **kwargs):
         self._function_dictionary = {
             'counts': counts,
@@ -97,43 +437,761 @@ class TissueSpecificity:
             'js_specificity': js_specificity,
             'js_specificity_dpm': js_specificity_dpm,
         }
-        self.expression_data = expression_data.select_dtypes(include='number').astype(
-            float
-        )
-        if self.expression_data.shape[1] < expression_data.shape[1]:
-            warnings.warn(
-                'The input DataFrame contains non-numerical columns. These columns were removed.'
+        self._lazy = _is_dask_collection(expression_data)
+        cube = not self._lazy and _is_cube(expression_data)
+        if cube:
+            expression_data = _cube_to_dataframe(expression_data)
+        self._native_library = _native_library(expression_data)
+        if self._native_library is not None:
+            expression_data = _native_to_dataframe(
+                expression_data, self._native_library
             )
-        if np.any(self.expression_data < 0):
-            raise ValueError('Negative expression values are not allowed.')
-        if self.expression_data.index.duplicated().any():
-            raise ValueError(
-                'There are duplicated gene names in the input DataFrame index. Please, correct this issue.'
+        self._native_output = kwargs.pop('native_output', False)
+        compute = kwargs.pop('compute', True)
+        tissue_groups = kwargs.pop('tissue_groups', None)
+        genes = kwargs.pop('genes', None)
+        if genes is not None:
+            expression_data = self._select_genes(expression_data, genes)
+        if self._lazy and not hasattr(expression_data, 'select_dtypes'):
+            self.expression_data = self._prepare_dask_array(expression_data)
+        elif cube or self._native_library is not None:
+            # Already converted to a float64 matrix
+            self.expression_data = validate_expression_matrix(expression_data)
+        else:
+            self.expression_data = prepare_expression_matrix(
+                expression_data, self._lazy
+            )
+        if tissue_groups is not None:
+            if self._lazy:
+                raise ValueError('Tissue groups are not available for dask inputs.')
+            self._tissue_groups = _tissue_group_frame(
+                tissue_groups, self.expression_data.columns
+            )
+            self._grouped_data = _aggregate_groups(
+                self.expression_data,
+                self._tissue_groups,
+                kwargs.get('missing', 'propagate'),
             )
+            if log:
+                self._grouped_data = np.log(self._grouped_data + 1)
         if log:
-            self.expression_data = self.expression_data.apply(lambda x: np.log(x + 1))
+            self.expression_data = np.log(self.expression_data + 1)
+        self._set_parameters(method, log, **kwargs)
+        if self._lazy and self._storage != 'float64':
+            raise ValueError('Only the "float64" storage is supported for dask inputs.')
+        if self._window is not None:
+            self._check_window()
+        if self._lazy:
+            self._tissue_specificity = self._compute_tissue_specificity()
+        elif compute:
+            self._store_tissue_specificity(self._compute_tissue_specificity())
+
+    @classmethod
+    def from_file(cls, input_file, method, log=False, sheet=None, **kwargs):
+        """
+        Create an object of the TissueSpecificity class from an expression
+        matrix file. If the file has an up-to-date sidecar index (see
+        `tspex.core.index_functions.write_index` or the `tspex index`
+        command), the metric is a scalar one, missing values are not ignored
+        and no worksheet is selected, the tissue-specificity values are
+        computed from the index and the expression matrix is only read if the
+        `expression_data` attribute is accessed.
+
+        Parameters
+        ----------
+        input_file : str
+            Path to an expression matrix file in the TSV, CSV, Excel or Parquet
+            formats.
+        method : str
+            Tissue-specificity metric.
+        log : bool, default False
+            Log-transform the expression matrix before computing
+            tissue-specificity.
+        sheet : str or int, default None
+            Name or zero-based index of the Excel worksheet to read. By
+            default, the first worksheet is read. As the sidecar index is
+            built from the first worksheet, it is not used if a worksheet is
+            selected.
+        **kwargs
+            Additional parameters of the TissueSpecificity class. If the genes
+            parameter is given, only the rows of these genes are read from
+            the file (see `tspex.core.io_functions.read_expression_matrix`).
+
+        Returns
+        -------
+        tspex.TissueSpecificity
+            Object of the TissueSpecificity class.
+        """
+
+        if (
+            str(method) in INDEX_METHODS
+            and kwargs.get('missing') != 'ignore'
+            and kwargs.get('tissue_groups') is None
+            and kwargs.get('window') is None
+            and sheet is None
+        ):
+            index = read_index(input_file, keys=index_keys(str(method), log))
+        else:
+            index = None
+        genes = kwargs.pop('genes', None)
+        if index is None:
+            return cls(
+                read_expression_matrix(input_file, sheet, genes), method, log, **kwargs
+            )
+        tissue_specificity = cls.__new__(cls)
+        tissue_specificity._lazy = False
+        tissue_specificity._expression_file = input_file
+        tissue_specificity._expression_genes = genes
+        tissue_specificity._set_parameters(method, log, **kwargs)
+        index_values = index_specificity(
+            index,
+            tissue_specificity._method,
+            log,
+            tissue_specificity._transform,
+            tissue_specificity._threshold,
+            genes,
+        )
+        if genes is not None:
+            index_values = select_genes(index_values, genes)
+        tissue_specificity._store_tissue_specificity(index_values)
+        return tissue_specificity
+
+    @classmethod
+    def from_gene_sets(
+        cls, expression_data, gene_sets, method, log=False, agg='sum', **kwargs
+    ):
+        """
+        Create an object of the TissueSpecificity class that scores gene sets
+        (e.g. pathways) instead of genes. The expression of the genes of each
+        set is aggregated in every tissue and the metric is computed from the
+        aggregated profiles. Gene sets may overlap.
+
+        Parameters
+        ----------
+        expression_data : pandas.core.frame.DataFrame
+            Expression matrix, with rows corresponding to genes and columns to
+            tissues/conditions. Polars DataFrames and pyarrow Tables are also
+            accepted.
+        gene_sets : dict
+            Dictionary mapping the name of each gene set to the names of its
+            genes (see `tspex.core.io_functions.read_gmt`). Gene names are
+            compared as strings. Genes that are not in the expression matrix
+            are ignored and gene sets without any gene in the matrix are
+            removed.
+        method : str
+            Tissue-specificity metric.
+        log : bool, default False
+            Log-transform the aggregated expression values before computing
+            tissue-specificity.
+        agg : str, default 'sum'
+            How the expression of the genes of each set is aggregated. One of:
+            'sum', 'mean'.
+        **kwargs
+            Additional parameters of the TissueSpecificity class. If missing
+            is 'ignore', missing values are left out of the aggregation.
+
+        Returns
+        -------
+        tspex.TissueSpecificity
+            Object of the TissueSpecificity class, whose expression matrix has
+            one row per gene set.
+        """
+
+        if _is_dask_collection(expression_data):
+            raise ValueError('Gene sets are not available for dask inputs.')
+        library = _native_library(expression_data)
+        if library is not None:
+            expression_data = validate_expression_matrix(
+                _native_to_dataframe(expression_data, library)
+            )
+        else:
+            expression_data = prepare_expression_matrix(expression_data)
+        aggregated = aggregate_gene_sets(
+            expression_data, gene_sets, agg, kwargs.get('missing', 'propagate')
+        )
+        return cls(aggregated, method, log, **kwargs)
+
+    def _set_parameters(self, method, log, **kwargs):
         self._method = str(method)
+        self._log = log
         self._transform = kwargs.pop('transform', True)
         self._threshold = kwargs.pop('threshold', 0)
-        self.tissue_specificity = self._compute_tissue_specificity()
+        if np.ndim(self._threshold):
+            self._threshold = np.asarray(self._threshold, dtype=float)
+        self._storage = kwargs.pop('storage', 'float64')
+        self._missing = kwargs.pop('missing', 'propagate')
+        self._window = kwargs.pop('window', None)
+        self._step = kwargs.pop('step', 1)
+        self._progress = kwargs.pop('progress', None)
+        self._cancel_token = kwargs.pop('cancel_token', None)
+        if self._missing not in ['propagate', 'ignore']:
+            raise ValueError(
+                'Invalid missing value handling. Allowed values are: "propagate", "ignore".'
+            )
+        if self._storage not in STORAGE_TYPES:
+            raise ValueError(
+                'Invalid storage type. Allowed values are: "{}".'.format(
+                    '", "'.join(STORAGE_TYPES)
+                )
+            )
+
+    def _check_window(self):
+        if self._lazy or self._grouped_data is not None:
+            raise ValueError(
+                'Sliding windows are not available for dask inputs or together with '
+                'tissue groups.'
+            )
+        if self._method in ['tsi', 'zscore', 'spm', 'js_specificity'] or np.ndim(
+            self._threshold
+        ):
+            raise ValueError(
+                'Sliding windows are only available for metrics that summarize each gene '
+                'in a single value.'
+            )
+        if not 1 <= self._window <= self.expression_data.shape[1] or self._step < 1:
+            raise ValueError(
+                'The window must have between 1 and {} columns and the step must be '
+                'positive.'.format(self.expression_data.shape[1])
+            )
+
+    def _store_tissue_specificity(self, tissue_specificity):
+        self._tissue_specificity_index = tissue_specificity.index
+        if isinstance(tissue_specificity, pd.DataFrame):
+            self._tissue_specificity_columns = tissue_specificity.columns
+        else:
+            self._tissue_specificity_columns = None
+        self._tissue_specificity_values = encode_values(
+            tissue_specificity.values, self._storage
+        )
+        if self._storage == 'float64':
+            self._tissue_specificity = tissue_specificity
+        else:
+            self._tissue_specificity = None
+
+    @property
+    def expression_data(self):
+        if self._expression_data is None and self._expression_file is not None:
+            expression_data = prepare_expression_matrix(
+                read_expression_matrix(
+                    self._expression_file, genes=self._expression_genes
+                )
+            )
+            if self._log:
+                expression_data = np.log(expression_data + 1)
+            self._expression_data = expression_data
+        return self._expression_data
+
+    @expression_data.setter
+    def expression_data(self, expression_data):
+        self._expression_data = expression_data
+
+    @property
+    def tissue_specificity(self):
+        if self._native_output and self._native_library is not None:
+            if self._native_tissue_specificity is None:
+                self._native_tissue_specificity = self._to_native(
+                    self._get_tissue_specificity()
+                )
+            return self._native_tissue_specificity
+        return self._get_tissue_specificity()
+
+    def _get_tissue_specificity(self):
+        if self._tissue_specificity is not None:
+            return self._tissue_specificity
+        self._compute_deferred()
+        if self._tissue_specificity is not None:
+            return self._tissue_specificity
+        return self._wrap_values(decode_values(self._tissue_specificity_values))
+
+    def _to_native(self, tissue_specificity):
+        if isinstance(tissue_specificity, pd.Series):
+            tissue_specificity = tissue_specificity.to_frame(self._method)
+        if isinstance(tissue_specificity.columns, pd.MultiIndex):
+            tissue_specificity.columns = [
+                '/'.join(str(label) for label in column)
+                for column in tissue_specificity.columns
+            ]
+        tissue_specificity = tissue_specificity.rename(columns=str)
+        tissue_specificity.index.name = tissue_specificity.index.name or 'gene'
+        tissue_specificity = tissue_specificity.reset_index()
+        if self._native_library == 'polars':
+            import polars as pl
+
+            return pl.from_pandas(tissue_specificity)
+        import pyarrow as pa
+
+        return pa.Table.from_pandas(tissue_specificity, preserve_index=False)
+
+    def _compute_deferred(self):
+        if not self._lazy and self._tissue_specificity_values is None:
+            self._store_tissue_specificity(self._compute_tissue_specificity())
+
+    def _wrap_values(self, values):
+        if self._tissue_specificity_columns is None:
+            return pd.Series(values, index=self._tissue_specificity_index)
+        return pd.DataFrame(
+            values,
+            index=self._tissue_specificity_index,
+            columns=self._tissue_specificity_columns,
+        )
+
+    def _select_genes(self, expression_data, genes):
+        if not self._lazy:
+            return select_genes(expression_data, genes)
+        if not hasattr(expression_data, 'map_partitions'):
+            raise ValueError('Genes cannot be selected from dask arrays.')
+        return expression_data.map_partitions(
+            _select_partition_genes, list(genes), meta=expression_data._meta
+        )
+
+    def _prepare_dask_array(self, expression_data):
+        if expression_data.ndim != 2:
+            raise ValueError('The input dask array must be two-dimensional.')
+        expression_data = expression_data.astype(float).rechunk({1: -1})
+        if (expression_data < 0).any().compute():
+            raise ValueError('Negative expression values are not allowed.')
+        return expression_data
 
     def _compute_tissue_specificity(self):
         func = self._function_dictionary[self._method]
-        if self._method in ['tsi', 'zscore', 'spm', 'js_specificity']:
-            tissue_specificity = self.expression_data.apply(
-                func, axis=1, result_type='broadcast', transform=self._transform
+        if self._lazy:
+            return self._compute_lazy_tissue_specificity(func)
+        if self._grouped_data is not None:
+            return self._compute_grouped_tissue_specificity(func)
+        tracker = self._progress_tracker(len(self.expression_data))
+        return self._compute_frame(
+            self.expression_data, func, self._result_columns(), tracker
+        )
+
+    def _progress_tracker(self, total):
+        if self._progress is None:
+            return None
+        return ProgressTracker(self._progress, total)
+
+    def _compute_frame(self, expression_data, func, columns, tracker=None):
+        matrix = expression_data.values
+        if self._window is not None:
+            block_function = functools.partial(
+                _compute_window_block, window=self._window, step=self._step
+            )
+        else:
+            block_function = compute_block
+        blocks = []
+        for start in range(0, max(len(matrix), 1), self._block_size):
+            if self._cancel_token is not None and self._cancel_token.cancelled:
+                # Blocks computed before the cancellation are kept
+                partial = self._frame_from_blocks(
+                    blocks, expression_data.index[:start], columns
+                )
+                self._cancel_token.raise_if_cancelled(partial)
+            blocks.append(
+                block_function(
+                    matrix[start : start + self._block_size],
+                    func,
+                    transform=self._transform,
+                    threshold=self._threshold,
+                    missing=self._missing,
+                )
             )
+            if tracker is not None:
+                tracker.update(len(blocks[-1]))
+        return self._frame_from_blocks(blocks, expression_data.index, columns)
+
+    @staticmethod
+    def _frame_from_blocks(blocks, index, columns):
+        if blocks:
+            values = np.concatenate(blocks)
         else:
-            tissue_specificity = self.expression_data.apply(
+            values = np.empty((0, len(columns)) if columns is not None else 0)
+        if columns is not None:
+            return pd.DataFrame(values, index=index, columns=columns)
+        return pd.Series(values, index=index)
+
+    def _compute_grouped_tissue_specificity(self, func):
+        levels = list(self._tissue_groups.columns)
+        tracker = self._progress_tracker(len(self.expression_data) * len(levels))
+        results = []
+        for level in levels:
+            level_data = self._grouped_data[level]
+            try:
+                results.append(
+                    self._compute_frame(
+                        level_data, func, self._result_columns(level_data), tracker
+                    )
+                )
+            except ComputationCancelled as cancelled:
+                # Only the levels computed for every gene are kept
+                if results:
+                    cancelled.partial = pd.concat(
+                        results, axis=1, keys=levels[: len(results)], names=['level']
+                    )
+                else:
+                    cancelled.partial = None
+                raise
+        return pd.concat(results, axis=1, keys=levels, names=['level'])
+
+    def _result_columns(self, expression_data=None):
+        if expression_data is None:
+            expression_data = self.expression_data
+        if self._window is not None:
+            return pd.Index(
+                expression_data.columns[
+                    : expression_data.shape[1] - self._window + 1 : self._step
+                ],
+                name='window',
+            )
+        if self._method in ['tsi', 'zscore', 'spm', 'js_specificity']:
+            if hasattr(expression_data, 'columns'):
+                return expression_data.columns
+            return pd.RangeIndex(expression_data.shape[1])
+        if self._method == 'counts' and np.ndim(self._threshold):
+            return pd.Index(self._threshold, name='threshold')
+        return None
+
+    def _compute_lazy_tissue_specificity(self, func):
+        columns = self._result_columns()
+        if hasattr(self.expression_data, 'map_partitions'):
+            if columns is None:
+                meta = pd.Series(dtype=float)
+            else:
+                meta = pd.DataFrame(columns=columns, dtype=float)
+            return self.expression_data.map_partitions(
+                _compute_frame_block,
                 func,
-                axis=1,
-                result_type='reduce',
-                transform=self._transform,
-                threshold=self._threshold,
+                self._transform,
+                self._threshold,
+                self._missing,
+                columns,
+                meta=meta,
+            )
+        if columns is None:
+            return self.expression_data.map_blocks(
+                compute_block,
+                func,
+                self._transform,
+                self._threshold,
+                self._missing,
+                drop_axis=1,
+                dtype=float,
+            )
+        return self.expression_data.map_blocks(
+            compute_block,
+            func,
+            self._transform,
+            self._threshold,
+            self._missing,
+            chunks=(self.expression_data.chunks[0], (len(columns),)),
+            dtype=float,
+        )
+
+    def _iter_tissue_specificity_blocks(self, block_size):
+        if self._lazy:
+            blocks = self._tissue_specificity.to_delayed()
+            if isinstance(blocks, np.ndarray):
+                blocks = blocks.ravel()
+            for block in blocks:
+                yield np.asarray(block.compute())
+        else:
+            self._compute_deferred()
+            for start in range(0, len(self._tissue_specificity_index), block_size):
+                yield decode_values(
+                    self._tissue_specificity_values, start, start + block_size
+                )
+
+    def _iter_representative_values(self, block_size=10000):
+        for block in self._iter_tissue_specificity_blocks(block_size):
+            if block.ndim == 2:
+                yield pd.DataFrame(block).max(axis=1).values
+            else:
+                yield block
+
+    def save(self, path):
+        """
+        Save the expression matrix, the tissue-specificity values and the
+        parameters used to compute them to a directory. Arrays are stored as
+        uncompressed npy files, in the representation given by the storage
+        parameter, so that they can be memory-mapped by
+        `TissueSpecificity.load`. Gene and tissue names are stored as strings.
+
+        Parameters
+        ----------
+        path : str
+            Path to the output directory. It is created if it does not exist.
+        """
+
+        if self._lazy:
+            raise ValueError(
+                'Objects created from dask inputs cannot be saved. Compute the '
+                'tissue-specificity values first.'
+            )
+        self._compute_deferred()
+        expression_data = self.expression_data
+        arrays = {
+            'expression_values': expression_data.values,
+            # (condition, gene) rows are saved as a two-dimensional array
+            'genes': _label_array(expression_data.index.tolist()),
+            'tissues': _label_array(expression_data.columns),
+        }
+        if self._tissue_specificity_columns is not None:
+            # (level, group) columns are saved as a two-dimensional array
+            arrays['result_columns'] = _label_array(
+                self._tissue_specificity_columns.tolist()
+            )
+        for key, value in self._tissue_specificity_values.items():
+            if key != 'storage':
+                arrays['encoded_' + key] = value
+        parameters = {
+            'method': self._method,
+            'log': self._log,
+            'transform': self._transform,
+            'threshold': np.asarray(self._threshold).tolist(),
+            'storage': self._storage,
+            'missing': self._missing,
+            'window': self._window,
+            'step': self._step,
+            'genes_name': expression_data.index.names,
+            'result_columns_name': (
+                None
+                if self._tissue_specificity_columns is None
+                else self._tissue_specificity_columns.names
+            ),
+            'arrays': sorted(arrays),
+        }
+        os.makedirs(path, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(path, name + '.npy'), array)
+        with open(os.path.join(path, 'parameters.json'), 'w') as fout:
+            json.dump(parameters, fout, indent=2)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load an object of the TissueSpecificity class saved with
+        `TissueSpecificity.save`, without recomputing the tissue-specificity
+        values.
+
+        Parameters
+        ----------
+        path : str
+            Path to the directory where the object was saved.
+        mmap : bool, default True
+            Memory-map the saved arrays instead of reading them into memory,
+            so that loading takes the same time regardless of their size. The
+            expression matrix and the tissue-specificity values are then
+            read-only views of the files, which must not be modified or
+            removed while the object is in use.
+
+        Returns
+        -------
+        tspex.TissueSpecificity
+            Object of the TissueSpecificity class.
+        """
+
+        with open(os.path.join(path, 'parameters.json')) as fin:
+            parameters = json.load(fin)
+        arrays = {
+            name: np.load(
+                os.path.join(path, name + '.npy'), mmap_mode='r' if mmap else None
             )
-        tissue_specificity = tissue_specificity.round(4)
+            for name in parameters['arrays']
+        }
+        tissue_specificity = cls.__new__(cls)
+        tissue_specificity._lazy = False
+        tissue_specificity._set_parameters(
+            parameters['method'],
+            parameters['log'],
+            transform=parameters['transform'],
+            threshold=parameters['threshold'],
+            storage=parameters['storage'],
+            missing=parameters['missing'],
+            window=parameters.get('window'),
+            step=parameters.get('step', 1),
+        )
+        if arrays['genes'].ndim == 2:
+            genes = pd.MultiIndex.from_arrays(
+                list(arrays['genes'].T), names=parameters.get('genes_name')
+            )
+        else:
+            genes = pd.Index(arrays['genes'])
+        tissue_specificity.expression_data = pd.DataFrame(
+            arrays['expression_values'],
+            index=genes,
+            columns=pd.Index(arrays['tissues']),
+        )
+        tissue_specificity._tissue_specificity_index = genes
+        if 'result_columns' in arrays:
+            result_columns = np.atleast_2d(arrays['result_columns'].T)
+            names = parameters['result_columns_name']
+            if not isinstance(names, list):
+                names = [names]
+            if len(result_columns) > 1:
+                tissue_specificity._tissue_specificity_columns = (
+                    pd.MultiIndex.from_arrays(list(result_columns), names=names)
+                )
+            else:
+                tissue_specificity._tissue_specificity_columns = pd.Index(
+                    result_columns[0], name=names[0]
+                )
+        else:
+            tissue_specificity._tissue_specificity_columns = None
+        encoded_values = {'storage': parameters['storage']}
+        for name, array in arrays.items():
+            if name.startswith('encoded_'):
+                encoded_values[name[len('encoded_') :]] = array
+        tissue_specificity._tissue_specificity_values = encoded_values
+        if parameters['storage'] == 'float64':
+            tissue_specificity._tissue_specificity = tissue_specificity._wrap_values(
+                decode_values(encoded_values)
+            )
+        else:
+            tissue_specificity._tissue_specificity = None
         return tissue_specificity
 
+    def filter_above(self, threshold):
+        """
+        Select the genes with tissue-specificity over a given threshold. If the
+        chosen metric is one of 'tsi', 'zscore', 'spm' or 'js_specificity', the
+        maximum row value is used as a representative of the gene
+        tissue-specificity. If the tissue-specificity values were not computed
+        yet (see the compute parameter), cheap upper bounds of the metric
+        (e.g. derived from the ratio between the maximum and the sum of the
+        expression values) are evaluated first and the metric is only computed
+        for the genes whose bound reaches the threshold. The result is the same
+        as filtering the values of all genes.
+
+        Parameters
+        ----------
+        threshold : float
+            Tissue-specificity threshold.
+
+        Returns
+        -------
+        pandas.Series or pandas.DataFrame
+            Tissue-specificity values of the selected genes.
+        """
+
+        if (
+            self._lazy
+            or self._grouped_data is not None
+            or self._window is not None
+            or self._tissue_specificity_values is not None
+        ):
+            tissue_specificity = self._get_tissue_specificity()
+            if tissue_specificity.ndim == 2:
+                return tissue_specificity[tissue_specificity.max(axis=1) >= threshold]
+            return tissue_specificity[tissue_specificity >= threshold]
+        func = self._function_dictionary[self._method]
+        bound_func = getattr(bound_functions, self._method, None)
+        matrix = self.expression_data.values
+        rows = []
+        values = []
+        for start in range(0, max(len(matrix), 1), self._block_size):
+            block = matrix[start : start + self._block_size]
+            candidates = np.arange(start, start + len(block))
+            if bound_func is not None and not np.ndim(self._threshold):
+                # Values are rounded to four decimal places, and so are the
+                # bounds before being compared to the threshold. Genes with
+                # missing values have NaN bounds and are always kept.
+                bound = bound_func(block, transform=self._transform)
+                candidates = candidates[~(np.round(bound + 1e-9, 4) < threshold)]
+            block_values = compute_block(
+                matrix[candidates],
+                func,
+                self._transform,
+                self._threshold,
+                self._missing,
+            )
+            if block_values.ndim == 2:
+                representative = pd.DataFrame(block_values).max(axis=1).values
+            else:
+                representative = block_values
+            selected = representative >= threshold
+            rows.append(candidates[selected])
+            values.append(block_values[selected])
+        rows = np.concatenate(rows)
+        values = np.concatenate(values)
+        columns = self._result_columns()
+        if columns is not None:
+            return pd.DataFrame(
+                values, index=self.expression_data.index[rows], columns=columns
+            )
+        return pd.Series(values, index=self.expression_data.index[rows])
+
+    def top_tissues(self, k=3):
+        """
+        Compute the fraction of the expression of each gene found in its top
+        tissues, for every number of top tissues up to k, and identify these
+        tissues. Genes that are specific to a small group of tissues rather
+        than to a single one have high fractions for small numbers of
+        tissues. The fractions are computed from the expression matrix (after
+        the log transformation, if it was requested), using a single partial
+        sort of each row (see
+        `tspex.core.auxiliary_functions.top_tissue_fractions`).
+
+        Parameters
+        ----------
+        k : int, default 3
+            Largest number of top tissues to be considered.
+
+        Returns
+        -------
+        tuple of pandas.DataFrame
+            Two gene × k DataFrames. The first contains, in column i, the
+            fraction of the expression of each gene in its top i tissues. The
+            second contains the names of the top tissues, in descending order
+            of expression.
+        """
+
+        if self._lazy:
+            raise ValueError('Top tissues are not available for dask inputs.')
+        expression_data = self.expression_data
+        fractions, top = top_tissue_fractions(
+            expression_data.values, k, ignore_missing=self._missing == 'ignore'
+        )
+        columns = pd.RangeIndex(1, k + 1, name='k')
+        return (
+            pd.DataFrame(fractions, index=expression_data.index, columns=columns),
+            pd.DataFrame(
+                np.asarray(expression_data.columns)[top],
+                index=expression_data.index,
+                columns=columns,
+            ),
+        )
+
+    def histogram(self, bins=30, block_size=10000):
+        """
+        Accumulate a histogram of the tissue-specificity values block by block.
+        If the chosen metric is one of 'tsi', 'zscore', 'spm' or
+        'js_specificity', the maximum row value is used as a representative of
+        the gene tissue-specificity. Bins span the [0,1] range unless values
+        fall outside of it, in which case the observed range is used.
+
+        Parameters
+        ----------
+        bins : int, default 30
+            Number of bins in the histogram.
+        block_size : int, default 10000
+            Number of genes processed at a time.
+
+        Returns
+        -------
+        tspex.core.histogram_class.StreamingHistogram
+            Histogram of the tissue-specificity values.
+        """
+
+        # The representative values, one per gene, are kept after the range is
+        # found, so that the values of dask inputs are only computed once
+        blocks = list(self._iter_representative_values(block_size))
+        value_range = [0.0, 1.0]
+        for values in blocks:
+            if len(values):
+                value_range[0] = min(value_range[0], np.nanmin(values))
+                value_range[1] = max(value_range[1], np.nanmax(values))
+        histogram = StreamingHistogram(bins=bins, value_range=value_range)
+        for values in blocks:
+            histogram.update(values)
+        return histogram
+
     def plot_histogram(self, bins=30, size=(6, 4), dpi=75):
         """
         Plot a histogram of the tissue-specificity values. If the chosen metric
@@ -150,13 +1208,16 @@ class TissueSpecificity:
             The resolution in dots per inch.
         """
 
+        histogram = self.histogram(bins=bins)
         with plt.style.context('seaborn-whitegrid'):
-            if self._method in ['tsi', 'zscore', 'spm', 'js_specificity']:
-                data = self.tissue_specificity.max(axis=1).values
-            else:
-                data = self.tissue_specificity.values
             fig, ax = plt.subplots(figsize=size, dpi=dpi, constrained_layout=True)
-            ax.hist(data, bins=bins, alpha=0.85, color='#262626')
+            ax.hist(
+                histogram.edges[:-1],
+                bins=histogram.edges,
+                weights=histogram.counts,
+                alpha=0.85,
+                color='#262626',
+            )
             ax.set_ylabel('Number of genes')
             ax.set_xlabel(self._method)
             ax.set_title('Histogram of {} values'.format(self._method), loc='left')
@@ -199,11 +1260,18 @@ class TissueSpecificity:
             The resolution in dots per inch.
         """
 
-        if self._method in ['tsi', 'zscore', 'spm', 'js_specificity']:
-            ts_data = self.tissue_specificity.max(axis=1)
+        if self._lazy:
+            tissue_specificity = self._get_tissue_specificity()
+            if tissue_specificity.ndim == 2:
+                ts_data = tissue_specificity.max(axis=1)
+            else:
+                ts_data = tissue_specificity
+            if hasattr(self.expression_data, 'loc'):
+                expr_data = _materialize(self.expression_data.loc[ts_data >= threshold])
+            else:
+                expr_data = _materialize(self.expression_data[ts_data >= threshold])
         else:
-            ts_data = self.tissue_specificity
-        expr_data = self.expression_data.loc[ts_data >= threshold]
+            expr_data = self.expression_data.loc[self.filter_above(threshold).index]
         if not len(expr_data):
             warnings.warn(
                 'There is no gene with tissue-specificity value above the threshold.'
@@ -213,8 +1281,10 @@ class TissueSpecificity:
             sorted_index = expr_data.idxmax(axis=1).sort_values().index
             expr_data = expr_data.reindex(sorted_index)
         if use_zscore:
-            expr_data = expr_data.apply(
-                zscore, axis=1, result_type='broadcast', transform=False
+            expr_data = pd.DataFrame(
+                zscore(expr_data.values, transform=False),
+                index=expr_data.index,
+                columns=expr_data.columns,
             )
         fig, ax = plt.subplots(figsize=size, dpi=dpi, constrained_layout=True)
         im = ax.imshow(expr_data, cmap=cmap, aspect='auto', interpolation='none')
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+"""
+Functions to store tissue-specificity values in compact representations.
+"""
+
+import numpy as np
+
+STORAGE_TYPES = ['float64', 'float32', 'float16', 'uint16', 'sparse']
+
+_UINT16_SCALE = 1e4
+_UINT16_NAN = np.iinfo(np.uint16).max
+
+
+def encode_values(values, storage='float64'):
+    """
+    Encode an array of tissue-specificity values using a compact representation.
+
+    Parameters
+    ----------
+    values : numpy.array
+        One- or two-dimensional array of tissue-specificity values.
+    storage : str, default 'float64'
+        Representation used to store the values. One of: 'float64' (no
+        compression), 'float32' (lossless for values rounded to four decimal
+        places), 'float16' (lossy, about three significant digits), 'uint16'
+        (values quantized to four decimal places, restricted to the [0,6.5534]
+        range) or 'sparse' (only non-zero values are stored as float32).
+
+    Returns
+    -------
+    dict
+        Dictionary of arrays representing the values.
+    """
+
+    values = np.asarray(values, dtype=float)
+    if storage == 'float64':
+        return {'storage': storage, 'values': values}
+    elif storage in ['float32', 'float16']:
+        return {'storage': storage, 'values': values.astype(storage)}
+    elif storage == 'uint16':
+        finite_values = values[~np.isnan(values)]
+        if np.any(finite_values < 0) or np.any(
+            finite_values > (_UINT16_NAN - 1) / _UINT16_SCALE
+        ):
+            raise ValueError(
+                'The "uint16" storage only supports values in the [0,6.5534] range.'
+            )
+        quantized = np.rint(values * _UINT16_SCALE)
+        quantized[np.isnan(values)] = _UINT16_NAN
+        return {'storage': storage, 'values': quantized.astype(np.uint16)}
+    elif storage == 'sparse':
+        flat_values = values.ravel()
+        indices = np.flatnonzero(flat_values)
+        index_dtype = (
+            np.int32 if flat_values.size < np.iinfo(np.int32).max else np.int64
+        )
+        return {
+            'storage': storage,
+            'shape': np.array(values.shape),
+            'indices': indices.astype(index_dtype),
+            'values': flat_values[indices].astype(np.float32),
+        }
+    else:
+        raise ValueError(
+            'Invalid storage type. Allowed values are: "{}".'.format(
+                '", "'.join(STORAGE_TYPES)
+            )
+        )
+
+
+def decode_values(encoded, start=None, stop=None):
+    """
+    Decode tissue-specificity values from a compact representation, optionally
+    restricting the output to a range of rows.
+
+    Parameters
+    ----------
+    encoded : dict
+        Dictionary of arrays returned by `encode_values`.
+    start : int, optional
+        First row to be decoded. By default, decoding starts at the first row.
+    stop : int, optional
+        Row at which decoding stops. By default, decoding stops after the last
+        row.
+
+    Returns
+    -------
+    numpy.array
+        Array of float64 tissue-specificity values.
+    """
+
+    storage = str(encoded['storage'])
+    if storage == 'float64':
+        return encoded['values'][start:stop]
+    elif storage in ['float32', 'float16']:
+        return encoded['values'][start:stop].astype(float).round(4)
+    elif storage == 'uint16':
+        quantized = encoded['values'][start:stop]
+        values = quantized / _UINT16_SCALE
+        values[quantized == _UINT16_NAN] = np.nan
+        return values
+    else:
+        shape = tuple(encoded['shape'])
+        start, stop, _ = slice(start, stop).indices(shape[0])
+        stop = max(start, stop)
+        row_size = int(np.prod(shape[1:], dtype=np.int64))
+        values = np.zeros((stop - start,) + shape[1:])
+        first, last = np.searchsorted(
+            encoded['indices'], [start * row_size, stop * row_size]
+        )
+        values.ravel()[encoded['indices'][first:last] - start * row_size] = encoded[
+            'values'
+        ][first:last]
+        return values.round(4)
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+"""
+Vectorized functions to compute tissue-specificity metrics within sliding
+windows of consecutive columns (e.g. the stages of a developmental time
+course). Each function computes, for every row of the matrix and every window,
+the same metric as its counterpart in `tspex.core.matrix_functions` applied
+to the columns of that window. For the 'counts' and 'shannon_specificity'
+metrics, window sums are computed with the van Herk/Gil-Werman algorithm, from
+prefix and suffix reductions within blocks of columns, so the cost does not
+depend on the size of the windows. The 'tau' and 'simpson' metrics are instead
+computed by their `tspex.core.matrix_functions` counterparts from the values
+of all windows at once, as sums taken in another order can differ in their
+last digits and be rounded to a different fourth decimal place.
+"""
+
+import numpy as np
+
+from tspex.core import matrix_functions
+
+
+def _window_starts(n, window, step):
+    return np.arange(0, n - window + 1, step)
+
+
+def _sliding_reduce(ufunc, matrix, window, step):
+    # The columns are split into blocks of the size of the window, so that each
+    # window spans the suffix of the block where it starts and the prefix of
+    # the block where it ends (the van Herk/Gil-Werman algorithm). Unlike the
+    # difference of two cumulative sums, the result is not affected by the
+    # magnitude of the values outside of the window.
+    rows, n = matrix.shape
+    n_blocks = -(-n // window)
+    padded = np.zeros((rows, n_blocks * window))
+    padded[:, :n] = matrix
+    blocks = padded.reshape(rows, n_blocks, window)
+    prefix = ufunc.accumulate(blocks, axis=2).reshape(rows, -1)
+    suffix = ufunc.accumulate(blocks[:, :, ::-1], axis=2)[:, :, ::-1]
+    suffix = suffix.reshape(rows, -1)
+    starts = _window_starts(n, window, step)
+    # Windows that start at the beginning of a block are the suffix of the
+    # block alone
+    ends = np.where(starts % window, prefix[:, starts + window - 1], 0)
+    return ufunc(suffix[:, starts], ends)
+
+
+def _sliding_sum(matrix, window, step):
+    return _sliding_reduce(np.add, matrix, window, step)
+
+
+def _sliding_max(matrix, window, step):
+    return _sliding_reduce(np.maximum, matrix, window, step)
+
+
+def _windows(matrix, window, step):
+    # Values of each window, as the C-ordered rows of a (rows × windows) ×
+    # window matrix, so that they are reduced with the same operations as the
+    # columns of a single window
+    windows = np.lib.stride_tricks.sliding_window_view(matrix, window, axis=1)
+    return np.ascontiguousarray(windows[:, ::step]).reshape(-1, window)
+
+
+def _window_values(func, matrix, window, step, **kwargs):
+    n_windows = len(_window_starts(matrix.shape[1], window, step))
+    values = func(_windows(matrix, window, step), **kwargs)
+    return values.reshape(len(matrix), n_windows)
+
+
+def _observed(matrix, window, step):
+    # Missing values are replaced by zeros and windows with any missing value
+    # are assigned NaN, as in the metrics computed without windows
+    missing = np.isnan(matrix)
+    if not missing.any():
+        return matrix, None
+    has_missing = _sliding_sum(missing.astype(float), window, step) > 0
+    return np.where(missing, 0, matrix), has_missing
+
+
+def _finalize(values, has_missing):
+    if has_missing is not None:
+        values[has_missing] = np.nan
+    return values
+
+
+def counts(matrix, window, step=1, **kwargs):
+    """
+    Quantify tissue-specificity as the proportion of tissues above an
+    expression threshold within each window.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        ordered tissues/conditions.
+    window : int
+        Number of consecutive columns in each window.
+    step : int, default 1
+        Number of columns between the starts of consecutive windows.
+    threshold : int or float, default 0
+        Value above which the gene is considered to be expressed.
+
+    Returns
+    -------
+    numpy.array
+        Tissue-specificity of each gene in each window.
+    """
+
+    threshold = kwargs.pop('threshold', 0)
+    # Missing values are not counted
+    cts = _sliding_sum((matrix > threshold).astype(float), window, step)
+    if window <= 1:
+        return np.zeros(cts.shape)
+    cts_transformed = (1 - (cts / window)) * (window / (window - 1))
+    cts_transformed[cts == 0] = 0.0
+    return cts_transformed
+
+
+def tau(matrix, window, step=1, **kwargs):
+    """
+    Quantify tissue-specificity as the Tau index within each window.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        ordered tissues/conditions.
+    window : int
+        Number of consecutive columns in each window.
+    step : int, default 1
+        Number of columns between the starts of consecutive windows.
+
+    Returns
+    -------
+    numpy.array
+        Tissue-specificity of each gene in each window.
+    """
+
+    return _window_values(matrix_functions.tau, matrix, window, step)
+
+
+def simpson(matrix, window, step=1, **kwargs):
+    """
+    Quantify tissue-specificity as the Simpson index within each window.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        ordered tissues/conditions.
+    window : int
+        Number of consecutive columns in each window.
+    step : int, default 1
+        Number of columns between the starts of consecutive windows.
+    transform : bool, default True
+        Transform the computed values so they lie in the [0,1] range.
+
+    Returns
+    -------
+    numpy.array
+        Tissue-specificity of each gene in each window.
+    """
+
+    transform = kwargs.pop('transform', True)
+    return _window_values(
+        matrix_functions.simpson, matrix, window, step, transform=transform
+    )
+
+
+def shannon_specificity(matrix, window, step=1, **kwargs):
+    """
+    Quantify tissue-specificity as the difference between the maximum and the
+    observed Shannon entropy within each window.
+
+    Parameters
+    ----------
+    matrix : numpy.array
+        Gene expression matrix. Rows correspond to genes and columns to
+        ordered tissues/conditions.
+    window : int
+        Number of consecutive columns in each window.
+    step : int, default 1
+        Number of columns between the starts of consecutive windows.
+    transform : bool, default True
+        Transform the computed values so they lie in the [0,1] range.
+
+    Returns
+    -------
+    numpy.array
+        Tissue-specificity of each gene in each window.
+    """
+
+    transform = kwargs.pop('transform', True)
+    matrix, has_missing = _observed(matrix, window, step)
+    window_max = _sliding_max(matrix, window, step)
+    if window <= 1:
+        return np.zeros(window_max.shape)
+    # The entropy of x / S is log2(S) - sum(x * log2(x)) / S
+    window_sum = _sliding_sum(matrix, window, step)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_log_x = np.where(matrix > 0, matrix * np.log2(matrix), 0)
+        entropy = np.log2(window_sum) - _sliding_sum(x_log_x, window, step) / window_sum
+    ss = np.log2(window) - entropy
+    if transform:
+        ss = ss / np.log2(window)
+    ss[window_max == 0] = 0.0
+    return _finalize(ss, has_missing)
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+"""
+Pipelined execution of block-wise reading, computing and writing.
+"""
+
+import itertools
+import queue
+import threading
+import time
+
+from tspex.core.progress_class import ComputationCancelled
+
+_DONE = object()
+
+
+class _QueueMonitor:
+    """Bounded queue that records its depth every time an item is added."""
+
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize)
+        self.max_depth = 0
+        self._depth_sum = 0
+        self._puts = 0
+
+    def put(self, item, stop):
+        # Wait in short steps so that a failure in another stage is noticed
+        while not stop.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+            depth = self.queue.qsize()
+            self.max_depth = max(self.max_depth, depth)
+            self._depth_sum += depth
+            self._puts += 1
+            return True
+        return False
+
+    def get(self, stop):
+        while not stop.is_set():
+            try:
+                return self.queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    @property
+    def mean_depth(self):
+        return self._depth_sum / self._puts if self._puts else 0.0
+
+
+class BlockPipeline:
+    """
+    Run a reader, compute workers and a writer as concurrent stages connected
+    by bounded queues, so that reading a block, computing the previous one and
+    writing the one before it overlap in time. Blocks are written in the order
+    in which they were read.
+
+    Each stage runs in its own thread (the compute stage in one thread per
+    worker). Parsing, decompression, file I/O and NumPy kernels release the
+    GIL for most of their run time, which is what the stages overlap.
+
+    Parameters
+    ----------
+    blocks : iterable
+        Iterable that reads the blocks. It is consumed by the reader thread.
+    compute : callable
+        Function applied to each block by the compute workers.
+    write : callable
+        Function called with each computed block by the writer thread.
+    workers : int, default 1
+        Number of compute workers.
+    queue_size : int, default 2
+        Maximum number of blocks waiting in each queue. The number of blocks
+        held in memory at once is bounded by twice this value plus the number
+        of workers.
+    progress : ProgressTracker, optional
+        Tracker updated with the length of each block after it is written.
+    cancel_token : CancellationToken, optional
+        Token checked by the reader after each block is read. If it is
+        cancelled, that block and the following ones are not processed, the
+        blocks read before are computed and written, and `run` raises
+        ComputationCancelled once every stage has finished.
+    """
+
+    def __init__(
+        self,
+        blocks,
+        compute,
+        write,
+        workers=1,
+        queue_size=2,
+        progress=None,
+        cancel_token=None,
+    ):
+        if workers < 1 or queue_size < 1:
+            raise ValueError(
+                'The number of workers and the queue size must be positive.'
+            )
+        self._blocks = blocks
+        self._compute = compute
+        self._write = write
+        self._workers = workers
+        self._progress = progress
+        self._cancel_token = cancel_token
+        self._cancelled = False
+        self._input = _QueueMonitor(queue_size)
+        self._output = _QueueMonitor(queue_size)
+        # Limits the blocks in flight, including the ones waiting to be
+        # written in order after a slower block
+        self._in_flight = threading.BoundedSemaphore(2 * queue_size + workers)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._errors = []
+        self._stats = {
+            'read': 0.0,
+            'compute': 0.0,
+            'write': 0.0,
+            'read_stall': 0.0,
+            'compute_stall': 0.0,
+            'write_stall': 0.0,
+            'blocks': 0,
+        }
+
+    def _add(self, key, value):
+        with self._lock:
+            self._stats[key] += value
+
+    def _fail(self, error):
+        with self._lock:
+            self._errors.append(error)
+        self._stop.set()
+
+    def _acquire_slot(self):
+        while not self._stop.is_set():
+            if self._in_flight.acquire(timeout=0.1):
+                return True
+        return False
+
+    def _read(self):
+        try:
+            blocks = iter(self._blocks)
+            for position in itertools.count():
+                start = time.perf_counter()
+                block = next(blocks, _DONE)
+                self._add('read', time.perf_counter() - start)
+                if block is _DONE:
+                    break
+                if self._cancel_token is not None and self._cancel_token.cancelled:
+                    # Checked after the next block is read, so that a
+                    # cancellation is only reported if blocks are left unwritten
+                    self._cancelled = True
+                    break
+                start = time.perf_counter()
+                if not self._acquire_slot() or not self._input.put(
+                    (position, block), self._stop
+                ):
+                    return
+                self._add('read_stall', time.perf_counter() - start)
+        except BaseException as error:
+            self._fail(error)
+            return
+        for _ in range(self._workers):
+            self._input.put(_DONE, self._stop)
+
+    def _work(self):
+        try:
+            while True:
+                start = time.perf_counter()
+                item = self._input.get(self._stop)
+                self._add('compute_stall', time.perf_counter() - start)
+                if item is _DONE:
+                    break
+                position, block = item
+                start = time.perf_counter()
+                result = self._compute(block)
+                self._add('compute', time.perf_counter() - start)
+                start = time.perf_counter()
+                if not self._output.put((position, result), self._stop):
+                    return
+                self._add('compute_stall', time.perf_counter() - start)
+        except BaseException as error:
+            self._fail(error)
+            return
+        self._output.put(_DONE, self._stop)
+
+    def _write_ordered(self):
+        pending = {}
+        next_position = 0
+        finished_workers = 0
+        try:
+            while finished_workers < self._workers:
+                start = time.perf_counter()
+                item = self._output.get(self._stop)
+                self._add('write_stall', time.perf_counter() - start)
+                if self._stop.is_set():
+                    return
+                if item is _DONE:
+                    finished_workers += 1
+                    continue
+                pending[item[0]] = item[1]
+                while next_position in pending:
+                    start = time.perf_counter()
+                    result = pending.pop(next_position)
+                    self._write(result)
+                    self._add('write', time.perf_counter() - start)
+                    if self._progress is not None:
+                        self._progress.update(len(result))
+                    self._add('blocks', 1)
+                    self._in_flight.release()
+                    next_position += 1
+        except BaseException as error:
+            self._fail(error)
+
+    def run(self):
+        """
+        Process every block and wait for all stages to finish. If any stage
+        raises an exception, the other stages are stopped and the exception is
+        raised again. If the cancellation token is cancelled before every block
+        is read, the blocks read before the cancellation are written and
+        ComputationCancelled is raised. A cancellation that comes after the
+        last block was read is ignored, as the output is complete.
+
+        Returns
+        -------
+        dict
+            Time, in seconds, spent reading, computing (summed over the
+            workers) and writing, time each stage spent stalled (the reader
+            waiting for free space in the queue, the workers waiting for
+            blocks to compute or for free space in the output queue and the
+            writer waiting for computed blocks), number of blocks and the
+            maximum and mean depths of the input and output queues. A stage
+            that is rarely stalled while the others are is the bottleneck.
+        """
+
+        threads = [threading.Thread(target=self._read, daemon=True)]
+        threads += [
+            threading.Thread(target=self._work, daemon=True)
+            for _ in range(self._workers)
+        ]
+        threads.append(threading.Thread(target=self._write_ordered, daemon=True))
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.1)
+        except BaseException:
+            self._stop.set()
+            raise
+        if self._errors:
+            raise self._errors[0]
+        if self._cancelled:
+            raise ComputationCancelled()
+        stats = dict(self._stats)
+        stats['input_queue_max_depth'] = self._input.max_depth
+        stats['input_queue_mean_depth'] = self._input.mean_depth
+        stats['output_queue_max_depth'] = self._output.max_depth
+        stats['output_queue_mean_depth'] = self._output.mean_depth
+        return stats
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+#
+#   This file is part of the tspex package, available at:
+#   https://github.com/apcamargo/tspex
+#
+#   Tspex is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+#   Contact: antoniop.camargo@gmail.com
+
+
+"""
+Local HTTP server that scores tissue-specificity from resident expression matrices.
+"""
+
+import asyncio
+import collections
+import json
+import time
+import urllib.parse
+
+import numpy as np
+import pandas as pd
+
+from tspex.core.io_functions import prepare_expression_matrix
+from tspex.core.score_functions import METHODS
+
+_HTTP_STATUS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    500: 'Internal Server Error',
+}
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    if str(value).lower() in ['1', 'true', 'yes']:
+        return True
+    if str(value).lower() in ['0', 'false', 'no']:
+        return False
+    raise ValueError('Invalid boolean value: {}.'.format(value))
+
+
+def _to_json_value(value):
+    if np.ndim(value):
+        return [_to_json_value(v) for v in value]
+    return None if np.isnan(value) else float(value)
+
+
+class ScoringServer:
+    """
+    Score gene tissue-specificity on demand from expression matrices that are
+    loaded and validated once and kept in memory. Per-gene results are cached,
+    so repeated queries are answered without recomputation.
+
+    Parameters
+    ----------
+    matrices : dict
+        Dictionary mapping matrix names to pandas DataFrames containing
+        expression matrices, with rows corresponding to genes and columns to
+        tissues/conditions.
+    cache_size : int, default 100000
+        Maximum number of per-gene results kept in the cache.
+    """
+
+    def __init__(self, matrices, cache_size=100000):
+        self._matrices = {}
+        for name, expression_data in matrices.items():
+            expression_data = prepare_expression_matrix(expression_data)
+            self._matrices[str(name)] = {
+                'genes': pd.Index(expression_data.index.astype(str)),
+                'tissues': [str(tissue) for tissue in expression_data.columns],
+                'values': {False: expression_data.values},
+            }
+        self._cache = collections.OrderedDict()
+        self._cache_size = cache_size
+        self._counters = collections.Counter()
+        self._latencies = collections.deque(maxlen=1000)
+        self._start_time = time.monotonic()
+
+    def _matrix_values(self, matrix, log):
+        values = self._matrices[matrix]['values']
+        if log not in values:
+            values[log] = np.log(values[False] + 1)
+        return values[log]
+
+    def score(self, matrix, method, genes=None, log=False, transform=True, threshold=0):
+        """
+        Compute the tissue-specificity of a set of genes.
+
+        Parameters
+        ----------
+        matrix : str
+            Name of the expression matrix.
+        method : str
+            Tissue-specificity metric.
+        genes : list, optional
+            Genes to be scored. By default, every gene in the matrix is scored.
+        log : bool, default False
+            Log-transform the expression values before computing
+            tissue-specificity.
+        transform : bool, default True
+            Transform the tissue-specificity values so that they range from 0
+            to 1.
+        threshold : int or float, default 0
+            Expression threshold used by the 'counts' metric.
+
+        Returns
+        -------
+        dict
+            Dictionary with the tissue-specificity of each gene that was found
+            in the matrix and the list of genes that were not.
+        """
+
+        if matrix not in self._matrices:
+            raise ValueError('Unknown matrix: {}.'.format(matrix))
+        if method not in METHODS:
+            raise ValueError('Unknown method: {}.'.format(method))
+        log, transform, threshold = (
+            _parse_bool(log),
+            _parse_bool(transform),
+            float(threshold),
+        )
+        gene_index = self._matrices[matrix]['genes']
+        if genes is None:
+            genes = list(gene_index)
+        genes = [str(gene) for gene in genes]
+        rows = gene_index.get_indexer(genes)
+        keys = [(matrix, method, log, transform, threshold, row) for row in rows]
+        uncached_rows = sorted(
+            {row for row, key in zip(rows, keys) if row >= 0 and key not in self._cache}
+        )
+        self._counters['cache_misses'] += len(uncached_rows)
+        self._counters['cache_hits'] += int(np.sum(rows >= 0)) - len(uncached_rows)
+        if uncached_rows:
+            values = np.round(
+                METHODS[method](
+                    self._matrix_values(matrix, log)[uncached_rows],
+                    transform=transform,
+                    threshold=threshold,
+                ),
+                4,
+            )
+            for row, value in zip(uncached_rows, values):
+                self._cache[(matrix, method, log, transform, threshold, row)] = value
+        scores = collections.OrderedDict()
+        for gene, row, key in zip(genes, rows, keys):
+            if row >= 0:
+                self._cache.move_to_end(key)
+                scores[gene] = _to_json_value(self._cache[key])
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        self._counters['genes_scored'] += len(scores)
+        result = {'matrix': matrix, 'method': method}
+        if method in ['tsi', 'zscore', 'spm', 'js_specificity']:
+            result['tissues'] = self._matrices[matrix]['tissues']
+        result['scores'] = scores
+        result['missing'] = [gene for gene, row in zip(genes, rows) if row < 0]
+        return result
+
+    def stats(self):
+        """
+        Return latency and throughput counters.
+
+        Returns
+        -------
+        dict
+            Number of requests, errors, scored genes, cache hits and misses,
+            throughput and latency statistics of the most recent requests.
+        """
+
+        uptime = time.monotonic() - self._start_time
+        latencies = np.array(self._latencies) * 1000
+        latency = {'mean': None, 'p50': None, 'p95': None, 'max': None}
+        if len(latencies):
+            latency = {
+                'mean': round(float(latencies.mean()), 3),
+                'p50': round(float(np.percentile(latencies, 50)), 3),
+                'p95': round(float(np.percentile(latencies, 95)), 3),
+                'max': round(float(latencies.max()), 3),
+            }
+        return {
+            'requests': self._counters['requests'],
+            'errors': self._counters['errors'],
+            'genes_scored': self._counters['genes_scored'],
+            'cache_hits': self._counters['cache_hits'],
+            'cache_misses': self._counters['cache_misses'],
+            'cache_entries': len(self._cache),
+            'uptime_seconds': round(uptime, 3),
+            'requests_per_second': round(self._counters['requests'] / uptime, 3),
+            'latency_ms': latency,
+        }
+
+    def _dispatch(self, request_method, target, body):
+        url = urllib.parse.urlsplit(target)
+        if url.path == '/matrices' and request_method == 'GET':
+            return 200, {
+                name: {'genes': len(matrix['genes']), 'tissues': matrix['tissues']}
+                for name, matrix in self._matrices.items()
+            }
+        if url.path == '/stats' and request_method == 'GET':
+            return 200, self.stats()
+        if url.path != '/score':
+            return 404, {'error': 'Unknown path: {}.'.format(url.path)}
+        if request_method == 'GET':
+            parameters = {k: v[-1] for k, v in urllib.parse.parse_qs(url.query).items()}
+            if 'genes' in parameters:
+                parameters['genes'] = [g for g in parameters['genes'].split(',') if g]
+        elif request_method == 'POST':
+            parameters = json.loads(body.decode('utf-8') or '{}')
+        else:
+            return 405, {'error': 'Unsupported HTTP method: {}.'.format(request_method)}
+        unknown_parameters = set(parameters) - {
+            'matrix',
+            'method',
+            'genes',
+            'log',
+            'transform',
+            'threshold',
+        }
+        if unknown_parameters:
+            raise ValueError(
+                'Unknown parameters: {}.'.format(', '.join(sorted(unknown_parameters)))
+            )
+        if 'matrix' not in parameters and len(self._matrices) == 1:
+            parameters['matrix'] = next(iter(self._matrices))
+        return 200, self.score(**parameters)
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                if not request_line.strip():
+                    continue
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in [b'\r\n', b'\n', b'']:
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                start = time.perf_counter()
+                self._counters['requests'] += 1
+                try:
+                    try:
+                        content_length = int(headers.get('content-length', 0))
+                        if content_length < 0:
+                            raise ValueError
+                    except ValueError:
+                        # The end of the request is unknown, so the connection
+                        # cannot be reused
+                        keep_alive = False
+                        raise ValueError('Invalid Content-Length header.')
+                    body = await reader.readexactly(content_length)
+                    request_method, target, _ = request_line.decode('latin-1').split(
+                        ' ', 2
+                    )
+                    status, payload = self._dispatch(request_method, target, body)
+                except (ValueError, TypeError) as error:
+                    status, payload = 400, {'error': str(error)}
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception as error:
+                    status, payload = 500, {
+                        'error': '{}: {}'.format(type(error).__name__, error)
+                    }
+                if status != 200:
+                    self._counters['errors'] += 1
+                content = json.dumps(payload).encode('utf-8')
+                self._latencies.append(time.perf_counter() - start)
+                writer.write(
+                    (
+                        'HTTP/1.1 {} {}\r\nContent-Type: application/json\r\n'
+                        'Content-Length: {}\r\nConnection: {}\r\n\r\n'
+                    )
+                    .format(
+                        status,
+                        _HTTP_STATUS[status],
+                        len(content),
+                        'keep-alive' if keep_alive else 'close',
+                    )
+                    .encode('latin-1')
+                    + content
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=8000):
+        """
+        Start serving requests in the running event loop.
+
+        Parameters
+        ----------
+        host : str, default '127.0.0.1'
+            Address to listen on.
+        port : int, default 8000
+            Port to listen on. If 0, a free port is chosen.
+
+        Returns
+        -------
+        asyncio.AbstractServer
+            The running server.
+        """
+
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+    def serve_forever(self, host='127.0.0.1', port=8000):
+        """
+        Serve requests until the process is interrupted.
+
+        Parameters
+        ----------
+        host : str, default '127.0.0.1'
+            Address to listen on.
+        port : int, default 8000
+            Port to listen on.
+        """
+
+        loop = asyncio.new_event_loop()
+        server = loop.run_until_complete(self.start(host, port))
+        try:
+            loop.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            loop.run_until_complete(server.wait_closed())
+            loop.close()